@@ -0,0 +1,151 @@
+"""
+Record a path request workload on a real RPC endpoint, then replay it offline.
+
+    python -m benchmarks.cassette record --rpc-endpoint $RPC_ENDPOINT --workload pairs.json --output cassette.json.gz
+    python -m benchmarks.cassette replay cassette.json.gz --latency 0.02 --output replay.json
+    python -m benchmarks.cassette replay cassette.json.gz --recorded-latency-ratio 1 --baseline replay.json
+
+The workload file is a JSON list of [amount, token_in_address, token_out_address].
+All the requests are recorded at the same block, so the replays are deterministic.
+"""
+import argparse
+import asyncio
+import json
+import os
+from typing import (
+    Any,
+    Dict,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from web3 import AsyncWeb3
+from web3.types import Wei
+
+from benchmarks.run import (
+    get_environment,
+    output_report,
+    RESULT_FORMAT_VERSION,
+    run_workload,
+    summarize,
+)
+from uniswap_smart_path import SmartPath
+from uniswap_smart_path.cassette import (
+    Cassette,
+    RecordingProvider,
+    ReplayProvider,
+)
+
+
+factories = ("create", "create_v2_only", "create_v3_only")
+
+
+async def create_smart_path(factory: str, w3: AsyncWeb3) -> SmartPath:
+    return await getattr(SmartPath, factory)(w3)  # type: ignore[no-any-return]
+
+
+async def record(
+        rpc_endpoint: str,
+        workload: Sequence[Tuple[int, str, str]],
+        factory: str = "create",
+        block_number: Optional[int] = None,
+        concurrency: int = 4) -> Cassette:
+    provider = RecordingProvider(AsyncWeb3.AsyncHTTPProvider(rpc_endpoint, {"timeout": 20}), block_number)
+    smart_path = await create_smart_path(factory, AsyncWeb3(provider))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def record_one(amount: int, token_in: str, token_out: str) -> None:
+        async with semaphore:
+            await smart_path.get_swap_in_path(
+                Wei(amount),
+                AsyncWeb3.to_checksum_address(token_in),
+                AsyncWeb3.to_checksum_address(token_out),
+            )
+
+    await asyncio.gather(*[record_one(*pair) for pair in workload])
+    assert provider.cassette is not None
+    provider.cassette.workload = list(workload)
+    provider.cassette.metadata["factory"] = factory
+    return provider.cassette
+
+
+async def replay(
+        cassette: Cassette,
+        name: str = "cassette",
+        concurrency: int = 8,
+        latency: float = 0.,
+        recorded_latency_ratio: float = 0.,
+        jitter: float = 0.) -> Dict[str, Any]:
+    provider = ReplayProvider(cassette, latency, recorded_latency_ratio, jitter)
+    smart_path = await create_smart_path(cassette.metadata.get("factory", "create"), AsyncWeb3(provider))
+    provider.counts.clear()
+    workload_result = await run_workload(smart_path, cassette.workload, concurrency)
+    result = summarize(
+        {"name": name, "block_number": cassette.block_number},
+        len(cassette.workload),
+        workload_result,
+        provider.request_count,
+        {},
+    )
+    result["misses"] = len(provider.misses)
+    return result
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="record a workload on a real RPC endpoint")
+    record_parser.add_argument("--rpc-endpoint", default=os.environ.get("RPC_ENDPOINT"))
+    record_parser.add_argument("--workload", required=True, help="JSON list of [amount, token_in, token_out]")
+    record_parser.add_argument("--factory", choices=factories, default="create")
+    record_parser.add_argument("--block", type=int, help="pinned block (default: latest)")
+    record_parser.add_argument("--concurrency", type=int, default=4)
+    record_parser.add_argument("--output", required=True, help="cassette file (gzip compressed JSON)")
+
+    replay_parser = subparsers.add_parser("replay", help="replay a recorded workload offline")
+    replay_parser.add_argument("cassette")
+    replay_parser.add_argument("--concurrency", type=int, default=8)
+    replay_parser.add_argument("--latency", type=float, default=0., help="simulated RPC latency in seconds")
+    replay_parser.add_argument("--recorded-latency-ratio", type=float, default=0., help="1 to replay recorded timings")
+    replay_parser.add_argument("--jitter", type=float, default=0., help="mean extra RPC latency in seconds")
+    replay_parser.add_argument("--output", help="JSON result file (default: stdout)")
+    replay_parser.add_argument("--baseline", help="JSON result file of a previous replay to compare with")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        if not args.rpc_endpoint:
+            parser.error("--rpc-endpoint or the RPC_ENDPOINT environment variable is needed to record")
+        with open(args.workload) as f:
+            workload = [(int(amount), token_in, token_out) for amount, token_in, token_out in json.load(f)]
+        cassette = asyncio.run(record(args.rpc_endpoint, workload, args.factory, args.block, args.concurrency))
+        cassette.save(args.output)
+    else:
+        cassette = Cassette.load(args.cassette)
+        result = asyncio.run(
+            replay(
+                cassette,
+                f"cassette:{os.path.basename(args.cassette)}",
+                args.concurrency,
+                args.latency,
+                args.recorded_latency_ratio,
+                args.jitter,
+            )
+        )
+        report = {
+            "version": RESULT_FORMAT_VERSION,
+            "environment": get_environment(),
+            "settings": {
+                "concurrency": args.concurrency,
+                "latency": args.latency,
+                "recorded_latency_ratio": args.recorded_latency_ratio,
+                "jitter": args.jitter,
+            },
+            "results": [result],
+        }
+        output_report(report, args.output, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Benchmark of the HTTP connection reuse: several SmartPath instances, eg the workers of a service, serve a burst of
+get_swap_in_path() requests through the fake JSON-RPC endpoint served over HTTP, with an emulated handshake latency
+on each new connection, as the TCP and TLS handshakes with a remote endpoint.
+
+    python -m benchmarks.connection_reuse
+    python -m benchmarks.connection_reuse --instances 8 --handshake-latency 0.05 --pool-size 20 --output reuse.json
+
+The modes are:
+
+* no_reuse: each request opens a new connection, as when the connections are not kept alive
+* per_instance: each instance has its own connection pool, created from HttpSettings
+* shared: all the instances share the same session, and so the same connection pool
+
+The report gives, for each mode, the throughput, the latency distribution and the number of connections opened.
+"""
+import argparse
+import asyncio
+from dataclasses import (
+    asdict,
+    dataclass,
+)
+import json
+import sys
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+)
+
+from aiohttp import (
+    ClientSession,
+    TCPConnector,
+)
+
+from benchmarks.run import (
+    get_environment,
+    RESULT_FORMAT_VERSION,
+    run_workload,
+    summarize,
+    WorkloadResult,
+)
+from tests.fake_rpc import (
+    FakeRpc,
+    PoolUniverse,
+    start_fake_rpc_server,
+)
+from uniswap_smart_path import (
+    HttpSettings,
+    SmartPath,
+)
+
+
+modes = ("no_reuse", "per_instance", "shared")
+
+
+@dataclass(frozen=True)
+class ReuseSettings:
+    modes: Sequence[str] = modes
+    instances: int = 4  # SmartPath instances
+    requests_per_instance: int = 10
+    concurrency: int = 4  # concurrent callers per instance
+    factory: str = "create"  # SmartPath factory method
+    pool_size: int = 100  # HttpSettings.pool_size
+    keepalive_timeout: float = 15.
+    handshake_latency: float = 0.02
+    latency: float = 0.005
+    jitter: float = 0.002
+    token_count: int = 30
+    seed: int = 0
+
+    def get_http_settings(self) -> HttpSettings:
+        return HttpSettings(pool_size=self.pool_size, keepalive_timeout=self.keepalive_timeout)
+
+
+async def run_mode(mode: str, settings: ReuseSettings) -> Dict[str, Any]:
+    """
+    Serve settings.instances * settings.requests_per_instance requests with fresh SmartPath instances.
+    """
+    if mode not in modes:
+        raise ValueError(f"Unknown mode: {mode}. Expected one of {modes}")
+    universe = PoolUniverse.generate(settings.token_count, seed=settings.seed)
+    rpc = FakeRpc(universe, settings.latency, settings.jitter, settings.seed)
+    runner, endpoint = await start_fake_rpc_server(rpc, handshake_latency=settings.handshake_latency)
+    shared_session: Optional[ClientSession] = None
+    smart_paths: List[SmartPath] = []
+    try:
+        if mode == "no_reuse":
+            shared_session = ClientSession(connector=TCPConnector(force_close=True))
+        elif mode == "shared":
+            shared_session = settings.get_http_settings().create_session()
+        for _ in range(settings.instances):
+            smart_paths.append(
+                await getattr(SmartPath, settings.factory)(
+                    rpc_endpoint=endpoint,
+                    http_settings=settings.get_http_settings(),
+                    http_session=shared_session,
+                )
+            )
+
+        pairs = universe.sample_pairs(settings.instances * settings.requests_per_instance, settings.seed)
+        rpc.reset_counts()
+        instance_results = await asyncio.gather(*[
+            run_workload(smart_path, pairs[i::settings.instances], settings.concurrency)
+            for i, smart_path in enumerate(smart_paths)
+        ])
+    finally:
+        if shared_session is not None:
+            await shared_session.close()
+        else:
+            for smart_path in smart_paths:
+                disconnect = getattr(smart_path.w3.provider, "disconnect", None)
+                if disconnect is not None:
+                    await disconnect()
+        await runner.cleanup()
+
+    workload_result = WorkloadResult(
+        sorted(latency for result in instance_results for latency in result.latencies),
+        [error for result in instance_results for error in result.errors],
+        sum(result.empty_path_count for result in instance_results),
+        max(result.duration for result in instance_results),
+    )
+    result = summarize({"name": mode}, len(pairs), workload_result, rpc.rpc_count, {})
+    del result["eth_call_per_request"]
+    result["connections"] = rpc.connection_count
+    result["rpc_per_connection"] = rpc.rpc_count / rpc.connection_count if rpc.connection_count else 0.
+    return result
+
+
+async def run(settings: ReuseSettings) -> Dict[str, Any]:
+    return {
+        "version": RESULT_FORMAT_VERSION,
+        "environment": get_environment(),
+        "settings": asdict(settings),
+        "results": [await run_mode(mode, settings) for mode in settings.modes],
+    }
+
+
+def format_report(report: Dict[str, Any]) -> List[str]:
+    lines = []
+    for result in report["results"]:
+        latency = result["latency"]
+        lines.append(
+            f"{result['scenario']['name']:>12}: {result['requests_per_second']:.1f} req/s, "
+            f"p50 {latency['p50'] * 1000:.0f} ms, p99 {latency['p99'] * 1000:.0f} ms, "
+            f"{result['connections']} connections, {result['rpc_per_connection']:.1f} rpc/connection, "
+            f"{result['errors']} errors"
+        )
+    return lines
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    default = ReuseSettings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=modes, default=list(default.modes))
+    parser.add_argument("--instances", type=int, default=default.instances, help="SmartPath instances")
+    parser.add_argument("--requests-per-instance", type=int, default=default.requests_per_instance)
+    parser.add_argument("--concurrency", type=int, default=default.concurrency, help="callers per instance")
+    parser.add_argument("--factory", choices=("create", "create_v2_only", "create_v3_only"), default=default.factory)
+    parser.add_argument("--pool-size", type=int, default=default.pool_size, help="0 for no limit")
+    parser.add_argument("--keepalive-timeout", type=float, default=default.keepalive_timeout)
+    parser.add_argument("--handshake-latency", type=float, default=default.handshake_latency,
+                        help="extra latency in seconds of the first request on each connection")
+    parser.add_argument("--latency", type=float, default=default.latency, help="RPC latency in seconds")
+    parser.add_argument("--jitter", type=float, default=default.jitter, help="mean extra RPC latency in seconds")
+    parser.add_argument("--tokens", type=int, default=default.token_count, help="number of non pivot tokens")
+    parser.add_argument("--seed", type=int, default=default.seed)
+    parser.add_argument("--output", help="JSON result file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    settings = ReuseSettings(
+        tuple(args.modes),
+        args.instances,
+        args.requests_per_instance,
+        args.concurrency,
+        args.factory,
+        args.pool_size,
+        args.keepalive_timeout,
+        args.handshake_latency,
+        args.latency,
+        args.jitter,
+        args.tokens,
+        args.seed,
+    )
+    report = asyncio.run(run(settings))
+
+    for line in format_report(report):
+        print(line, file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
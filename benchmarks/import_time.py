@@ -0,0 +1,88 @@
+"""
+Measure the cold import time of uniswap_smart_path, in fresh interpreters.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --runs 20 --budget 0.15  # exit with an error if over budget
+
+web3 is imported first and measured separately: the library needs it anyway, and it dominates the total time.
+The budget applies to the remaining import time of the library itself.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+)
+
+
+# modules that importing the library must not import, because they are heavy and only needed on first use
+lazy_modules = (
+    "uniswap_universal_router_decoder",
+    "aiohttp.web",
+)
+
+_measure_script = f"""
+import json, sys, time
+start = time.perf_counter()
+import web3
+web3_time = time.perf_counter() - start
+start = time.perf_counter()
+import uniswap_smart_path
+library_time = time.perf_counter() - start
+print(json.dumps({{
+    "web3": web3_time,
+    "library": library_time,
+    "imported_lazy_modules": [m for m in {lazy_modules!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure_once() -> Dict[str, Any]:
+    output = subprocess.run(
+        [sys.executable, "-c", _measure_script],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output)  # type: ignore[no-any-return]
+
+
+def measure(runs: int = 10) -> Dict[str, Any]:
+    """
+    :return: the median import times of web3 and of the library, in seconds, over the given number of runs
+    """
+    measures: List[Dict[str, Any]] = [measure_once() for _ in range(runs)]
+    return {
+        "runs": runs,
+        "web3": statistics.median(m["web3"] for m in measures),
+        "library": statistics.median(m["library"] for m in measures),
+        "imported_lazy_modules": sorted({module for m in measures for module in m["imported_lazy_modules"]}),
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget", type=float, help="maximum median import time of the library, in seconds")
+    args = parser.parse_args(argv)
+
+    result = measure(args.runs)
+    print(json.dumps(result, indent=2))
+    print(
+        f"web3: {result['web3'] * 1000:.0f} ms, uniswap_smart_path: {result['library'] * 1000:.0f} ms",
+        file=sys.stderr,
+    )
+    if result["imported_lazy_modules"]:
+        sys.exit(f"Modules imported eagerly: {', '.join(result['imported_lazy_modules'])}")
+    if args.budget is not None and result["library"] > args.budget:
+        sys.exit(f"Import time over budget: {result['library']:.3f} s > {args.budget:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
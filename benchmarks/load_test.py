@@ -0,0 +1,215 @@
+"""
+Load test of SmartPath.get_swap_in_path() against the fake JSON-RPC endpoint, under a SmartRateLimiter configuration.
+
+    python -m benchmarks.load_test --max-count 100 --callers 1 2 4 8 16 32
+    python -m benchmarks.load_test --max-credits 500 --eth-call-credits 26 --callers 4 16 64 --output load.json
+
+For each number of concurrent callers, a fresh SmartPath (and rate limiter) serves callers * requests_per_caller
+requests. The report gives the throughput, the latency distribution, the time spent queueing in the rate limiter,
+and the saturation point: the number of callers after which adding callers no longer improves the throughput,
+but only the latency.
+"""
+import argparse
+import asyncio
+from dataclasses import (
+    asdict,
+    dataclass,
+)
+import json
+import sys
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+)
+
+from web3 import AsyncWeb3
+
+from benchmarks.run import (
+    get_environment,
+    percentile,
+    RESULT_FORMAT_VERSION,
+    run_workload,
+    summarize,
+)
+from tests.fake_rpc import (
+    FakeRpc,
+    FakeRpcProvider,
+    PoolUniverse,
+)
+from uniswap_smart_path import (
+    CallbackSink,
+    Instrumentation,
+    SmartPath,
+    SmartRateLimiter,
+)
+from uniswap_smart_path.instrumentation import RequestMetrics
+
+
+@dataclass(frozen=True)
+class LoadSettings:
+    callers: Sequence[int] = (1, 2, 4, 8, 16, 32)
+    requests_per_caller: int = 5
+    factory: str = "create"  # SmartPath factory method
+    interval: float = 1.  # rate limiter settings: max_count, or max_credits and eth_call_credits, per interval
+    max_count: Optional[int] = 200
+    max_credits: Optional[int] = None
+    eth_call_credits: int = 1
+    latency: float = 0.01
+    jitter: float = 0.005
+    token_count: int = 30
+    seed: int = 0
+    saturation_threshold: float = 0.1  # minimum relative throughput gain to consider that adding callers helps
+
+    def create_smart_rate_limiter(self) -> Optional[SmartRateLimiter]:
+        if self.max_credits:
+            return SmartRateLimiter(
+                self.interval,
+                max_credits=self.max_credits,
+                method_credits={"eth_call": self.eth_call_credits},
+            )
+        if self.max_count:
+            return SmartRateLimiter(self.interval, max_count=self.max_count)
+        return None
+
+
+def summarize_wait_times(wait_times: List[float]) -> Dict[str, float]:
+    wait_times = sorted(wait_times)
+    return {
+        "mean": sum(wait_times) / len(wait_times) if wait_times else 0.,
+        "p50": percentile(wait_times, 0.5),
+        "p99": percentile(wait_times, 0.99),
+        "max": wait_times[-1] if wait_times else 0.,
+    }
+
+
+async def run_level(caller_count: int, settings: LoadSettings) -> Dict[str, Any]:
+    """
+    Run caller_count concurrent callers against a fresh SmartPath and rate limiter.
+    """
+    universe = PoolUniverse.generate(settings.token_count, seed=settings.seed)
+    rpc = FakeRpc(universe, settings.latency, settings.jitter, settings.seed)
+    request_metrics: List[RequestMetrics] = []
+    smart_path = await getattr(SmartPath, settings.factory)(
+        AsyncWeb3(FakeRpcProvider(rpc)),
+        smart_rate_limiter=settings.create_smart_rate_limiter(),
+        instrumentation=Instrumentation([CallbackSink(request_metrics.append)]),
+    )
+    pairs = universe.sample_pairs(caller_count * settings.requests_per_caller, settings.seed)
+    rpc.reset_counts()
+    workload_result = await run_workload(smart_path, pairs, caller_count)
+
+    result = summarize(
+        {"name": f"{caller_count}_callers", "callers": caller_count},
+        len(pairs),
+        workload_result,
+        rpc.rpc_count,
+        {},
+    )
+    del result["eth_call_per_request"]
+    result["rpc_per_second"] = rpc.rpc_count / workload_result.duration if workload_result.duration else 0.
+    # time spent by each request waiting for the rate limiter, summed over its RPC
+    result["rate_limiter_wait_time"] = summarize_wait_times([m.rate_limiter_wait_time for m in request_metrics])
+    rpc_count = sum(m.rpc_count for m in request_metrics)
+    result["rate_limiter_wait_time_per_rpc"] = (
+        sum(m.rate_limiter_wait_time for m in request_metrics) / rpc_count if rpc_count else 0.
+    )
+    return result
+
+
+def find_saturation_point(results: Sequence[Dict[str, Any]], threshold: float) -> Optional[int]:
+    """
+    :return: the number of callers after which the throughput improves by less than threshold (relative),
+             or None if it never saturates
+    """
+    for previous, current in zip(results, results[1:]):
+        if current["requests_per_second"] < previous["requests_per_second"] * (1 + threshold):
+            return previous["scenario"]["callers"]  # type: ignore[no-any-return]
+    return None
+
+
+async def run(settings: LoadSettings) -> Dict[str, Any]:
+    results = []
+    for caller_count in sorted(settings.callers):
+        results.append(await run_level(caller_count, settings))
+    saturation_point = find_saturation_point(results, settings.saturation_threshold)
+    return {
+        "version": RESULT_FORMAT_VERSION,
+        "environment": get_environment(),
+        "settings": asdict(settings),
+        "results": results,
+        "saturation": {
+            "callers": saturation_point,
+            "max_requests_per_second": max((result["requests_per_second"] for result in results), default=0.),
+        },
+    }
+
+
+def format_report(report: Dict[str, Any]) -> List[str]:
+    lines = []
+    for result in report["results"]:
+        latency = result["latency"]
+        lines.append(
+            f"{result['scenario']['callers']:>4} callers: {result['requests_per_second']:.1f} req/s, "
+            f"{result['rpc_per_second']:.0f} rpc/s, p50 {latency['p50'] * 1000:.0f} ms, "
+            f"p99 {latency['p99'] * 1000:.0f} ms, "
+            f"rate limiter wait {result['rate_limiter_wait_time_per_rpc'] * 1000:.1f} ms/rpc, {result['errors']} errors"
+        )
+    saturation = report["saturation"]
+    if saturation["callers"] is None:
+        lines.append("No saturation: try more callers")
+    else:
+        lines.append(
+            f"Saturated at {saturation['callers']} callers, "
+            f"max throughput {saturation['max_requests_per_second']:.1f} req/s"
+        )
+    return lines
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    default = LoadSettings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callers", type=int, nargs="+", default=list(default.callers), help="concurrent callers")
+    parser.add_argument("--requests-per-caller", type=int, default=default.requests_per_caller)
+    parser.add_argument("--factory", choices=("create", "create_v2_only", "create_v3_only"), default=default.factory)
+    parser.add_argument("--interval", type=float, default=default.interval, help="rate limiter interval in seconds")
+    parser.add_argument("--max-count", type=int, default=default.max_count, help="0 to disable the rate limiter")
+    parser.add_argument("--max-credits", type=int, help="credit rate limit, instead of the count one")
+    parser.add_argument("--eth-call-credits", type=int, default=default.eth_call_credits)
+    parser.add_argument("--latency", type=float, default=default.latency, help="RPC latency in seconds")
+    parser.add_argument("--jitter", type=float, default=default.jitter, help="mean extra RPC latency in seconds")
+    parser.add_argument("--tokens", type=int, default=default.token_count, help="number of non pivot tokens")
+    parser.add_argument("--seed", type=int, default=default.seed)
+    parser.add_argument("--saturation-threshold", type=float, default=default.saturation_threshold)
+    parser.add_argument("--output", help="JSON result file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    settings = LoadSettings(
+        tuple(args.callers),
+        args.requests_per_caller,
+        args.factory,
+        args.interval,
+        args.max_count,
+        args.max_credits,
+        args.eth_call_credits,
+        args.latency,
+        args.jitter,
+        args.tokens,
+        args.seed,
+        args.saturation_threshold,
+    )
+    report = asyncio.run(run(settings))
+
+    for line in format_report(report):
+        print(line, file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Offline benchmark of SmartPath.get_swap_in_path() against the fake JSON-RPC endpoint.
+
+    python -m benchmarks.run --output benchmark.json
+    python -m benchmarks.run --baseline benchmark.json  # compare with a previous run
+
+The results are written as JSON, with the environment and settings, so runs can be compared.
+"""
+import argparse
+import asyncio
+from dataclasses import (
+    asdict,
+    dataclass,
+)
+import json
+import platform
+import subprocess
+import sys
+import time
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import web3
+from web3 import AsyncWeb3
+from web3.types import Wei
+
+from tests.fake_rpc import (
+    FakeRpc,
+    FakeRpcProvider,
+    PoolUniverse,
+    start_fake_rpc_server,
+)
+from uniswap_smart_path import (
+    SmartPath,
+    SmartRateLimiter,
+)
+from uniswap_smart_path._constants import (
+    uniswapv2_address,
+    uniswapv2_factory_address,
+    uniswapv3_factory_address,
+    uniswapv3_quoter_address,
+)
+
+
+RESULT_FORMAT_VERSION = 1
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    factory: str = "create"  # SmartPath factory method
+    extra_pivot_count: int = 0  # synthetic pivot tokens added to the mainnet ones, with create_custom only
+    max_count: Optional[int] = None  # count rate limit, in requests per second
+
+
+scenarios = {
+    scenario.name: scenario
+    for scenario in (
+        Scenario("v2_v3"),
+        Scenario("v2_only", "create_v2_only"),
+        Scenario("v3_only", "create_v3_only"),
+        Scenario("many_pivots", "create_custom", extra_pivot_count=8),
+        Scenario("rate_limited", max_count=1000),
+    )
+}
+
+
+@dataclass(frozen=True)
+class Settings:
+    requests: int = 40
+    concurrency: int = 8
+    latency: float = 0.01
+    jitter: float = 0.005
+    token_count: int = 30
+    seed: int = 0
+    http: bool = False
+
+
+def percentile(sorted_values: Sequence[float], quantile: float) -> float:
+    """
+    Nearest-rank percentile of already sorted values.
+    """
+    if not sorted_values:
+        return 0.
+    rank = max(0, min(len(sorted_values) - 1, int(quantile * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+async def create_smart_path(scenario: Scenario, w3: AsyncWeb3, universe: PoolUniverse, **kwargs: Any) -> SmartPath:
+    smart_rate_limiter = SmartRateLimiter(interval=1, max_count=scenario.max_count) if scenario.max_count else None
+    if scenario.factory == "create_custom":
+        return await SmartPath.create_custom(
+            w3,
+            smart_rate_limiter=smart_rate_limiter,
+            pivot_tokens=[pivot.address for pivot in universe.pivots],
+            v2_router=uniswapv2_address,
+            v2_factory=uniswapv2_factory_address,
+            v3_quoter=uniswapv3_quoter_address,
+            v3_factory=uniswapv3_factory_address,
+            **kwargs,
+        )
+    factory = getattr(SmartPath, scenario.factory)
+    return await factory(w3, smart_rate_limiter=smart_rate_limiter, **kwargs)  # type: ignore[no-any-return]
+
+
+@dataclass
+class WorkloadResult:
+    latencies: List[float]  # of the successful requests, sorted
+    errors: List[str]
+    empty_path_count: int
+    duration: float
+
+
+async def run_workload(
+        smart_path: SmartPath,
+        pairs: Sequence[Tuple[int, str, str]],
+        concurrency: int) -> WorkloadResult:
+    """
+    Call get_swap_in_path() for each (amount, token_in, token_out), with concurrency callers.
+    """
+    queue: "asyncio.Queue[Tuple[int, str, str]]" = asyncio.Queue()
+    for pair in pairs:
+        queue.put_nowait(pair)
+    result = WorkloadResult([], [], 0, 0.)
+
+    async def worker() -> None:
+        while not queue.empty():
+            amount, token_in, token_out = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                path = await smart_path.get_swap_in_path(
+                    Wei(amount),
+                    AsyncWeb3.to_checksum_address(token_in),
+                    AsyncWeb3.to_checksum_address(token_out),
+                )
+            except Exception as e:
+                result.errors.append(repr(e))
+                continue
+            result.latencies.append(time.perf_counter() - start)
+            if not path:
+                result.empty_path_count += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    result.duration = time.perf_counter() - start
+    result.latencies.sort()
+    return result
+
+
+def summarize(
+        scenario: Dict[str, Any],
+        request_count: int,
+        workload_result: WorkloadResult,
+        rpc_count: int,
+        eth_call_counts: Dict[str, int]) -> Dict[str, Any]:
+    latencies = workload_result.latencies
+    duration = workload_result.duration
+    return {
+        "scenario": scenario,
+        "requests": request_count,
+        "errors": len(workload_result.errors),
+        "error_samples": workload_result.errors[:3],
+        "empty_paths": workload_result.empty_path_count,
+        "duration": duration,
+        "requests_per_second": len(latencies) / duration if duration else 0.,
+        "latency": {
+            "mean": sum(latencies) / len(latencies) if latencies else 0.,
+            "p50": percentile(latencies, 0.5),
+            "p90": percentile(latencies, 0.9),
+            "p99": percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else 0.,
+        },
+        "rpc_per_request": rpc_count / request_count if request_count else 0.,
+        "eth_call_per_request": {
+            method: count / request_count for method, count in sorted(eth_call_counts.items()) if request_count
+        },
+    }
+
+
+async def run_scenario(scenario: Scenario, settings: Settings) -> Dict[str, Any]:
+    universe = PoolUniverse.generate(settings.token_count, scenario.extra_pivot_count, seed=settings.seed)
+    rpc = FakeRpc(universe, settings.latency, settings.jitter, settings.seed)
+    runner = None
+    if settings.http:
+        runner, endpoint = await start_fake_rpc_server(rpc)
+        w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(endpoint))
+    else:
+        w3 = AsyncWeb3(FakeRpcProvider(rpc))
+
+    try:
+        smart_path = await create_smart_path(scenario, w3, universe)
+        pairs = universe.sample_pairs(settings.requests, settings.seed)
+        rpc.reset_counts()
+        workload_result = await run_workload(smart_path, pairs, settings.concurrency)
+    finally:
+        if settings.http:
+            disconnect = getattr(w3.provider, "disconnect", None)
+            if disconnect is not None:
+                await disconnect()
+        if runner is not None:
+            await runner.cleanup()
+
+    eth_call_counts = {method: count for method, count in rpc.counts.items() if "." in method}
+    return summarize(asdict(scenario), len(pairs), workload_result, rpc.rpc_count, eth_call_counts)
+
+
+def get_environment() -> Dict[str, Any]:
+    try:
+        commit: Optional[str] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "web3": web3.__version__,
+        "commit": commit,
+    }
+
+
+async def run(scenario_names: Sequence[str], settings: Settings) -> Dict[str, Any]:
+    results = []
+    for name in scenario_names:
+        results.append(await run_scenario(scenarios[name], settings))
+    return {
+        "version": RESULT_FORMAT_VERSION,
+        "environment": get_environment(),
+        "settings": asdict(settings),
+        "results": results,
+    }
+
+
+compared_metrics = (
+    # name, getter, True if higher is better
+    ("req/s", lambda result: result["requests_per_second"], True),
+    ("p50", lambda result: result["latency"]["p50"], False),
+    ("p99", lambda result: result["latency"]["p99"], False),
+    ("rpc/req", lambda result: result["rpc_per_request"], False),
+)
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """
+    :return: lines describing the relative change of each metric, for the scenarios in both runs
+    """
+    baseline_results = {result["scenario"]["name"]: result for result in baseline["results"]}
+    lines = []
+    for result in report["results"]:
+        name = result["scenario"]["name"]
+        if name not in baseline_results:
+            continue
+        changes = []
+        for metric_name, get_metric, higher_is_better in compared_metrics:
+            old, new = get_metric(baseline_results[name]), get_metric(result)
+            change = (new - old) / old * 100 if old else 0.
+            better = change > 0 if higher_is_better else change < 0
+            changes.append(f"{metric_name} {old:.4g} -> {new:.4g} ({change:+.1f}%{' better' if better else ''})")
+        lines.append(f"{name}: " + ", ".join(changes))
+    return lines
+
+
+def format_report(report: Dict[str, Any]) -> List[str]:
+    lines = []
+    for result in report["results"]:
+        latency = result["latency"]
+        lines.append(
+            f"{result['scenario']['name']}: {result['requests_per_second']:.1f} req/s, "
+            f"p50 {latency['p50'] * 1000:.1f} ms, p99 {latency['p99'] * 1000:.1f} ms, "
+            f"{result['rpc_per_request']:.1f} rpc/req, {result['errors']} errors"
+        )
+    return lines
+
+
+def output_report(report: Dict[str, Any], output: Optional[str], baseline: Optional[str]) -> None:
+    """
+    Print a summary, and the comparison with the baseline if any, on stderr, and write the JSON report.
+    """
+    for line in format_report(report):
+        print(line, file=sys.stderr)
+    if baseline:
+        with open(baseline) as f:
+            baseline_report = json.load(f)
+        for line in compare(report, baseline_report):
+            print(line, file=sys.stderr)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    default = Settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=sorted(scenarios), help="default: all scenarios")
+    parser.add_argument("--requests", type=int, default=default.requests, help="get_swap_in_path() calls")
+    parser.add_argument("--concurrency", type=int, default=default.concurrency, help="concurrent callers")
+    parser.add_argument("--latency", type=float, default=default.latency, help="RPC latency in seconds")
+    parser.add_argument("--jitter", type=float, default=default.jitter, help="mean extra RPC latency in seconds")
+    parser.add_argument("--tokens", type=int, default=default.token_count, help="number of non pivot tokens")
+    parser.add_argument("--seed", type=int, default=default.seed)
+    parser.add_argument("--http", action="store_true", help="serve the fake RPC over HTTP")
+    parser.add_argument("--output", help="JSON result file (default: stdout)")
+    parser.add_argument("--baseline", help="JSON result file of a previous run to compare with")
+    args = parser.parse_args(argv)
+
+    settings = Settings(
+        args.requests,
+        args.concurrency,
+        args.latency,
+        args.jitter,
+        args.tokens,
+        args.seed,
+        args.http,
+    )
+    report = asyncio.run(run(args.scenario or list(scenarios), settings))
+    output_report(report, args.output, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
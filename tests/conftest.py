@@ -1,12 +1,22 @@
 import asyncio
 import os
-from typing import Dict
+from typing import (
+    Dict,
+    List,
+    Tuple,
+)
 
 import pytest
 from web3 import AsyncWeb3
 
 from uniswap_smart_path._datastructures import Token  # noqa
 
+from .fake_rpc import (
+    create_fake_w3,
+    FakeRpc,
+    PoolUniverse,
+)
+
 
 tokens: Dict[str, Token] = {
     "USDC": Token(AsyncWeb3.to_checksum_address("0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48"), "USDC", 6),
@@ -46,3 +56,50 @@ def uniswapv2_address():
 @pytest.fixture(scope="session")
 def uniswapv3_quoter_address():
     return AsyncWeb3.to_checksum_address("0x61fFE014bA17989E743c5F6cB21bF9697530B21e")
+
+
+@pytest.fixture
+def universe(request) -> PoolUniverse:
+    """
+    Synthetic universe of tokens, V2 pairs and V3 pools, generated with the keyword arguments of the universe marker,
+    eg @pytest.mark.universe(token_count=10, seed=1). 6 tokens and seed 0 by default.
+    """
+    marker = request.node.get_closest_marker("universe")
+    return PoolUniverse.generate(**{"token_count": 6, "seed": 0, **(marker.kwargs if marker else {})})
+
+
+@pytest.fixture
+def pairs(request, universe) -> List[Tuple[int, str, str]]:
+    """
+    (amount, token_in_address, token_out_address) sampled from the universe, with the keyword arguments of the pairs
+    marker, eg @pytest.mark.pairs(count=40, seed=1). 10 pairs and the seed of the universe by default.
+    """
+    universe_marker = request.node.get_closest_marker("universe")
+    marker = request.node.get_closest_marker("pairs")
+    kwargs = {
+        "count": 10,
+        "seed": universe_marker.kwargs.get("seed", 0) if universe_marker else 0,
+        **(marker.kwargs if marker else {}),
+    }
+    return universe.sample_pairs(**kwargs)
+
+
+@pytest.fixture
+def fake_w3_and_rpc(universe) -> Tuple[AsyncWeb3, FakeRpc]:
+    return create_fake_w3(universe)
+
+
+@pytest.fixture
+def fake_w3(fake_w3_and_rpc) -> AsyncWeb3:
+    """
+    AsyncWeb3 instance served by the fake RPC of the universe
+    """
+    return fake_w3_and_rpc[0]
+
+
+@pytest.fixture
+def fake_rpc(fake_w3_and_rpc) -> FakeRpc:
+    """
+    Fake RPC of fake_w3, to count its requests, change its block, ...
+    """
+    return fake_w3_and_rpc[1]
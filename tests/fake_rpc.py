@@ -0,0 +1,446 @@
+"""
+In-process stand-in for an Ethereum JSON-RPC endpoint, serving a synthetic universe of tokens, V2 pairs and V3 pools.
+
+It answers the eth_call performed by SmartPath (ERC20 symbol/decimals, V2 factory getPair, V2 router getAmountsOut,
+V3 factory getPool and QuoterV2 quoteExactInput) with a configurable latency and jitter, and counts the requests.
+It can be used directly as an AsyncWeb3 provider, or served over HTTP to include the transport overhead.
+"""
+import asyncio
+from collections import Counter
+from dataclasses import dataclass
+import hashlib
+import json
+import random
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+import weakref
+
+from aiohttp import (
+    web,
+    WSMsgType,
+)
+from eth_abi import (
+    decode,
+    encode,
+)
+from eth_utils import function_signature_to_4byte_selector
+from web3 import AsyncWeb3
+from web3.providers.async_base import AsyncBaseProvider
+from web3.types import (
+    RPCEndpoint,
+    RPCResponse,
+)
+
+from uniswap_smart_path._constants import (
+    pivot_tokens,
+    v3_pool_fees,
+)
+
+
+NULL_ADDRESS = "0x" + "0" * 40
+V3_HOP_GAS_ESTIMATE = 90_000
+usd_prices = {"USDC": 1., "USDT": 1., "DAI": 1., "WETH": 2000.}
+
+
+class Reverted(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class FakeToken:
+    address: str
+    symbol: str
+    decimals: int
+    price: float  # in USD, used to generate consistent reserves and amounts
+
+
+def to_address(number: int) -> str:
+    return AsyncWeb3.to_checksum_address(f"0x{number:040x}")
+
+
+def _pool_address(*keys: Any) -> str:
+    return AsyncWeb3.to_checksum_address("0x" + hashlib.sha256(repr(keys).encode()).hexdigest()[:40])
+
+
+class PoolUniverse:
+    def __init__(self, tokens: Sequence[FakeToken], pivots: Sequence[FakeToken] = ()) -> None:
+        """
+        A set of tokens and pools. Reserves are in token units, ie with decimals.
+        V3 pools are modeled as constant product pools with virtual reserves, which is enough to rank paths.
+        """
+        self.tokens = {token.address.lower(): token for token in tokens}
+        self.pivots = tuple(pivots)
+        self.v2_pairs: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self.v2_pair_tokens: Dict[str, Tuple[str, str]] = {}  # pair address -> (token0, token1), sorted as on chain
+        self.v3_pools: Dict[Tuple[str, str, int], Tuple[int, int]] = {}
+
+    def _reserves(self, token_a: FakeToken, token_b: FakeToken, liquidity: float) -> Tuple[int, int]:
+        return (
+            int(liquidity / 2 / token_a.price * 10 ** token_a.decimals),
+            int(liquidity / 2 / token_b.price * 10 ** token_b.decimals),
+        )
+
+    def add_v2_pair(self, token_a: FakeToken, token_b: FakeToken, liquidity: float) -> None:
+        """
+        :param liquidity: total value locked in the pair, in USD
+        """
+        reserve_a, reserve_b = self._reserves(token_a, token_b, liquidity)
+        a, b = token_a.address.lower(), token_b.address.lower()
+        self.v2_pairs[(a, b)] = (reserve_a, reserve_b)
+        self.v2_pairs[(b, a)] = (reserve_b, reserve_a)
+        token0, token1 = sorted((a, b))
+        self.v2_pair_tokens[_pool_address(token0, token1).lower()] = (token0, token1)
+
+    def add_v3_pool(self, token_a: FakeToken, token_b: FakeToken, fee: int, liquidity: float) -> None:
+        """
+        :param liquidity: virtual value locked in the pool, in USD
+        """
+        reserve_a, reserve_b = self._reserves(token_a, token_b, liquidity)
+        a, b = token_a.address.lower(), token_b.address.lower()
+        self.v3_pools[(a, b, fee)] = (reserve_a, reserve_b)
+        self.v3_pools[(b, a, fee)] = (reserve_b, reserve_a)
+
+    def get_v2_amount_out(self, amount_in: int, token_in: str, token_out: str) -> int:
+        reserves = self.v2_pairs.get((token_in.lower(), token_out.lower()))
+        if reserves is None:
+            raise Reverted("UniswapV2Library: INVALID_PATH")
+        amount_in_with_fee = amount_in * 997
+        return amount_in_with_fee * reserves[1] // (reserves[0] * 1000 + amount_in_with_fee)
+
+    def get_v3_amount_out(self, amount_in: int, token_in: str, fee: int, token_out: str) -> int:
+        reserves = self.v3_pools.get((token_in.lower(), token_out.lower(), fee))
+        if reserves is None or amount_in == 0:
+            raise Reverted("Unexpected error")
+        amount_in_with_fee = amount_in * (1_000_000 - fee) // 1_000_000
+        return amount_in_with_fee * reserves[1] // (reserves[0] + amount_in_with_fee)
+
+    def get_amount(self, token_address: str, usd_value: float) -> int:
+        token = self.tokens[token_address.lower()]
+        return int(usd_value / token.price * 10 ** token.decimals)
+
+    def sample_pairs(self, count: int, seed: int = 0, usd_value: float = 1000.) -> List[Tuple[int, str, str]]:
+        """
+        :return: count (amount, token_in_address, token_out_address) between non pivot tokens
+        """
+        rng = random.Random(seed)
+        pivots = {pivot.address.lower() for pivot in self.pivots}
+        leaf_tokens = [token for address, token in self.tokens.items() if address not in pivots]
+        pairs = []
+        for _ in range(count):
+            token_in, token_out = rng.sample(leaf_tokens, 2)
+            pairs.append((self.get_amount(token_in.address, usd_value), token_in.address, token_out.address))
+        return pairs
+
+    @classmethod
+    def generate(
+            cls,
+            token_count: int = 30,
+            extra_pivot_count: int = 0,
+            fees: Sequence[int] = v3_pool_fees,
+            seed: int = 0) -> "PoolUniverse":
+        """
+        Generate a universe around the mainnet pivot tokens (plus extra_pivot_count synthetic ones): each token has
+        V2 pairs and V3 pools with some of the pivots, and a few tokens have direct pools between them.
+        """
+        rng = random.Random(seed)
+        pivots = [FakeToken(t.address, t.symbol, t.decimals, usd_prices.get(t.symbol, 1.)) for t in pivot_tokens[1]]
+        pivots.extend(
+            FakeToken(to_address(0x1000 + i), f"PVT{i}", 18, 10 ** rng.uniform(-1, 2)) for i in range(extra_pivot_count)
+        )
+        tokens = [
+            FakeToken(to_address(0x2000 + i), f"TKN{i}", rng.choice((6, 8, 18)), 10 ** rng.uniform(-3, 3))
+            for i in range(token_count)
+        ]
+        universe = cls(pivots + tokens, pivots)
+        for token in tokens:
+            for pivot in pivots:
+                if rng.random() < 0.6:
+                    universe.add_v2_pair(token, pivot, 10 ** rng.uniform(4, 7))
+                for fee in fees:
+                    if rng.random() < 0.25:
+                        universe.add_v3_pool(token, pivot, fee, 10 ** rng.uniform(4, 8))
+        for i, token_a in enumerate(tokens):
+            for token_b in tokens[i + 1:]:
+                if rng.random() < 0.1:
+                    universe.add_v2_pair(token_a, token_b, 10 ** rng.uniform(3, 6))
+                if rng.random() < 0.1:
+                    universe.add_v3_pool(token_a, token_b, rng.choice(fees), 10 ** rng.uniform(3, 7))
+        return universe
+
+
+def _selector(signature: str) -> str:
+    return "0x" + function_signature_to_4byte_selector(signature).hex()
+
+
+class FakeRpc:
+    def __init__(self, universe: PoolUniverse, latency: float = 0., jitter: float = 0., seed: int = 0) -> None:
+        """
+        JSON-RPC request handler.
+
+        :param universe: the tokens and pools to serve
+        :param latency: minimum response time in seconds
+        :param jitter: mean of the exponentially distributed extra response time in seconds, for a realistic tail
+        :param seed: seed of the jitter
+        """
+        self.universe = universe
+        self.latency = latency
+        self.jitter = jitter
+        self.block_number = 20_000_000
+        self.chain_id = 1
+        self.counts: "Counter[str]" = Counter()
+        self.connection_count = 0  # HTTP connections opened by the clients, when served over HTTP
+        self.head_listeners: List[Callable[[int], None]] = []  # called with each new block number
+        self._rng = random.Random(seed)
+        self._eth_calls: Dict[str, Tuple[str, Callable[[str, bytes], bytes]]] = {
+            _selector("symbol()"): ("symbol", self._symbol),
+            _selector("decimals()"): ("decimals", self._decimals),
+            _selector("getPair(address,address)"): ("getPair", self._get_pair),
+            _selector("getAmountsOut(uint256,address[])"): ("getAmountsOut", self._get_amounts_out),
+            _selector("getReserves()"): ("getReserves", self._get_reserves),
+            _selector("getPool(address,address,uint24)"): ("getPool", self._get_pool),
+            _selector("quoteExactInput(bytes,uint256)"): ("quoteExactInput", self._quote_exact_input),
+        }
+
+    @property
+    def rpc_count(self) -> int:
+        return sum(count for method, count in self.counts.items() if "." not in method)
+
+    def reset_counts(self) -> None:
+        self.counts.clear()
+        self.connection_count = 0
+
+    def advance_block(self, count: int = 1) -> None:
+        self.block_number += count
+        for listener in self.head_listeners:
+            listener(self.block_number)
+
+    async def handle(self, method: str, params: Sequence[Any]) -> Dict[str, Any]:
+        """
+        :return: the "result" or "error" member of the JSON-RPC response
+        """
+        self.counts[method] += 1
+        delay = self.latency + (self._rng.expovariate(1 / self.jitter) if self.jitter > 0 else 0.)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if method == "eth_chainId":
+            return {"result": hex(self.chain_id)}
+        elif method == "eth_blockNumber":
+            return {"result": hex(self.block_number)}
+        elif method == "eth_getCode":
+            address = params[0].lower()
+            return {"result": "0x00" if address in self.universe.tokens else "0x"}
+        elif method == "eth_call":
+            return self._eth_call(params[0]["to"], params[0].get("data") or params[0].get("input", "0x"))
+        return {"error": {"code": -32601, "message": f"the method {method} does not exist/is not available"}}
+
+    def _eth_call(self, to: str, data: str) -> Dict[str, Any]:
+        eth_call = self._eth_calls.get(data[:10])
+        if eth_call is None:
+            return {"error": {"code": -32000, "message": "execution reverted"}}
+        name, func = eth_call
+        self.counts[f"eth_call.{name}"] += 1
+        try:
+            return {"result": "0x" + func(to, bytes.fromhex(data[10:])).hex()}
+        except Reverted as e:
+            return {"error": {"code": 3, "message": f"execution reverted: {e}", "data": "0x"}}
+
+    def _symbol(self, to: str, args: bytes) -> bytes:
+        token = self.universe.tokens.get(to.lower())
+        return encode(["string"], [token.symbol]) if token else b""
+
+    def _decimals(self, to: str, args: bytes) -> bytes:
+        token = self.universe.tokens.get(to.lower())
+        return encode(["uint8"], [token.decimals]) if token else b""
+
+    def _get_pair(self, to: str, args: bytes) -> bytes:
+        token_a, token_b = decode(["address", "address"], args)
+        exists = (token_a.lower(), token_b.lower()) in self.universe.v2_pairs
+        return encode(["address"], [_pool_address(*sorted((token_a, token_b))) if exists else NULL_ADDRESS])
+
+    def _get_amounts_out(self, to: str, args: bytes) -> bytes:
+        amount_in, path = decode(["uint256", "address[]"], args)
+        amounts = [amount_in]
+        for token_in, token_out in zip(path, path[1:]):
+            amounts.append(self.universe.get_v2_amount_out(amounts[-1], token_in, token_out))
+        return encode(["uint256[]"], [amounts])
+
+    def _get_reserves(self, to: str, args: bytes) -> bytes:
+        tokens = self.universe.v2_pair_tokens.get(to.lower())
+        if tokens is None:
+            return b""
+        reserve0, reserve1 = self.universe.v2_pairs[tokens]
+        return encode(["uint112", "uint112", "uint32"], [reserve0, reserve1, self.block_number % 2 ** 32])
+
+    def _get_pool(self, to: str, args: bytes) -> bytes:
+        token_a, token_b, fee = decode(["address", "address", "uint24"], args)
+        exists = (token_a.lower(), token_b.lower(), fee) in self.universe.v3_pools
+        return encode(["address"], [_pool_address(*sorted((token_a, token_b)), fee) if exists else NULL_ADDRESS])
+
+    def _quote_exact_input(self, to: str, args: bytes) -> bytes:
+        path, amount = decode(["bytes", "uint256"], args)
+        hop_count = (len(path) - 20) // 23
+        for i in range(hop_count):
+            hop = path[i * 23:i * 23 + 43]
+            amount = self.universe.get_v3_amount_out(
+                amount,
+                "0x" + hop[:20].hex(),
+                int.from_bytes(hop[20:23], "big"),
+                "0x" + hop[23:].hex(),
+            )
+        return encode(
+            ["uint256", "uint160[]", "uint32[]", "uint256"],
+            [amount, [2 ** 96] * hop_count, [1] * hop_count, V3_HOP_GAS_ESTIMATE * hop_count],
+        )
+
+
+class FakeRpcProvider(AsyncBaseProvider):
+    def __init__(self, rpc: FakeRpc) -> None:
+        """
+        AsyncWeb3 provider calling the FakeRpc directly, without any transport.
+        """
+        super().__init__()
+        self.rpc = rpc
+        self._request_ids = 0
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        self._request_ids += 1
+        response = {"jsonrpc": "2.0", "id": self._request_ids}
+        response.update(await self.rpc.handle(method, params))
+        return response  # type: ignore
+
+    async def is_connected(self, show_traceback: bool = False) -> bool:
+        return True
+
+
+async def _handle_http_request(
+        rpc: FakeRpc,
+        request: web.Request,
+        connections: "weakref.WeakSet[Any]",
+        handshake_latency: float) -> web.Response:
+    if request.transport not in connections:  # first request on a new connection
+        connections.add(request.transport)
+        rpc.connection_count += 1
+        if handshake_latency:
+            await asyncio.sleep(handshake_latency)
+    payload = await request.json()
+
+    async def handle_one(rpc_request: Dict[str, Any]) -> Dict[str, Any]:
+        response = {"jsonrpc": "2.0", "id": rpc_request.get("id")}
+        response.update(await rpc.handle(rpc_request["method"], rpc_request.get("params") or []))
+        return response
+
+    if isinstance(payload, list):
+        body: Any = await asyncio.gather(*[handle_one(rpc_request) for rpc_request in payload])
+    else:
+        body = await handle_one(payload)
+    return web.Response(text=json.dumps(body), content_type="application/json")
+
+
+async def _handle_websocket(rpc: FakeRpc, request: web.Request) -> web.WebSocketResponse:
+    """
+    Serve the JSON-RPC requests over a WebSocket, concurrently, and push the new blocks to the newHeads subscriptions.
+    """
+    websocket = web.WebSocketResponse()
+    await websocket.prepare(request)
+    rpc.connection_count += 1
+    subscriptions: Dict[str, Callable[[int], None]] = {}
+    tasks: Set["asyncio.Task[None]"] = set()
+
+    def send(message: Dict[str, Any]) -> None:
+        task = asyncio.ensure_future(websocket.send_str(json.dumps(message)))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    async def handle_one(rpc_request: Dict[str, Any]) -> None:
+        response = {"jsonrpc": "2.0", "id": rpc_request.get("id")}
+        response.update(await rpc.handle(rpc_request["method"], rpc_request.get("params") or []))
+        send(response)
+
+    def subscribe(subscription_id: str) -> Callable[[int], None]:
+        def push_head(block_number: int) -> None:
+            head = {"number": hex(block_number), "hash": "0x" + block_number.to_bytes(32, "big").hex()}
+            send({"jsonrpc": "2.0", "method": "eth_subscription", "params": {"subscription": subscription_id, "result": head}})  # noqa
+        return push_head
+
+    try:
+        async for message in websocket:
+            if message.type not in (WSMsgType.TEXT, WSMsgType.BINARY):
+                continue
+            rpc_request = json.loads(message.data)
+            method, params = rpc_request["method"], rpc_request.get("params") or []
+            if method == "eth_subscribe" and params[:1] == ["newHeads"]:
+                rpc.counts[method] += 1
+                subscription_id = hex(len(subscriptions) + 1)
+                subscriptions[subscription_id] = subscribe(subscription_id)
+                rpc.head_listeners.append(subscriptions[subscription_id])
+                send({"jsonrpc": "2.0", "id": rpc_request.get("id"), "result": subscription_id})
+            elif method == "eth_unsubscribe":
+                rpc.counts[method] += 1
+                listener = subscriptions.pop(params[0], None)
+                if listener is not None:
+                    rpc.head_listeners.remove(listener)
+                send({"jsonrpc": "2.0", "id": rpc_request.get("id"), "result": listener is not None})
+            else:
+                task = asyncio.ensure_future(handle_one(rpc_request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+    finally:
+        for listener in subscriptions.values():
+            rpc.head_listeners.remove(listener)
+        for task in list(tasks):
+            task.cancel()
+    return websocket
+
+
+async def start_fake_rpc_server(
+        rpc: FakeRpc,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        handshake_latency: float = 0.) -> Tuple[web.AppRunner, str]:
+    """
+    Serve the FakeRpc over HTTP (single and batch requests), and over a WebSocket on the same url, with ws://.
+
+    :param handshake_latency: extra response time in seconds of the first request on each connection, to emulate the
+                              TCP and TLS handshakes with a remote endpoint
+    :return: the runner, to be cleaned up, and the endpoint url
+    """
+    connections: "weakref.WeakSet[Any]" = weakref.WeakSet()
+
+    async def handle(request: web.Request) -> web.Response:
+        return await _handle_http_request(rpc, request, connections, handshake_latency)
+
+    async def handle_websocket(request: web.Request) -> web.WebSocketResponse:
+        return await _handle_websocket(rpc, request)
+
+    app = web.Application()
+    app.router.add_post("/", handle)
+    app.router.add_get("/", handle_websocket)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    server = site._server
+    sockets = getattr(server, "sockets", None) or []
+    actual_port = sockets[0].getsockname()[1] if sockets else port
+    return runner, f"http://{host}:{actual_port}"
+
+
+def create_fake_w3(
+        universe: Optional[PoolUniverse] = None,
+        latency: float = 0.,
+        jitter: float = 0.,
+        seed: int = 0) -> Tuple[AsyncWeb3, FakeRpc]:
+    """
+    :return: an AsyncWeb3 instance using a FakeRpcProvider, and its FakeRpc
+    """
+    rpc = FakeRpc(universe or PoolUniverse.generate(seed=seed), latency, jitter, seed)
+    return AsyncWeb3(FakeRpcProvider(rpc)), rpc
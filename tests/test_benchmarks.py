@@ -0,0 +1,67 @@
+import pytest
+
+from benchmarks.run import (
+    compare,
+    percentile,
+    run_scenario,
+    scenarios,
+    Settings,
+)
+from uniswap_smart_path import SmartPath
+
+
+@pytest.mark.universe(seed=1)
+async def test_fake_rpc_smart_path(universe, fake_w3, fake_rpc, pairs):
+    smart_path = await SmartPath.create(fake_w3)
+    amount, token_in, token_out = pairs[0]
+
+    path = await smart_path.get_swap_in_path(amount, token_in, token_out)
+    assert sum(p["weight"] for p in path) == 100
+    for p in path:
+        assert p["path"][0] == token_in and p["path"][-1] == token_out
+        if p["function"] == "V2_SWAP_EXACT_IN" and len(p["path"]) == 2:
+            assert p["estimate"] == universe.get_v2_amount_out(amount * p["weight"] // 100, token_in, token_out)
+    assert fake_rpc.counts["eth_call.symbol"] == fake_rpc.counts["eth_call.decimals"] == 2
+
+
+async def test_run_scenario():
+    result = await run_scenario(scenarios["v2_only"], Settings(requests=4, concurrency=2, latency=0., jitter=0.))
+    assert result["requests"] == 4
+    assert result["errors"] == 0
+    assert result["requests_per_second"] > 0
+    assert 0 < result["latency"]["p50"] <= result["latency"]["p99"] <= result["latency"]["max"]
+    assert result["rpc_per_request"] > 0
+    assert set(result["eth_call_per_request"]) == {"eth_call.getAmountsOut", "eth_call.getPair", "eth_call.decimals", "eth_call.symbol"}  # noqa
+
+
+@pytest.mark.parametrize(
+    "values, quantile, expected_value",
+    (
+        ((), 0.5, 0.),
+        ((1., ), 0.99, 1.),
+        ((1., 2., 3., 4.), 0.5, 2.),
+        (tuple(range(1, 101)), 0.99, 99),
+    )
+)
+def test_percentile(values, quantile, expected_value):
+    assert percentile(values, quantile) == expected_value
+
+
+def test_compare():
+    def build_report(requests_per_second, p99):
+        return {
+            "results": [
+                {
+                    "scenario": {"name": "v2_only"},
+                    "requests_per_second": requests_per_second,
+                    "latency": {"p50": 0.1, "p99": p99},
+                    "rpc_per_request": 10.,
+                },
+            ]
+        }
+
+    lines = compare(build_report(20., 0.2), build_report(10., 0.4))
+    assert lines == [
+        "v2_only: req/s 10 -> 20 (+100.0% better), p50 0.1 -> 0.1 (+0.0%), p99 0.4 -> 0.2 (-50.0% better), "
+        "rpc/req 10 -> 10 (+0.0%)"
+    ]
@@ -0,0 +1,83 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from uniswap_smart_path import (
+    BlockTracker,
+    RouteCache,
+    SmartPath,
+)
+
+from .fake_rpc import start_fake_rpc_server
+
+
+@asynccontextmanager
+async def serve_websocket(rpc):
+    runner, endpoint = await start_fake_rpc_server(rpc)
+    try:
+        yield endpoint.replace("http://", "ws://")
+    finally:
+        await runner.cleanup()
+
+
+async def test_block_tracker_errors(fake_w3):
+    with pytest.raises(ValueError):
+        _ = BlockTracker(fake_w3)  # not a persistent provider
+
+
+async def test_block_tracker(fake_rpc):
+    async with serve_websocket(fake_rpc) as endpoint:
+        smart_path = await SmartPath.create_v2_only(rpc_endpoint=endpoint)
+        try:
+            with pytest.raises(ValueError):
+                _ = BlockTracker(smart_path.w3, max_age=0)
+            new_blocks = []
+            block_tracker = BlockTracker(smart_path.w3, max_age=0.2)
+            block_tracker.add_listener(new_blocks.append)
+            async with block_tracker:
+                assert await block_tracker.wait_for_block(1) == fake_rpc.block_number
+                assert block_tracker.is_running
+
+                fake_rpc.advance_block()
+                assert await block_tracker.wait_for_block(1) == fake_rpc.block_number
+                assert block_tracker.get_block_number() == fake_rpc.block_number
+                assert new_blocks == [fake_rpc.block_number - 1, fake_rpc.block_number]
+                assert await block_tracker.wait_for_block(0.01) is None
+
+                await asyncio.sleep(0.2)
+                assert block_tracker.get_block_number() is None  # no head within max_age
+            assert not block_tracker.is_running
+            assert fake_rpc.counts["eth_unsubscribe"] == 1
+        finally:
+            await smart_path.w3.provider.disconnect()
+
+
+async def test_smart_path_block_tracker(fake_rpc, pairs):
+    route_cache = RouteCache()
+    async with serve_websocket(fake_rpc) as endpoint:
+        smart_path = await SmartPath.create(rpc_endpoint=endpoint, route_cache=route_cache)
+        try:
+            block_tracker = smart_path.start_block_tracker()
+            first_block_number = await block_tracker.wait_for_block(1)
+            pair = pairs[0]
+            fake_rpc.reset_counts()
+            path, block_number = await smart_path.get_swap_in_path_with_block(*pair)
+            assert path
+            assert block_number == first_block_number
+            assert await smart_path.get_swap_in_path(*pair) == path
+            assert route_cache.hits == 1
+            assert fake_rpc.counts["eth_blockNumber"] == 0  # pushed, not polled
+
+            warmer = smart_path.start_route_warmer([pair], poll_interval=60)  # woken up by the new blocks
+            await asyncio.sleep(0.05)
+            fake_rpc.advance_block()
+            assert await block_tracker.wait_for_block(1) == first_block_number + 1
+            assert route_cache.block_number == first_block_number + 1  # invalidated by the push
+            await asyncio.sleep(0.2)
+            assert warmer.get_staleness(*pair).block_number == first_block_number + 1
+            assert fake_rpc.counts["eth_blockNumber"] == 0
+            await warmer.stop()
+            await block_tracker.stop()
+        finally:
+            await smart_path.w3.provider.disconnect()
@@ -0,0 +1,100 @@
+from eth_abi import encode
+import pytest
+from uniswap_universal_router_decoder import RouterCodec
+from web3 import AsyncWeb3
+from web3.exceptions import BadFunctionCallOutput
+
+from uniswap_smart_path._calls import (
+    CallTemplate,
+    decimals,
+    encode_v3_path,
+    get_amounts_out,
+    get_pair,
+    get_pool,
+    get_reserves,
+    quote_exact_input,
+    symbol,
+)
+from uniswap_smart_path._constants import (
+    erc20_abi,
+    uniswapv2_abi,
+    uniswapv2_factory_abi,
+    uniswapv3_factory_abi,
+    uniswapv3_quoter_abi,
+)
+
+from .conftest import tokens
+
+
+usdc, weth, dai = tokens["USDC"].address, tokens["WETH"].address, tokens["DAI"].address
+v3_path = (usdc, 500, weth, 3000, dai)
+
+
+def get_contract(abi):
+    return AsyncWeb3().eth.contract(AsyncWeb3.to_checksum_address("0x" + "11" * 20), abi=abi)
+
+
+@pytest.mark.parametrize(
+    "function, abi, args",
+    (
+        (symbol, erc20_abi, ()),
+        (decimals, erc20_abi, ()),
+        (get_pair, uniswapv2_factory_abi, (usdc, weth)),
+        (get_pool, uniswapv3_factory_abi, (usdc, weth, 500)),
+        (get_amounts_out, uniswapv2_abi, (10**18, (weth, usdc, dai))),
+        (quote_exact_input, uniswapv3_quoter_abi, (encode_v3_path(v3_path), 10**6)),
+    )
+)
+def test_encode(function, abi, args):
+    contract_function = getattr(get_contract(abi).functions, function.fn_name)(*args)
+    assert function.encode(*args).hex() == contract_function._encode_transaction_data()[2:].lower()
+
+
+def test_encode_v3_path():
+    assert encode_v3_path(v3_path) == RouterCodec().encode.v3_path("V3_SWAP_EXACT_IN", v3_path)
+
+
+@pytest.mark.parametrize(
+    "function, data, expected_result",
+    (
+        (symbol, encode(["string"], ["USDC"]), "USDC"),
+        (decimals, encode(["uint8"], [6]), 6),
+        (get_pair, encode(["address"], [usdc.lower()]), usdc),
+        (get_amounts_out, encode(["uint256[]"], [[10**18, 2000 * 10**6]]), [10**18, 2000 * 10**6]),
+        (get_reserves, encode(["uint112", "uint112", "uint32"], [10**21, 2 * 10**12, 7]), [10**21, 2 * 10**12, 7]),
+        (quote_exact_input, encode(["uint256", "uint160[]", "uint32[]", "uint256"], [5, [1], [2], 3]), [5, [1], [2], 3]),  # noqa
+    )
+)
+def test_decode(function, data, expected_result):
+    assert function.decode(data) == expected_result
+
+
+@pytest.mark.parametrize(
+    "function, data",
+    (
+        (decimals, b""),
+        (symbol, b"MKR" + bytes(29)),  # bytes32 symbol
+        (symbol, encode(["bytes"], [b"\xff\xfe"])),  # not utf-8
+    )
+)
+def test_decode_bad_output(function, data):
+    with pytest.raises(BadFunctionCallOutput):
+        function.decode(data)
+
+
+@pytest.mark.parametrize(
+    "function, amount_position, args",
+    (
+        (get_amounts_out, 0, [10**18, (weth, usdc, dai)]),
+        (quote_exact_input, 1, [encode_v3_path(v3_path), 10**6]),
+    )
+)
+def test_call_template(function, amount_position, args):
+    call_template = CallTemplate(usdc, function, amount_position, *args)
+    for amount in (0, 1, 10**30):
+        args[amount_position] = amount
+        assert call_template.build(amount).data == function.encode(*args)
+    with pytest.raises(ValueError):
+        call_template.build(-1)
+    with pytest.raises(ValueError):
+        function.encode(*([-1] + args[1:] if amount_position == 0 else args[:1] + [-1]))
@@ -0,0 +1,75 @@
+import gzip
+import json
+
+import pytest
+from web3 import AsyncWeb3
+
+from benchmarks.cassette import replay
+from uniswap_smart_path import (
+    Cassette,
+    RecordingProvider,
+    ReplayProvider,
+    SmartPath,
+)
+
+from .fake_rpc import FakeRpcProvider
+
+
+@pytest.mark.universe(seed=2)
+@pytest.mark.pairs(count=3)
+async def test_record_and_replay(tmp_path, fake_rpc, pairs):
+    recording_provider = RecordingProvider(FakeRpcProvider(fake_rpc))
+    smart_path = await SmartPath.create_v2_only(AsyncWeb3(recording_provider))
+    recorded_paths = []
+    for amount, token_in, token_out in pairs:
+        recorded_paths.append(await smart_path.get_swap_in_path(amount, token_in, token_out))
+        recording_provider.cassette.add_request(amount, token_in, token_out)
+    fake_rpc.advance_block()  # ignored by the recording
+    assert await recording_provider.make_request("eth_blockNumber", []) == {
+        "jsonrpc": "2.0",
+        "id": 0,
+        "result": hex(recording_provider.cassette.block_number),
+    }
+
+    file_path = str(tmp_path / "cassette.json.gz")
+    recording_provider.save(file_path)
+    cassette = Cassette.load(file_path)
+    assert cassette.block_number == fake_rpc.block_number - 1
+    assert cassette.workload == pairs
+    assert len(cassette.interactions) == len(recording_provider.cassette.interactions)
+
+    replay_provider = ReplayProvider(cassette)
+    smart_path = await SmartPath.create_v2_only(AsyncWeb3(replay_provider))
+    for (amount, token_in, token_out), recorded_path in zip(pairs, recorded_paths):
+        assert await smart_path.get_swap_in_path(amount, token_in, token_out) == recorded_path
+    assert replay_provider.misses == []
+
+    cassette.metadata["factory"] = "create_v2_only"
+    result = await replay(cassette, concurrency=2)
+    assert result["errors"] == result["misses"] == 0
+    assert result["requests"] == 3
+
+
+def test_pin_params():
+    cassette = Cassette(100)
+    assert cassette.pin_params("eth_call", [{"to": "0x01"}]) == [{"to": "0x01"}, "0x64"]
+    assert cassette.pin_params("eth_call", [{"to": "0x01"}, "latest"]) == [{"to": "0x01"}, "0x64"]
+    assert cassette.pin_params("eth_call", [{"to": "0x01"}, "0x10"]) == [{"to": "0x01"}, "0x10"]
+    assert cassette.pin_params("eth_getStorageAt", ["0x01", "0x0", "safe"]) == ["0x01", "0x0", "0x64"]
+    assert cassette.pin_params("eth_chainId", []) == []
+
+
+async def test_replay_miss():
+    provider = ReplayProvider(Cassette(100))
+    response = await provider.make_request("eth_call", [{"to": "0x01"}, "latest"])
+    assert response["error"]["code"] == -32000
+    assert provider.misses == [("eth_call", [{"to": "0x01"}, "0x64"])]
+    assert provider.request_count == 1
+
+
+def test_load_unsupported_version(tmp_path):
+    file_path = str(tmp_path / "cassette.json.gz")
+    with gzip.open(file_path, "wt") as f:
+        json.dump({"version": 2}, f)
+    with pytest.raises(ValueError):
+        Cassette.load(file_path)
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from uniswap_smart_path import ConcurrencyLimiter
+from uniswap_smart_path._context import (  # noqa
+    current_low_priority,
+    current_request_id,
+)
+
+
+async def test_concurrency_limiter_cap():
+    limiter = ConcurrencyLimiter(3)
+    max_seen = 0
+
+    async def rpc():
+        nonlocal max_seen
+        async with limiter:
+            max_seen = max(max_seen, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*[rpc() for _ in range(20)])
+    stats = limiter.get_stats()
+    assert max_seen == 3
+    assert stats.in_flight == stats.queue_depth == 0
+    assert stats.acquired_count == 20
+    assert stats.waited_count == 17
+    assert stats.max_queue_depth == 17
+    assert 0 < stats.mean_wait_time <= stats.max_wait_time <= stats.total_wait_time
+
+
+async def test_concurrency_limiter_fair_queuing():
+    limiter = ConcurrencyLimiter(1)
+    order = []
+
+    async def rpc(request_id):
+        current_request_id.set(request_id)
+        async with limiter:
+            order.append(request_id)
+            await asyncio.sleep(0.001)
+
+    # request 1 queues 5 calls before request 2 queues its 2 calls
+    await asyncio.gather(*[rpc(1) for _ in range(6)], *[rpc(2) for _ in range(2)])
+    assert order == [1, 1, 2, 1, 2, 1, 1, 1]
+
+
+async def test_concurrency_limiter_cancellation():
+    limiter = ConcurrencyLimiter(1)
+    await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    assert limiter.queue_depth == 1
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert limiter.queue_depth == 0
+
+    limiter.release()
+    assert limiter.in_flight == 0
+
+
+def test_concurrency_limiter_exception():
+    with pytest.raises(ValueError):
+        _ = ConcurrencyLimiter(0)
+
+
+async def test_concurrency_limiter_low_priority():
+    limiter = ConcurrencyLimiter(1)
+    order = []
+
+    async def rpc(name, is_low_priority=False):
+        current_low_priority.set(is_low_priority)
+        async with limiter:
+            order.append(name)
+            await asyncio.sleep(0.001)
+
+    await asyncio.gather(rpc("first"), rpc("warmer", True), rpc("second"), rpc("third"))
+    assert order == ["first", "second", "third", "warmer"]
+    assert limiter.queue_depth == 0
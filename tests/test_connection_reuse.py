@@ -0,0 +1,35 @@
+import pytest
+
+from benchmarks.connection_reuse import (
+    format_report,
+    ReuseSettings,
+    run,
+    run_mode,
+)
+
+
+async def test_run():
+    settings = ReuseSettings(
+        instances=2,
+        requests_per_instance=1,
+        concurrency=1,
+        factory="create_v2_only",
+        handshake_latency=0.,
+        latency=0.,
+        jitter=0.,
+        token_count=6,
+    )
+    report = await run(settings)
+    results = {result["scenario"]["name"]: result for result in report["results"]}
+    assert list(results) == ["no_reuse", "per_instance", "shared"]
+    for result in results.values():
+        assert result["errors"] == 0
+        assert result["requests"] == 2
+    assert results["no_reuse"]["rpc_per_connection"] == 1
+    assert results["shared"]["connections"] <= results["per_instance"]["connections"] < results["no_reuse"]["connections"]  # noqa
+    assert len(format_report(report)) == 3
+
+
+async def test_run_mode_error():
+    with pytest.raises(ValueError):
+        await run_mode("unknown", ReuseSettings())
@@ -1,9 +1,12 @@
+import pickle
+
 import pytest
 from web3.types import Wei
 
 from uniswap_smart_path import SmartPath
 from uniswap_smart_path._datastructures import (  # noqa
     MixedWeightedPath,
+    PoolPathCache,
     RouterFunction,
     Token,
     V2OrderedPool,
@@ -65,3 +68,27 @@ async def test_mixed_weighted_path(w3):
 
     # test compute_path_values except statement
     await mixed_path.compute_path_values(-1)  # noqa
+
+
+def test_pool_path_cache():
+    pool_path_cache = PoolPathCache(max_size=2)
+    v2_pools = (V2OrderedPool(tokens["DAI"], tokens["USDC"]), )
+    v3_pools = (V3OrderedPool(tokens["DAI"], 500, tokens["USDC"]), )
+    v2_pool_path = pool_path_cache.get_v2_pool_path(v2_pools)
+    v3_pool_path = pool_path_cache.get_v3_pool_path(v3_pools)
+    assert pool_path_cache.get_v2_pool_path(v2_pools) is v2_pool_path
+    assert pool_path_cache.get_v3_pool_path(v3_pools) is v3_pool_path
+    assert v2_pool_path.get_weighted_path(40) is v2_pool_path.get_weighted_path(40)
+    assert v3_pool_path.get_weighted_path(60) == WeightedPath(RouterFunction.V3_SWAP_EXACT_IN, v3_pool_path, 60)
+
+    pool_path_cache.get_v2_pool_path((V2OrderedPool(tokens["USDC"], tokens["DAI"]), ))  # evicts v2_pool_path
+    assert len(pool_path_cache) == 2
+    assert pool_path_cache.get_v2_pool_path(v2_pools) is not v2_pool_path
+    assert pool_path_cache.get_v3_pool_path(v3_pools) is not v3_pool_path
+
+
+def test_slots():
+    v3_pool_path = V3PoolPath([V3OrderedPool(tokens["DAI"], 500, tokens["USDC"])])
+    for obj in (tokens["DAI"], v3_pool_path, v3_pool_path.get_weighted_path(100), MixedWeightedPath([])):
+        assert not hasattr(obj, "__dict__")
+    assert pickle.loads(pickle.dumps(tokens["DAI"])) == tokens["DAI"]
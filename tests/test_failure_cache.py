@@ -0,0 +1,78 @@
+import pytest
+
+from uniswap_smart_path import (
+    FailureCache,
+    SmartPath,
+)
+
+from .fake_rpc import Reverted
+
+
+path = ("0x1f9840a85d5aF5bf1D1762F925BDADdC4201F984", 3000, "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2")
+
+
+def test_failure_cache():
+    failure_cache = FailureCache(base_ttl=60, max_ttl=200)
+    assert not failure_cache.is_failing(path)
+    failure_cache.add_failure(path, "execution reverted: SPL")
+    assert failure_cache.is_failing(path)
+    assert failure_cache.is_failing(list(path))
+
+    failures = failure_cache.get_failures()
+    assert [(f.path, f.reason, f.count) for f in failures] == [(path, "execution reverted: SPL", 1)]
+    assert 59 < failures[0].retry_in <= 60
+
+    failure_cache.add_failure(path, "execution reverted")
+    failure_cache.add_failure(path, "execution reverted")
+    failure_cache.add_failure(path, "execution reverted")
+    assert failure_cache.get_failures()[0].count == 4
+    assert 199 < failure_cache.get_failures()[0].retry_in <= 200  # 60 * 2**3, capped
+
+    failure_cache.add_success(path)
+    assert not failure_cache.is_failing(path)
+    assert len(failure_cache) == 0
+    assert failure_cache.skipped == 2
+
+
+def test_failure_cache_max_size():
+    failure_cache = FailureCache(max_size=2)
+    for i in range(3):
+        failure_cache.add_failure(path + (i, ), "execution reverted")
+    assert [f.path[-1] for f in failure_cache.get_failures()] == [1, 2]
+
+
+def test_failure_cache_errors():
+    with pytest.raises(ValueError):
+        _ = FailureCache(base_ttl=0)
+    with pytest.raises(ValueError):
+        _ = FailureCache(base_ttl=60, max_ttl=30)
+    with pytest.raises(ValueError):
+        _ = FailureCache(max_size=0)
+
+
+@pytest.mark.universe(token_count=10)
+@pytest.mark.pairs(count=5)
+async def test_failing_paths_skipped(universe, fake_w3, fake_rpc, pairs):
+    get_v3_amount_out = universe.get_v3_amount_out
+
+    def get_v3_amount_out_reverting(amount_in, token_in, fee, token_out):  # eg a fee-on-transfer token
+        if fee == 10000:
+            raise Reverted("SPL")
+        return get_v3_amount_out(amount_in, token_in, fee, token_out)
+
+    universe.get_v3_amount_out = get_v3_amount_out_reverting
+    paths = [await (await SmartPath.create(fake_w3)).get_swap_in_path(*pair) for pair in pairs]
+
+    failure_cache = FailureCache()
+    smart_path = await SmartPath.create(fake_w3, failure_cache=failure_cache)
+    quote_counts = []
+    for _ in range(2):
+        fake_rpc.reset_counts()
+        assert [await smart_path.get_swap_in_path(*pair) for pair in pairs] == paths
+        quote_counts.append(fake_rpc.counts["eth_call.quoteExactInput"])
+
+    assert quote_counts[1] < quote_counts[0]
+    assert failure_cache.skipped > 0
+    failures = failure_cache.get_failures()
+    assert len(failures) > 0
+    assert all(10000 in failure.path and "SPL" in failure.reason for failure in failures)
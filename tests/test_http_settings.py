@@ -0,0 +1,70 @@
+import pytest
+
+from uniswap_smart_path import (
+    HttpSettings,
+    SmartPath,
+)
+
+from .fake_rpc import start_fake_rpc_server
+
+
+async def test_http_settings():
+    http_settings = HttpSettings(pool_size=10, pool_size_per_host=5, keepalive_timeout=30, timeout=2)
+    session = http_settings.create_session()
+    try:
+        assert session.connector.limit == 10
+        assert session.connector.limit_per_host == 5
+        assert session.timeout.total == 2
+    finally:
+        await session.close()
+    assert http_settings.get_request_kwargs()["timeout"].total == 2
+
+
+def test_http_settings_errors():
+    with pytest.raises(ValueError):
+        _ = HttpSettings(pool_size=-1)
+    with pytest.raises(ValueError):
+        _ = HttpSettings(timeout=0)
+
+
+async def test_shared_http_session(fake_rpc, pairs):
+    runner, endpoint = await start_fake_rpc_server(fake_rpc)
+    session = HttpSettings(pool_size=4).create_session()
+    try:
+        smart_paths = [await SmartPath.create_v2_only(rpc_endpoint=endpoint, http_session=session) for _ in range(2)]
+        fake_rpc.reset_counts()
+        for smart_path, pair in zip(smart_paths, pairs):
+            assert await smart_path.get_swap_in_path(*pair)
+        assert 0 < fake_rpc.connection_count <= 4  # the connections of the first instance are reused by the second one
+    finally:
+        await session.close()
+        await runner.cleanup()
+
+
+async def test_close(fake_rpc, pairs):
+    pair = pairs[0]
+    runner, endpoint = await start_fake_rpc_server(fake_rpc)
+    shared_session = HttpSettings().create_session()
+    try:
+        async with await SmartPath.create_v2_only(rpc_endpoint=endpoint, http_settings=HttpSettings()) as smart_path:
+            assert await smart_path.get_swap_in_path(*pair)
+            sessions = list(smart_path.w3.provider._request_session_manager.session_cache._data.values())
+            assert len(sessions) == 1
+        assert sessions[0].closed  # created by the SmartPath
+
+        smart_path = await SmartPath.create_v2_only(rpc_endpoint=endpoint, http_session=shared_session)
+        await smart_path.close()
+        assert not shared_session.closed  # owned by the caller
+    finally:
+        await shared_session.close()
+        await runner.cleanup()
+
+
+async def test_phase_timeouts(fake_w3, fake_rpc, pairs):
+    pair = pairs[0]
+    fake_rpc.latency = 0.05
+    smart_path = await SmartPath.create(fake_w3, discovery_timeout=1, quote_timeout=0.01)
+    assert await smart_path.get_swap_in_path(*pair) == ()  # pools found, but all the quotes timed out
+
+    smart_path = await SmartPath.create(fake_w3, discovery_timeout=1, quote_timeout=1)
+    assert await smart_path.get_swap_in_path(*pair)
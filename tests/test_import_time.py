@@ -0,0 +1,7 @@
+from benchmarks.import_time import measure
+
+
+def test_import_time():
+    result = measure(runs=1)
+    assert result["imported_lazy_modules"] == []
+    assert result["library"] < 0.5  # generous, to catch regressions like building objects at import time
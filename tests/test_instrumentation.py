@@ -0,0 +1,108 @@
+import pytest
+
+from uniswap_smart_path import (
+    CallbackSink,
+    HistogramSink,
+    Instrumentation,
+    PrometheusSink,
+    RequestMetrics,
+)
+from uniswap_smart_path._context import current_metrics
+from uniswap_smart_path.instrumentation import (
+    add_candidates,
+    Histogram,
+    stage,
+)
+
+
+def build_metrics(request_id=1, total_time=0.2, error=None):
+    metrics = RequestMetrics(request_id, 10**18, "0xIn", "0xOut", total_time=total_time, error=error)
+    metrics.add_stage_time("discovery", 0.15)
+    metrics.add_stage_time("quotes", 0.04)
+    metrics.add_rpc("eth_call.getPair")
+    metrics.add_rpc("eth_call.getPair")
+    metrics.add_rpc("eth_call.getPool")
+    metrics.add_cache_lookup("route", False)
+    metrics.candidate_count = 5
+    return metrics
+
+
+@pytest.mark.parametrize(
+    "values, quantile, expected_value",
+    (
+        ((), 0.5, 0.),
+        ((0.2, ), 0.5, 0.25),
+        ((0.001, 0.02, 0.02, 0.3), 0.5, 0.025),
+        ((0.001, 0.02, 0.02, 0.3), 0.99, 0.5),
+        ((0.001, 20.), 1., float("inf")),
+    )
+)
+def test_histogram_quantile(values, quantile, expected_value):
+    histogram = Histogram()
+    for value in values:
+        histogram.observe(value)
+    assert histogram.get_quantile(quantile) == expected_value
+    assert histogram.count == len(values)
+    assert histogram.get_cumulative_counts()[-1] == (float("inf"), len(values))
+
+
+def test_histogram_sink():
+    sink = HistogramSink()
+    sink.record(build_metrics(1))
+    sink.record(build_metrics(2, total_time=3., error="ValueError()"))
+
+    assert sink.request_count == 2
+    assert sink.error_count == 1
+    assert sink.total_time.get_quantile(0.5) == 0.25
+    assert sink.total_time.get_quantile(1.) == 5.
+    assert sink.stage_times["discovery"].count == 2
+    assert sink.rpc_counts == {"eth_call.getPair": 4, "eth_call.getPool": 2}
+    assert sink.candidate_count == 10
+    assert sink.cache_hit_ratio("route") == 0.
+    assert sink.cache_hit_ratio("unknown") == 0.
+
+
+def test_prometheus_sink():
+    sink = PrometheusSink(buckets=(0.1, 1.), prefix="usp")
+    sink.record(build_metrics())
+    exposition = sink.exposition()
+
+    assert "# TYPE usp_requests_total counter\nusp_requests_total 1\n" in exposition
+    assert 'usp_request_duration_seconds_bucket{le="0.1"} 0\n' in exposition
+    assert 'usp_request_duration_seconds_bucket{le="1.0"} 1\n' in exposition
+    assert 'usp_request_duration_seconds_bucket{le="+Inf"} 1\n' in exposition
+    assert 'usp_stage_duration_seconds_count{stage="quotes"} 1\n' in exposition
+    assert 'usp_rpc_requests_total{method="eth_call.getPair"} 2\n' in exposition
+    assert 'usp_cache_misses_total{cache="route"} 1\n' in exposition
+    assert exposition.endswith("\n")
+
+
+def test_instrumentation_record():
+    recorded = []
+
+    def failing_callback(metrics):
+        raise RuntimeError("sink is down")
+
+    instrumentation = Instrumentation([CallbackSink(failing_callback), CallbackSink(recorded.append)])
+    metrics = build_metrics()
+    instrumentation.record(metrics)  # a failing sink must not break the request nor the other sinks
+    assert recorded == [metrics]
+    assert metrics.rpc_count == 3
+
+
+def test_stage_and_candidates():
+    with stage("tokens"):
+        add_candidates(3)  # no-op when the request is not instrumented
+
+    metrics = RequestMetrics(1, 10**18, "0xIn", "0xOut")
+    token = current_metrics.set(metrics)
+    try:
+        with stage("tokens"):
+            add_candidates(3)
+        with stage("tokens"):
+            add_candidates(2)
+    finally:
+        current_metrics.reset(token)
+
+    assert metrics.stage_times["tokens"] > 0
+    assert metrics.candidate_count == 5
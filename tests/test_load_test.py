@@ -0,0 +1,51 @@
+import pytest
+
+from benchmarks.load_test import (
+    find_saturation_point,
+    format_report,
+    LoadSettings,
+    run,
+)
+
+
+async def test_run():
+    settings = LoadSettings(
+        callers=(2, 1),
+        requests_per_caller=1,
+        factory="create_v2_only",
+        max_count=1000,
+        latency=0.,
+        jitter=0.,
+        token_count=6,
+    )
+    report = await run(settings)
+    assert [result["scenario"]["callers"] for result in report["results"]] == [1, 2]
+    for result in report["results"]:
+        assert result["errors"] == 0
+        assert result["requests"] == result["scenario"]["callers"]
+        assert result["rpc_per_second"] > 0
+        assert result["rate_limiter_wait_time"]["max"] >= result["rate_limiter_wait_time"]["p50"] >= 0
+    assert len(format_report(report)) == 3
+
+
+def test_create_smart_rate_limiter():
+    assert LoadSettings(max_count=0).create_smart_rate_limiter() is None
+    assert LoadSettings(max_count=10).create_smart_rate_limiter().max_count == 10
+    smart_rate_limiter = LoadSettings(max_credits=100, eth_call_credits=20).create_smart_rate_limiter()
+    assert smart_rate_limiter.get_method_credits("eth_call") == 20
+
+
+@pytest.mark.parametrize(
+    "requests_per_second, expected_callers",
+    (
+        ((10., 19., 30., 31.), 4),
+        ((10., 10.5), 1),
+        ((10., 20., 40.), None),
+    )
+)
+def test_find_saturation_point(requests_per_second, expected_callers):
+    results = [
+        {"scenario": {"callers": 2 ** i}, "requests_per_second": value}
+        for i, value in enumerate(requests_per_second)
+    ]
+    assert find_saturation_point(results, 0.1) == expected_callers
@@ -0,0 +1,158 @@
+import asyncio
+import io
+import json
+import os
+import threading
+
+import pytest
+
+from uniswap_smart_path import (
+    QuotePipeline,
+    RouteCache,
+    SmartPath,
+)
+from uniswap_smart_path.__main__ import create_parser
+from uniswap_smart_path._quotes import format_quote
+from uniswap_smart_path.pipeline import (
+    get_resume_row,
+    read_lines,
+)
+
+
+pytestmark = [pytest.mark.universe(token_count=10), pytest.mark.pairs(count=6)]
+
+
+def to_line(pair):
+    amount, token_in, token_out = pair
+    return json.dumps({"amount": str(amount), "token_in": token_in, "token_out": token_out}) + "\n"
+
+
+async def create_smart_path(w3):
+    return await SmartPath.create(w3, route_cache=RouteCache())
+
+
+def read_rows(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+async def test_pipeline(fake_w3, pairs):
+    smart_path = await create_smart_path(fake_w3)
+    expected_rows = [
+        json.loads(json.dumps(format_quote(await smart_path.get_swap_in_path_with_block(*pair)))) for pair in pairs
+    ]
+
+    in_flight = [0, 0]  # current, maximum
+    get_swap_in_path_with_block = smart_path.get_swap_in_path_with_block
+
+    async def counting_get_swap_in_path_with_block(*args, **kwargs):
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight)
+        try:
+            return await get_swap_in_path_with_block(*args, **kwargs)
+        finally:
+            in_flight[0] -= 1
+
+    smart_path.get_swap_in_path_with_block = counting_get_swap_in_path_with_block
+    lines = [to_line(pair) for pair in pairs[:3]] + ["\n", "not json\n", '{"amount": 1}\n'] + [to_line(pair) for pair in pairs[3:]]  # noqa
+    output = io.StringIO()
+    stats = await QuotePipeline(smart_path, max_in_flight=2).run(lines, output)
+    rows = [json.loads(line) for line in output.getvalue().splitlines()]
+
+    assert [row["row"] for row in rows] == [0, 1, 2, 4, 5, 6, 7, 8]  # in the input order, blank line ignored
+    assert [{key: row[key] for key in ("block_number", "paths")} for row in rows if "error" not in row] == expected_rows  # noqa
+    assert rows[0]["request"] == json.loads(lines[0])
+    assert rows[3]["request"] == "not json"
+    assert "Missing field(s)" in rows[4]["error"]
+    assert (stats.rows, stats.errors, stats.skipped) == (8, 2, 0)
+    assert in_flight[1] == 2
+
+
+async def test_pipeline_block_number(fake_w3, fake_rpc, pairs):
+    smart_path = await create_smart_path(fake_w3)
+    block_number = fake_rpc.block_number
+    fake_rpc.advance_block()
+    output = io.StringIO()
+    await QuotePipeline(smart_path, block_number=block_number).run([to_line(pair) for pair in pairs], output)
+    assert {json.loads(line)["block_number"] for line in output.getvalue().splitlines()} == {block_number}
+
+    with pytest.raises(ValueError):
+        _ = QuotePipeline(smart_path, max_in_flight=0)
+
+
+async def test_pipeline_resume(tmp_path, fake_w3, pairs):
+    input_path = tmp_path / "requests.jsonl"
+    input_path.write_text("".join(to_line(pair) for pair in pairs))
+    output_path = tmp_path / "quotes.jsonl"
+    assert get_resume_row(str(output_path)) == 0
+
+    smart_path = await create_smart_path(fake_w3)
+    pipeline = QuotePipeline(smart_path)
+    await pipeline.run_file(str(input_path), str(output_path))
+    expected_rows = read_rows(output_path)
+
+    with open(output_path) as f:
+        lines = f.readlines()
+    output_path.write_text("".join(lines[:2]) + lines[2][:10])  # interrupted while writing the third row
+    assert get_resume_row(str(output_path)) == 2
+    assert output_path.read_text() == "".join(lines[:2])  # truncated
+
+    stats = await pipeline.run_file(str(input_path), str(output_path))
+    assert (stats.rows, stats.skipped) == (4, 2)
+    assert read_rows(output_path) == expected_rows
+
+    stats = await pipeline.run_file(str(input_path), str(output_path))  # already complete
+    assert (stats.rows, stats.skipped) == (0, 6)
+
+    stats = await pipeline.run_file(str(input_path), str(output_path), resume=False)
+    assert stats.rows == 6
+    assert read_rows(output_path) == expected_rows
+
+
+async def test_pipeline_streaming_input(fake_w3, pairs):
+    smart_path = await create_smart_path(fake_w3)
+    read_fd, write_fd = os.pipe()
+    lock = threading.Lock()
+    sent = []
+
+    def send_last_row():
+        with lock:
+            if not sent:
+                sent.append(True)
+                os.write(write_fd, to_line(pairs[1]).encode())
+                os.close(write_fd)
+
+    timer = threading.Timer(5, send_last_row)  # unblock the pipeline if it waits for the input on the event loop
+    timer.start()
+    os.write(write_fd, to_line(pairs[0]).encode())
+    output = io.StringIO()
+    with open(read_fd) as input_file:
+        run = asyncio.ensure_future(QuotePipeline(smart_path).run(read_lines(input_file, 1), output))
+        while not output.getvalue():
+            await asyncio.sleep(0.01)
+        assert not sent  # the first row is quoted while the next one is awaited
+        send_last_row()
+        stats = await run
+    timer.cancel()
+    assert stats.rows == 2
+
+
+async def test_pipeline_output_off_the_event_loop(fake_w3, pairs):
+    smart_path = await create_smart_path(fake_w3)
+
+    class ThreadRecordingOutput(io.StringIO):
+        threads = set()
+
+        def write(self, text):
+            self.threads.add(threading.get_ident())
+            return super().write(text)
+
+    output = ThreadRecordingOutput()
+    stats = await QuotePipeline(smart_path).run([to_line(pair) for pair in pairs], output)
+    assert stats.rows == len(output.getvalue().splitlines()) == len(pairs)
+    assert threading.get_ident() not in output.threads
+
+
+def test_command_line():
+    args = create_parser().parse_args(["quote", "--rpc-endpoint", "http://localhost:8545", "--output", "quotes.jsonl"])
+    assert (args.input, args.output, args.concurrency, args.block_number, args.no_resume) == ("-", "quotes.jsonl", 32, None, False)  # noqa
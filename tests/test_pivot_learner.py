@@ -0,0 +1,89 @@
+import pytest
+
+from uniswap_smart_path import (
+    PivotLearner,
+    SmartPath,
+)
+
+from .fake_rpc import (
+    FakeToken,
+    to_address,
+)
+
+
+token = "0x1f9840a85d5aF5bf1D1762F925BDADdC4201F984"
+usdc = "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48"
+weth = "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"
+v2_links = [(weth, 0), (usdc, 0)]
+v3_links = [(weth, 500), (weth, 3000), (usdc, 500)]
+
+
+def test_pivot_learner():
+    learner = PivotLearner()
+    assert learner.select(token, v2_links + v3_links) == v2_links + v3_links  # unknown: probed
+    learner.learn_pools(token, v2_links + v3_links, [(weth, 0), (weth, 500), (weth, 3000)])
+    assert learner.select(token, v2_links + v3_links) == [(weth, 0), (weth, 500), (weth, 3000)]
+    assert len(learner) == 1
+
+    learner.learn_quotes(token, [(weth, 500), (weth, 3000)], [(weth, 500)])  # outperformed by the 0.05% fee tier
+    assert learner.select(token, v3_links) == [(weth, 500)]
+    assert learner.get_links(token) == {(weth, 0), (weth, 500)}
+    assert (learner.probes, learner.pruned) == (2, 4)
+
+    learner.probe_interval = 0  # expired
+    assert learner.select(token, v3_links) == v3_links
+    learner.probe_interval = 3600
+    assert learner.forget(token, usdc)
+    assert not learner.forget(token)
+    assert learner.select(token, v3_links) == v3_links
+
+
+def test_pivot_learner_protocols():
+    learner = PivotLearner()
+    learner.learn_pools(token, v3_links, [(weth, 3000)])
+    assert learner.select(token, v2_links + v3_links) == v2_links + [(weth, 3000)]  # V2 not probed yet
+
+
+def test_pivot_learner_errors():
+    with pytest.raises(ValueError):
+        _ = PivotLearner(probe_interval=0)
+    with pytest.raises(ValueError):
+        _ = PivotLearner(max_tokens=0)
+
+
+@pytest.mark.universe(token_count=30)
+@pytest.mark.pairs(count=40)
+async def test_pivot_learner_routes(fake_w3, fake_rpc, pairs):
+    learning_pairs, pairs = pairs[:20], pairs[20:]
+    results = []
+    for pivot_learner in (None, PivotLearner()):
+        smart_path = await SmartPath.create(fake_w3, pivot_learner=pivot_learner)
+        for pair in learning_pairs:
+            await smart_path.get_swap_in_path(*pair)
+        fake_rpc.reset_counts()
+        results.append(([await smart_path.get_swap_in_path(*pair) for pair in pairs], fake_rpc.counts["eth_call"]))
+
+    (paths, call_count), (learned_paths, learned_call_count) = results
+    assert learned_paths == paths
+    assert learned_call_count < 0.7 * call_count
+
+
+@pytest.mark.universe(token_count=0)
+async def test_pivot_learner_miss(universe, fake_w3):
+    weth_token, dai_token = [next(t for t in universe.pivots if t.symbol == symbol) for symbol in ("WETH", "DAI")]
+    token_x, token_y, token_z = [FakeToken(to_address(0x3000 + i), f"TKN{i}", 18, 1.) for i in range(3)]
+    for fake_token in (token_x, token_y, token_z):
+        universe.tokens[fake_token.address.lower()] = fake_token
+    universe.add_v2_pair(token_x, weth_token, 10**6)
+    universe.add_v2_pair(token_y, weth_token, 10**6)
+    universe.add_v2_pair(token_z, dai_token, 10**6)
+    pivot_learner = PivotLearner()
+    smart_path = await SmartPath.create(fake_w3, pivot_learner=pivot_learner)
+
+    path = await smart_path.get_swap_in_path(10**18, token_x.address, token_y.address)
+    assert path[0]["path"] == (token_x.address, weth_token.address, token_y.address)
+    assert pivot_learner.get_links(token_x.address) == {(weth_token.address, 0)}
+
+    universe.add_v2_pair(token_x, dai_token, 10**6)  # created after token_x was learned
+    path = await smart_path.get_swap_in_path(10**18, token_x.address, token_z.address)
+    assert path[0]["path"] == (token_x.address, dai_token.address, token_z.address)  # probed again on the miss
@@ -0,0 +1,105 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from uniswap_smart_path import (
+    PoolIndex,
+    SmartPath,
+)
+
+
+factory = "0x5C69bEe701ef814a2B6a3EDD4B1652CB9cc5aA6f"
+usdc = "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48"
+weth = "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"
+pair = "0xB4e16d0168e52d35CaCD2c6185b44281Ec28C9Dc"
+null_address = "0x" + "0" * 40
+
+
+def test_pool_index(tmp_path):
+    file_path = str(tmp_path / "pools.db")
+    writer = PoolIndex(file_path, flush_size=2)
+    assert writer.get(1, factory, usdc, weth) is None
+    writer.add(1, factory, usdc, weth, 0, pair)
+    assert writer.get(1, factory, weth, usdc) == pair  # any token order
+    assert writer.get(1, factory, weth, usdc, 500) is None
+    assert writer.get(56, factory, weth, usdc) is None
+
+    reader = PoolIndex(file_path, read_only=True, flush_interval=0)
+    assert len(reader) == 0  # not flushed yet
+    writer.add(1, factory, usdc, weth, 500, null_address)  # flush
+    assert reader.get(1, factory, usdc, weth) == pair  # read from the file
+    assert reader.get(1, factory, usdc, weth, 500) == null_address
+    assert (reader.hits, reader.misses) == (2, 0)
+    writer.close()
+
+    reader.add(1, factory, usdc, weth, 3000, pair)  # kept in memory only
+    assert reader.get(1, factory, usdc, weth, 3000) == pair
+    assert len(PoolIndex(file_path, read_only=True)) == 2
+    reader.close()
+
+
+async def test_pool_index_off_the_event_loop(tmp_path):
+    file_path = str(tmp_path / "pools.db")
+    writer = PoolIndex(file_path, flush_size=1)
+    reader = PoolIndex(file_path, read_only=True, flush_interval=0)
+    file_threads = set()
+    write_and_read = reader._write_and_read
+
+    def recording_write_and_read(pending):
+        file_threads.add(threading.get_ident())
+        return write_and_read(pending)
+
+    reader._write_and_read = recording_write_and_read
+    writer.add(1, factory, usdc, weth, 0, pair)
+    await writer._sync_task  # written in the background
+    assert reader.get(1, factory, usdc, weth) is None  # not read yet: the file is not read on the event loop
+    await reader._sync_task
+    assert reader.get(1, factory, usdc, weth) == pair
+    assert file_threads and threading.get_ident() not in file_threads
+
+    await asyncio.get_running_loop().run_in_executor(None, writer.close)
+    reader.close()
+
+
+def test_pool_index_negative_ttl(tmp_path):
+    file_path = str(tmp_path / "pools.db")
+    pool_index = PoolIndex(file_path, negative_ttl=None)
+    pool_index.add(1, factory, usdc, weth, 0, null_address)
+    assert pool_index.get(1, factory, usdc, weth) is None
+
+    pool_index.negative_ttl = 60
+    pool_index.add(1, factory, usdc, weth, 0, null_address)
+    assert pool_index.get(1, factory, usdc, weth) == null_address
+    pool_index.negative_ttl = 0  # expired
+    assert pool_index.get(1, factory, usdc, weth) is None
+    pool_index.close()
+
+
+def test_pool_index_errors(tmp_path):
+    with pytest.raises(ValueError):
+        PoolIndex(str(tmp_path / "pools.db"), flush_size=0)
+    with pytest.raises(sqlite3.OperationalError):
+        PoolIndex(str(tmp_path / "missing.db"), read_only=True)
+
+
+@pytest.mark.universe(seed=1)
+@pytest.mark.pairs(count=3)
+async def test_smart_path_with_pool_index(tmp_path, fake_w3, fake_rpc, pairs):
+    file_path = str(tmp_path / "pools.db")
+
+    pool_index = PoolIndex(file_path)
+    smart_path = await SmartPath.create(fake_w3, pool_index=pool_index)
+    paths = [await smart_path.get_swap_in_path(*pair) for pair in pairs]
+    pool_index.close()
+    discovery_count = fake_rpc.counts["eth_call.getPair"] + fake_rpc.counts["eth_call.getPool"]
+    assert discovery_count > 0
+
+    # a new worker starts with all the discovered pools
+    fake_rpc.reset_counts()
+    pool_index = PoolIndex(file_path, read_only=True)
+    smart_path = await SmartPath.create(fake_w3, pool_index=pool_index)
+    assert [await smart_path.get_swap_in_path(*pair) for pair in pairs] == paths
+    assert fake_rpc.counts["eth_call.getPair"] == fake_rpc.counts["eth_call.getPool"] == 0
+    assert pool_index.hits >= discovery_count  # the RPC were deduplicated by single-flight
@@ -0,0 +1,244 @@
+import asyncio
+
+from aiohttp import ClientError
+from eth_utils import function_signature_to_4byte_selector
+import pytest
+
+from uniswap_smart_path import (
+    CircuitBreaker,
+    PivotLearner,
+    RetryPolicy,
+    RouteCache,
+    SmartPath,
+)
+from uniswap_smart_path.exceptions import CircuitOpenError
+
+from .fake_rpc import create_fake_w3
+
+
+pytestmark = pytest.mark.universe(token_count=10)
+
+get_pool_selector = "0x" + function_signature_to_4byte_selector("getPool(address,address,uint24)").hex()
+quote_exact_input_selector = "0x" + function_signature_to_4byte_selector("quoteExactInput(bytes,uint256)").hex()
+
+
+def make_flaky(w3, is_failing, error=asyncio.TimeoutError):
+    """
+    Make the requests of the w3 provider fail with error when is_failing(method, params, request_number) is True.
+    To be called before the first request.
+    """
+    make_request = w3.provider.make_request
+    request_numbers = iter(range(10**9))
+
+    async def flaky_make_request(method, params):
+        if is_failing(method, params, next(request_numbers)):
+            raise error()
+        return await make_request(method, params)
+
+    w3.provider.make_request = flaky_make_request
+
+
+def is_get_pool(method, params):
+    return method == "eth_call" and params[0]["data"].startswith(get_pool_selector)
+
+
+def is_v3_quote(method, params):
+    return method == "eth_call" and params[0]["data"].startswith(quote_exact_input_selector)
+
+
+async def test_retry_policy():
+    retry_policy = RetryPolicy(max_attempts=3, base_delay=0.001)
+    attempts = []
+
+    async def request():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise asyncio.TimeoutError()
+        return "result"
+
+    assert await retry_policy.run("endpoint", request) == "result"
+    assert len(attempts) == 3
+    assert retry_policy.retry_count == 2
+    assert retry_policy.get_breaker("endpoint").state == "closed"
+
+    async def reverted_request():
+        attempts.append(1)
+        raise ValueError("execution reverted")
+
+    attempts.clear()
+    with pytest.raises(ValueError):
+        await retry_policy.run("endpoint", reverted_request)
+    assert len(attempts) == 1  # not retried
+
+    async def timed_out_request():
+        raise asyncio.TimeoutError()
+
+    with pytest.raises(asyncio.TimeoutError):
+        await retry_policy.run("endpoint", timed_out_request)
+    assert retry_policy.retry_count == 4
+
+
+async def test_retry_policy_timeout():
+    retry_policy = RetryPolicy(max_attempts=2, base_delay=0.001, timeout=0.01)
+
+    async def slow_request():
+        await asyncio.sleep(1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await retry_policy.run("endpoint", slow_request)
+    assert retry_policy.retry_count == 1
+
+
+async def test_circuit_breaker():
+    retry_policy = RetryPolicy(max_attempts=1, failure_threshold=2, reset_timeout=0.05)
+
+    async def timed_out_request():
+        raise asyncio.TimeoutError()
+
+    async def request():
+        return "result"
+
+    for _ in range(2):
+        with pytest.raises(asyncio.TimeoutError):
+            await retry_policy.run("endpoint", timed_out_request)
+    assert retry_policy.get_breaker("endpoint").state == "open"
+    with pytest.raises(CircuitOpenError):
+        await retry_policy.run("endpoint", request)
+    assert retry_policy.rejected_count == 1
+    assert await retry_policy.run("other endpoint", request) == "result"  # one breaker per endpoint
+
+    await asyncio.sleep(0.05)
+    assert retry_policy.get_breaker("endpoint").state == "half_open"
+    with pytest.raises(asyncio.TimeoutError):
+        await retry_policy.run("endpoint", timed_out_request)  # failed trial
+    assert retry_policy.get_breaker("endpoint").state == "open"
+
+    await asyncio.sleep(0.05)
+    assert await retry_policy.run("endpoint", request) == "result"  # successful trial
+    assert retry_policy.get_breaker("endpoint").state == "closed"
+
+
+async def test_circuit_breaker_cancelled_trial():
+    retry_policy = RetryPolicy(max_attempts=1, failure_threshold=1, reset_timeout=0)
+
+    async def timed_out_request():
+        raise asyncio.TimeoutError()
+
+    async def slow_request():
+        await asyncio.sleep(1)
+
+    async def request():
+        return "result"
+
+    with pytest.raises(asyncio.TimeoutError):
+        await retry_policy.run("endpoint", timed_out_request)
+    assert retry_policy.get_breaker("endpoint").state == "half_open"
+    trial = asyncio.ensure_future(retry_policy.run("endpoint", slow_request))
+    await asyncio.sleep(0)
+    trial.cancel()  # eg all the callers of a coalesced request gave up
+    with pytest.raises(asyncio.CancelledError):
+        await trial
+    assert await retry_policy.run("endpoint", request) == "result"  # a new trial is let through
+    assert retry_policy.get_breaker("endpoint").state == "closed"
+
+
+def test_circuit_breaker_single_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == "half_open"
+    breaker.check()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()  # a trial is already in flight
+    with pytest.raises(asyncio.TimeoutError):  # handled as a timeout by SmartPath
+        breaker.check()
+
+
+def test_retry_policy_delay():
+    retry_policy = RetryPolicy(base_delay=0.1, max_delay=0.3)
+    assert all(0 <= retry_policy.get_delay(0) <= 0.1 for _ in range(100))
+    assert all(0 <= retry_policy.get_delay(5) <= 0.3 for _ in range(100))
+
+
+def test_retry_policy_errors():
+    with pytest.raises(ValueError):
+        _ = RetryPolicy(max_attempts=0)
+    with pytest.raises(ValueError):
+        _ = CircuitBreaker(failure_threshold=0)
+
+
+@pytest.mark.pairs(count=5)
+async def test_retried_routes(universe, fake_w3, pairs):
+    w3, _ = create_fake_w3(universe)  # without failures
+    paths = [await (await SmartPath.create(w3)).get_swap_in_path(*pair) for pair in pairs]
+
+    failed_requests = set()
+
+    def is_failing(method, params, number):  # the first attempt of each request times out
+        request = repr((method, params))
+        if request in failed_requests:
+            return False
+        failed_requests.add(request)
+        return number > 0
+
+    make_flaky(fake_w3, is_failing)
+    retry_policy = RetryPolicy(base_delay=0.001, failure_threshold=100)
+    smart_path = await SmartPath.create(fake_w3, retry_policy=retry_policy)
+    assert [await smart_path.get_swap_in_path(*pair) for pair in pairs] == paths
+    assert retry_policy.retry_count > 0
+
+
+async def test_unknown_pools_not_learned(universe, fake_w3, pairs):
+    amount, token_in, token_out = pairs[0]
+    w3, _ = create_fake_w3(universe)  # without failures
+    path = await (await SmartPath.create_v3_only(w3)).get_swap_in_path(amount, token_in, token_out)
+
+    failing_requests = {"getPool": True}
+    make_flaky(fake_w3, lambda method, params, number: failing_requests["getPool"] and is_get_pool(method, params))
+    pivot_learner = PivotLearner()
+    smart_path = await SmartPath.create_v3_only(fake_w3, pivot_learner=pivot_learner)
+    token0, token1 = [await smart_path._get_token(address, fake_w3) for address in (token_in, token_out)]
+    assert await smart_path._v3_pool_exist(token0, token1, 3000) is None  # unknown, not missing
+
+    await smart_path.get_swap_in_path(amount, token_in, token_out)
+    assert len(pivot_learner) == 0
+
+    failing_requests["getPool"] = False
+    assert await smart_path.get_swap_in_path(amount, token_in, token_out) == path
+    assert len(pivot_learner) == 2
+
+
+async def test_unknown_pools_not_cached(universe, fake_w3, fake_rpc, pairs):
+    amount, token_in, token_out = pairs[0]
+    w3, _ = create_fake_w3(universe)  # without failures
+    path = await (await SmartPath.create_v3_only(w3)).get_swap_in_path(amount, token_in, token_out)
+
+    failing_requests = {"getPool": True}
+    make_flaky(fake_w3, lambda method, params, number: failing_requests["getPool"] and is_get_pool(method, params))
+    route_cache = RouteCache()
+    smart_path = await SmartPath.create_v3_only(fake_w3, route_cache=route_cache)
+    block_number = fake_rpc.block_number
+
+    assert await smart_path.get_swap_in_path_with_block(amount, token_in, token_out) == ((), block_number)
+    assert len(route_cache) == 0  # degraded route
+
+    failing_requests["getPool"] = False
+    assert await smart_path.get_swap_in_path_with_block(amount, token_in, token_out) == (path, block_number)
+    assert len(route_cache) == 1
+
+
+async def test_failed_quotes_drop_their_paths(fake_w3, pairs):
+    amount, token_in, token_out = pairs[2]  # with V2 and V3 paths
+    failing_requests = {"quoteExactInput": True}
+    make_flaky(fake_w3, lambda method, params, number: failing_requests["quoteExactInput"] and is_v3_quote(method, params), ClientError)  # noqa
+    route_cache = RouteCache()
+    retry_policy = RetryPolicy(max_attempts=2, base_delay=0.001, failure_threshold=100)
+    smart_path = await SmartPath.create(fake_w3, retry_policy=retry_policy, route_cache=route_cache)
+
+    route, _ = await smart_path.get_swap_in_path_with_block(amount, token_in, token_out)
+    assert route and all(path["function"].startswith("V2") for path in route)  # the V3 paths are left out
+    assert len(route_cache) == 0
+    assert retry_policy.retry_count > 0
+
+    failing_requests["quoteExactInput"] = False
+    await smart_path.get_swap_in_path_with_block(amount, token_in, token_out)
+    assert len(route_cache) == 1
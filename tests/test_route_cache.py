@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+from web3.types import Wei
+
+from uniswap_smart_path import (
+    RouteCache,
+    SmartPath,
+)
+
+from .conftest import tokens
+
+
+route_1 = ({"function": "V2_SWAP_EXACT_IN", "path": ("a", "b"), "weight": 100, "estimate": Wei(1)}, )
+route_2 = ({"function": "V3_SWAP_EXACT_IN", "path": ("a", 500, "b"), "weight": 100, "estimate": Wei(2)}, )
+
+
+@pytest.mark.parametrize(
+    "significant_digits, amount, expected_bucket",
+    (
+        (None, Wei(123456), 123456),
+        (2, Wei(123456), 120000),
+        (3, Wei(99), 99),
+    )
+)
+def test_bucket(significant_digits, amount, expected_bucket):
+    assert RouteCache(significant_digits=significant_digits).bucket(amount) == expected_bucket
+
+
+def test_route_cache_block_invalidation():
+    cache = RouteCache()
+    key = cache.get_key(Wei(10**18), tokens["WETH"].address, tokens["USDC"].address)
+    assert cache.get(key, 100) is None
+
+    cache.put(key, 100, route_1)
+    assert cache.get(key, 100) == route_1
+
+    cache.put(key, 99, route_2)  # outdated
+    assert cache.get(key, 100) == route_1
+
+    assert cache.get(key, 101) is None
+    assert len(cache) == 0
+    assert cache.get(key, 100) is None  # older block
+
+    stats = cache.get_stats()
+    assert (stats.hits, stats.misses, stats.block_number) == (2, 3, 101)
+    assert stats.hit_ratio == 0.4
+
+
+def test_route_cache_lru_eviction():
+    cache = RouteCache(max_size=2)
+    keys = [cache.get_key(Wei(amount), tokens["WETH"].address, tokens["USDC"].address) for amount in (1, 2, 3)]
+    cache.put(keys[0], 1, route_1)
+    cache.put(keys[1], 1, route_2)
+    assert cache.get(keys[0], 1) == route_1
+    cache.put(keys[2], 1, route_2)
+
+    assert cache.get(keys[1], 1) is None
+    assert cache.get(keys[0], 1) == route_1
+    assert cache.get(keys[2], 1) == route_2
+
+
+async def test_route_cache_get_or_compute():
+    cache = RouteCache()
+    key = cache.get_key(Wei(10**18), tokens["WETH"].address, tokens["USDC"].address)
+    computations = []
+
+    async def compute():
+        computations.append(1)
+        await asyncio.sleep(0.01)
+        return route_1
+
+    results = await asyncio.gather(*[cache.get_or_compute(key, 1, compute) for _ in range(5)])
+    assert results == [route_1] * 5
+    assert len({id(result[0]) for result in results}) == 5  # each caller gets its own copy
+    assert await cache.get_or_compute(key, 1, compute) == route_1
+    assert len(computations) == 1
+
+
+def test_route_cache_copies():
+    cache = RouteCache()
+    key = cache.get_key(Wei(10**18), tokens["WETH"].address, tokens["USDC"].address)
+    route = ({**route_1[0]}, )
+    cache.put(key, 1, route)
+    route[0]["estimate"] = Wei(0)
+    assert cache.get(key, 1) == route_1
+
+    cache.get(key, 1)[0]["estimate"] = Wei(0)
+    assert cache.get(key, 1) == route_1
+
+
+@pytest.mark.parametrize(
+    "max_size, significant_digits",
+    (
+        (0, None),
+        (10, 0),
+    )
+)
+def test_route_cache_exception(max_size, significant_digits):
+    with pytest.raises(ValueError):
+        _ = RouteCache(max_size, significant_digits)
+
+
+async def test_smart_path_route_cache(fake_w3, fake_rpc, pairs):
+    pair = pairs[0]
+    route_cache = RouteCache()
+    smart_path = await SmartPath.create(fake_w3, route_cache=route_cache)
+    assert len(route_cache) == 0  # empty, so falsy: must still be used
+
+    path = await smart_path.get_swap_in_path(*pair)
+    assert route_cache.get_stats().misses == 1
+    fake_rpc.reset_counts()
+    assert await smart_path.get_swap_in_path(*pair) == path
+    assert route_cache.get_stats().hits == 1
+    assert fake_rpc.counts["eth_call"] == 0
+
+
+async def test_smart_path_route_cache_gas_price(fake_w3, pairs):
+    pair = pairs[0]
+    route_cache = RouteCache()
+    token_prices = {pair[2]: 1.}
+    smart_path = await SmartPath.create(
+        fake_w3, with_gas_estimate=True, route_cache=route_cache, gas_price=10**9, token_prices=token_prices,
+    )
+
+    await smart_path.get_swap_in_path(*pair)
+    await smart_path.get_swap_in_path(*pair)
+    assert (route_cache.get_stats().hits, route_cache.get_stats().misses) == (1, 1)
+
+    smart_path.gas_price = 2 * 10**9
+    await smart_path.get_swap_in_path(*pair)
+    assert route_cache.get_stats().misses == 2  # ranked with another gas price
+
+    smart_path.token_prices[pair[2]] = 2.
+    await smart_path.get_swap_in_path(*pair)
+    assert route_cache.get_stats().misses == 3  # ranked with another token price
@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+from web3.types import Wei
+
+from uniswap_smart_path import (
+    RouteCache,
+    RouteWarmer,
+    SmartRateLimiter,
+)
+from uniswap_smart_path._context import current_low_priority  # noqa
+from uniswap_smart_path.smart_rate_limiter import _rate_limit
+
+from .conftest import tokens
+
+
+hot_pair_1 = (Wei(10**18), tokens["WETH"].address, tokens["USDC"].address)
+hot_pair_2 = (Wei(10**18), tokens["UNI"].address, tokens["WETH"].address)
+
+
+class FakeDispatcher:
+    def __init__(self):
+        self.block_number = 100
+        self.block_number_count = 0
+
+    async def get_block_number(self):
+        self.block_number_count += 1
+        return self.block_number
+
+
+class FakeSmartPath:
+    def __init__(self, route_cache=None, smart_rate_limiter=None):
+        self.route_cache = route_cache
+        self.smart_rate_limiter = smart_rate_limiter
+        self.rpc_dispatcher = FakeDispatcher()
+        self.block_tracker = None
+        self.computed = []
+
+    def get_smart_rate_limiter(self):
+        return self.smart_rate_limiter
+
+    async def get_block_number(self):
+        return await self.rpc_dispatcher.get_block_number()
+
+    async def get_swap_in_path_with_block(self, amount, token_in_address, token_out_address, block_number=None):
+        assert current_low_priority.get()
+        if block_number is None:
+            block_number = await self.get_block_number()
+        self.computed.append((amount, token_in_address, token_out_address, block_number))
+        return (), block_number
+
+
+async def test_route_warmer_refresh_on_new_block():
+    smart_path = FakeSmartPath(RouteCache())
+    assert smart_path.route_cache is not None
+    async with RouteWarmer(smart_path, (hot_pair_1, hot_pair_2), poll_interval=0.01) as warmer:
+        await asyncio.sleep(0.05)
+        assert warmer.is_running
+        assert len(smart_path.computed) == 2
+
+        smart_path.rpc_dispatcher.block_number = 101
+        await asyncio.sleep(0.05)
+        assert len(smart_path.computed) == 4
+        assert smart_path.computed[-1] == hot_pair_2 + (101, )
+
+        staleness = warmer.get_staleness(*hot_pair_1)
+        assert (staleness.block_number, staleness.blocks_behind) == (101, 0)
+        assert staleness.age >= 0
+        assert warmer.get_staleness(Wei(1), *hot_pair_1[1:]) is None
+
+    assert not warmer.is_running
+
+
+async def test_route_warmer_budget():
+    smart_rate_limiter = SmartRateLimiter(1, max_credits=100, method_credits={"eth_call": 10})
+    smart_path = FakeSmartPath(RouteCache(), smart_rate_limiter)
+    warmer = RouteWarmer(smart_path, (hot_pair_1, ), poll_interval=0.01, min_available_ratio=0.5, max_slowdown=4)
+
+    smart_rate_limiter.consumed = 80
+    warmer._adapt_slowdown()
+    warmer._adapt_slowdown()
+    warmer._adapt_slowdown()
+    assert warmer.slowdown == 4
+
+    refresh = asyncio.ensure_future(warmer.refresh())
+    await asyncio.sleep(0.02)
+    assert not refresh.done()  # low priority: waiting for the budget
+
+    smart_rate_limiter.consumed = 40
+    await asyncio.wait_for(refresh, 1)
+    assert len(smart_path.computed) == 1
+
+    warmer._adapt_slowdown()
+    assert warmer.slowdown == 2
+
+
+async def test_route_warmer_same_block():
+    smart_path = FakeSmartPath(RouteCache())
+    warmer = RouteWarmer(smart_path, (hot_pair_1, hot_pair_2))
+    await warmer.refresh()
+    assert smart_path.rpc_dispatcher.block_number_count == 1  # all the hot pairs at the same block
+    assert [computed[-1] for computed in smart_path.computed] == [100, 100]
+    assert not current_low_priority.get()
+
+
+def test_route_warmer_exception():
+    with pytest.raises(ValueError):
+        _ = RouteWarmer(FakeSmartPath(), (hot_pair_1, ))
+
+
+@pytest.mark.parametrize(
+    "smart_rate_limiter, expected_ratios",
+    (
+        (SmartRateLimiter(0.05, max_count=4), (0.5, 1.)),
+        (SmartRateLimiter(0.05, max_credits=100, method_credits={"eth_call": 10}), (0.8, 1.)),
+    )
+)
+async def test_available_ratio(smart_rate_limiter, expected_ratios):
+    class RateLimited:
+        def get_smart_rate_limiter(self):
+            return smart_rate_limiter
+
+        @_rate_limit("eth_call")
+        async def call(self):
+            pass
+
+    assert smart_rate_limiter.get_available_ratio() == 1.
+    await asyncio.gather(RateLimited().call(), RateLimited().call())
+    assert smart_rate_limiter.get_available_ratio() == expected_ratios[0]
+    await asyncio.sleep(0.1)  # released after the interval
+    assert smart_rate_limiter.get_available_ratio() == expected_ratios[1]
+
+
+async def test_low_priority_rate_limit():
+    smart_rate_limiter = SmartRateLimiter(0.05, max_count=1)
+    order = []
+
+    class RateLimited:
+        def get_smart_rate_limiter(self):
+            return smart_rate_limiter
+
+        @_rate_limit("eth_call")
+        async def call(self, name):
+            order.append(name)
+
+    async def call(name, is_low_priority=False):
+        current_low_priority.set(is_low_priority)
+        await RateLimited().call(name)
+
+    await asyncio.gather(call("first"), call("second"), call("warmer", True), call("third"))
+    assert order == ["first", "second", "third", "warmer"]
+    assert smart_rate_limiter.waiting_count == 0
@@ -0,0 +1,153 @@
+import asyncio
+from contextlib import asynccontextmanager
+import json
+
+from aiohttp import ClientSession
+import pytest
+
+from uniswap_smart_path import (
+    RouteCache,
+    SmartPath,
+)
+from uniswap_smart_path.__main__ import (
+    create_parser,
+    get_smart_path_kwargs,
+)
+from uniswap_smart_path._quotes import (
+    format_quote,
+    parse_quote_request,
+)
+from uniswap_smart_path.server import QuoteServer
+
+from .fake_rpc import create_fake_w3
+
+
+pytestmark = pytest.mark.universe(token_count=10)
+
+
+@asynccontextmanager
+async def serve(w3, **kwargs):
+    server = QuoteServer(await SmartPath.create(w3, route_cache=RouteCache()), **kwargs)
+    url = await server.start(port=0)
+    try:
+        async with ClientSession() as session:
+            yield server, session, url
+    finally:
+        await server.stop()
+
+
+def to_request(pair):
+    amount, token_in, token_out = pair
+    return {"amount": str(amount), "token_in": token_in, "token_out": token_out}
+
+
+async def get_expected_quotes(universe, pairs):
+    w3, _ = create_fake_w3(universe)
+    smart_path = await SmartPath.create(w3)
+    return [
+        json.loads(json.dumps(format_quote(await smart_path.get_swap_in_path_with_block(*pair)))) for pair in pairs
+    ]
+
+
+def test_parse_quote_request(pairs):
+    token = pairs[0][1]
+    assert parse_quote_request({"amount": 10, "token_in": token.lower(), "token_out": token}) == (10, token, token)
+    assert parse_quote_request({"amount": "10", "token_in": token, "token_out": token})[0] == 10
+    for body in (
+            [],
+            {"amount": 10, "token_in": token},
+            {"amount": 1.5, "token_in": token, "token_out": token},
+            {"amount": "0", "token_in": token, "token_out": token},
+            {"amount": "abc", "token_in": token, "token_out": token},
+            {"amount": 10, "token_in": "0x123", "token_out": token}):
+        with pytest.raises(ValueError):
+            parse_quote_request(body)
+
+
+@pytest.mark.pairs(count=3)
+async def test_quote(universe, fake_w3, pairs):
+    expected_quotes = await get_expected_quotes(universe, pairs)
+    async with serve(fake_w3) as (server, session, url):
+        for pair, expected_quote in zip(pairs, expected_quotes):
+            async with session.post(f"{url}/quote", json=to_request(pair)) as response:
+                assert response.status == 200
+                assert await response.json() == expected_quote
+
+        async with session.post(f"{url}/quotes", json={"requests": [to_request(pair) for pair in pairs] + [{}]}) as response:  # noqa
+            assert response.status == 200
+            results = (await response.json())["results"]
+        assert results[:-1] == expected_quotes
+        assert "error" in results[-1]
+
+        async with session.get(f"{url}/stats") as response:
+            stats = await response.json()
+        assert stats["requests"] == 6
+        assert stats["route_cache"]["hits"] == 3  # same block
+
+
+async def test_quote_errors(fake_w3):
+    async with serve(fake_w3, max_batch_requests=2) as (server, session, url):
+        async with session.post(f"{url}/quote", data="not json") as response:
+            assert response.status == 400
+        async with session.post(f"{url}/quote", json={"amount": 1}) as response:
+            assert response.status == 400
+            assert "Missing field(s): token_in, token_out" in (await response.json())["error"]
+        async with session.post(f"{url}/quotes", json={"requests": [{}] * 3}) as response:
+            assert response.status == 400
+        async with session.get(f"{url}/health") as response:
+            assert response.status == 200
+        with pytest.raises(RuntimeError):
+            await server.start(port=0)
+
+
+async def test_quote_internal_error(fake_w3, pairs):
+    pair = pairs[0]
+    async with serve(fake_w3) as (server, session, url):
+        async def failing_get_swap_in_path_with_block(*args, **kwargs):
+            raise RuntimeError("secret internal details")
+
+        server.smart_path.get_swap_in_path_with_block = failing_get_swap_in_path_with_block
+        async with session.post(f"{url}/quote", json=to_request(pair)) as response:
+            assert response.status == 500
+            assert await response.json() == {"error": "Could not compute the paths"}  # no internal details
+
+
+@pytest.mark.pairs(count=4, seed=1)
+async def test_coalesced_and_batched_requests(fake_w3, fake_rpc, pairs):
+    async with serve(fake_w3, batch_window=0.05) as (server, session, url):
+        fake_rpc.reset_counts()
+        quotes = await asyncio.gather(*[server.quote(*parse_quote_request(to_request(pair))) for pair in pairs * 3])
+        assert quotes == quotes[:len(pairs)] * 3
+        assert server.request_count == 12
+        assert server._single_flight.coalesced_count == 8  # computed once per pair
+        assert server.batch_count == 1
+        assert fake_rpc.counts["eth_blockNumber"] == 1  # all computed at the same block
+        assert len({block_number for _, block_number in quotes}) == 1
+
+
+@pytest.mark.pairs(count=5, seed=2)
+async def test_batch_size(fake_w3, pairs):
+    async with serve(fake_w3, batch_window=10, max_batch_size=5) as (server, session, url):
+        await asyncio.wait_for(
+            asyncio.gather(*[server.quote(*parse_quote_request(to_request(pair))) for pair in pairs]),
+            5,
+        )  # a full batch does not wait for the window
+        assert server.batch_count == 1
+
+
+def test_command_line():
+    parser = create_parser()
+    args = parser.parse_args(["serve", "--rpc-endpoint", "http://localhost:8545", "--max-count", "10", "--port", "0"])
+    assert args.port == 0
+    kwargs = get_smart_path_kwargs(args)
+    assert kwargs["smart_rate_limiter"].max_count == 10
+    assert kwargs["route_cache"].max_size == 1024
+    assert kwargs["http_settings"].pool_size == 100
+    assert "concurrency_limiter" not in kwargs
+
+    args = parser.parse_args(["serve", "--rpc-endpoint", "wss://localhost:8546", "--route-cache-size", "0"])
+    kwargs = get_smart_path_kwargs(args)
+    assert "route_cache" not in kwargs
+    assert "http_settings" not in kwargs  # persistent provider
+    with pytest.raises(SystemExit):
+        parser.parse_args([])
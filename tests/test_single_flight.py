@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from uniswap_smart_path._single_flight import SingleFlight  # noqa
+
+
+async def test_single_flight_coalesces_concurrent_calls():
+    single_flight = SingleFlight()
+    calls = []
+
+    async def func(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    results = await asyncio.gather(
+        *[single_flight.do(("key", 1), lambda: func(1)) for _ in range(10)],
+        single_flight.do(("key", 2), lambda: func(2)),
+    )
+    assert results == [1] * 10 + [2]
+    assert calls == [1, 2]
+    assert single_flight.call_count == 2
+    assert single_flight.coalesced_count == 9
+    assert len(single_flight) == 0
+
+    # no caching once done
+    assert await single_flight.do(("key", 1), lambda: func(1)) == 1
+    assert calls == [1, 2, 1]
+
+
+async def test_single_flight_exception():
+    single_flight = SingleFlight()
+
+    async def func():
+        await asyncio.sleep(0.01)
+        raise ValueError("revert")
+
+    results = await asyncio.gather(*[single_flight.do("key", func) for _ in range(3)], return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert len(single_flight) == 0
+
+
+async def test_single_flight_cancellation():
+    single_flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def func():
+        started.set()
+        await asyncio.sleep(10)
+
+    waiter_1 = asyncio.ensure_future(single_flight.do("key", func))
+    waiter_2 = asyncio.ensure_future(single_flight.do("key", func))
+    await started.wait()
+
+    waiter_1.cancel()
+    await asyncio.sleep(0)
+    assert len(single_flight) == 1  # still awaited by waiter_2
+
+    waiter_2.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter_2
+    assert len(single_flight) == 0
@@ -1,9 +1,13 @@
+import json
+import zlib
+
 import pytest
 from web3 import Web3
 from web3.exceptions import BadFunctionCallOutput
 from web3.types import Wei
 
 from uniswap_smart_path import (
+    PoolIndex,
     SmartPath,
     SmartRateLimiter,
 )
@@ -50,8 +54,8 @@ async def test_create(w3, rpc_endpoint, uniswapv2_address, uniswapv3_quoter_addr
     with pytest.raises(ValueError):
         _ = SmartRateLimiter(1)
 
-    with pytest.raises(NotImplementedError):
-        _ = await SmartPath.create(w3=w3, with_gas_estimate=True)
+    smart_path = await SmartPath.create(w3=w3, with_gas_estimate=True)
+    assert smart_path.with_gas_estimate
 
 
 @pytest.mark.parametrize(
@@ -366,3 +370,95 @@ async def test_create_custom_exception(w3):
             w3,
             v2_router=const.uniswapv2_address,
         )
+
+
+@pytest.mark.parametrize(
+    "amount, token_in, token_out, expected_estimate",
+    (
+        (Wei(100 * 10**18), tokens["DAI"], tokens["USDT"], 100 * 10**6),
+        (Wei(100 * 10**18), Token(Web3.to_checksum_address("0x1fB90FFC02D01238Cd8AFE3a82B8C65BAC37042f"), "", 18), tokens["USDT"], None),  # noqa
+    )
+)
+async def test_iter_swap_in_path(amount, token_in, token_out, expected_estimate, w3):
+    smart_path = await SmartPath.create(w3)
+    total_estimates = []
+    async for weighted_paths in smart_path.iter_swap_in_path(amount, token_in.address, token_out.address):
+        total_estimates.append(sum(path["estimate"] for path in weighted_paths))
+
+    assert total_estimates == sorted(set(total_estimates))  # strictly better at each step
+    if expected_estimate:
+        assert expected_estimate * 0.98 < total_estimates[-1] < expected_estimate * 1.02
+    else:
+        assert total_estimates == []
+
+    assert await smart_path.get_swap_in_path_before(amount, token_in.address, token_out.address, 0) == ()
+    weighted_paths = await smart_path.get_swap_in_path_before(amount, token_in.address, token_out.address, 30)
+    assert len(weighted_paths) > 0 if expected_estimate else weighted_paths == ()
+
+
+@pytest.mark.universe(seed=1)
+@pytest.mark.pairs(count=3)
+async def test_snapshot_restore(fake_w3, fake_rpc, pairs):
+    smart_path = await SmartPath.create(fake_w3, pool_index=PoolIndex(":memory:"))
+    paths = [await smart_path.get_swap_in_path(*pair) for pair in pairs]
+    snapshot = smart_path.snapshot()
+
+    fake_rpc.reset_counts()
+    restored_smart_path = await SmartPath.create(fake_w3)
+    restored_smart_path.restore(snapshot)
+    assert restored_smart_path.tokens == smart_path.tokens
+    assert len(restored_smart_path.pool_path_cache) == len(smart_path.pool_path_cache)
+    assert [await restored_smart_path.get_swap_in_path(*pair) for pair in pairs] == paths
+    for method in ("symbol", "decimals", "getPair", "getPool"):
+        assert fake_rpc.counts[f"eth_call.{method}"] == 0
+
+    # same paths without snapshot
+    assert [await (await SmartPath.create(fake_w3)).get_swap_in_path(*pair) for pair in pairs] == paths
+
+
+@pytest.mark.universe(seed=1)
+async def test_snapshot_persistent_pool_index(tmp_path, fake_w3, pairs):
+    pool_index = PoolIndex(str(tmp_path / "pools.sqlite"))
+    smart_path = await SmartPath.create(fake_w3, pool_index=pool_index)
+    await smart_path.get_swap_in_path(*pairs[0])
+    assert len(pool_index) > 0
+
+    # the other processes read the pools from the file
+    assert json.loads(zlib.decompress(smart_path.snapshot()))["pools"] == []
+    assert len(json.loads(zlib.decompress(smart_path.snapshot(with_pools=True)))["pools"]) == len(pool_index)
+    pool_index.close()
+
+
+@pytest.mark.universe(token_count=2, seed=1)
+async def test_restore_errors(fake_w3):
+    snapshot = (await SmartPath.create(fake_w3)).snapshot()
+
+    with pytest.raises(ValueError, match="another chain"):
+        (await SmartPath.create_v2_only(fake_w3)).restore(snapshot)
+    with pytest.raises(ValueError, match="Invalid snapshot"):
+        (await SmartPath.create(fake_w3)).restore(b"snapshot")
+    with pytest.raises(ValueError, match="version"):
+        (await SmartPath.create(fake_w3)).restore(zlib.compress(b'{"version": 0}'))
+
+
+@pytest.mark.universe(seed=1)
+@pytest.mark.pairs(count=8)
+async def test_gas_aware_routing(universe, fake_w3, fake_rpc, pairs):
+    eth_price = next(token.price for token in universe.pivots if token.symbol == "WETH")
+    token_prices = {address: token.price / eth_price for address, token in universe.tokens.items()}
+    paths = [await (await SmartPath.create(fake_w3)).get_swap_in_path(*pair) for pair in pairs]
+
+    # free gas: same paths, with their gas estimate
+    smart_path = await SmartPath.create(fake_w3, with_gas_estimate=True, token_prices=token_prices)
+    free_gas_paths = [await smart_path.get_swap_in_path(*pair) for pair in pairs]
+    for path, free_gas_path in zip(paths, free_gas_paths):
+        assert [{k: v for k, v in p.items() if k != "gas_estimate"} for p in free_gas_path] == list(path)
+        assert all(p["gas_estimate"] > 0 for p in free_gas_path)
+
+    # expensive gas: never more paths, and fewer splits on at least a pair
+    fake_rpc.reset_counts()
+    smart_path.gas_price = 50 * 10 ** 9
+    expensive_gas_paths = [await smart_path.get_swap_in_path(*pair) for pair in pairs]
+    assert fake_rpc.counts["eth_estimateGas"] == 0
+    assert all(len(e) <= len(f) for e, f in zip(expensive_gas_paths, free_gas_paths))
+    assert sum(map(len, expensive_gas_paths)) < sum(map(len, free_gas_paths))
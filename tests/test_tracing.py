@@ -0,0 +1,139 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from uniswap_smart_path import (
+    InMemorySpanExporter,
+    JsonSpanExporter,
+    OpenTelemetrySpanExporter,
+    Tracer,
+)
+from uniswap_smart_path.tracing import (
+    add_credits,
+    set_attribute,
+    span,
+)
+
+
+class FailingExporter:
+    def export(self, spans):
+        raise RuntimeError("exporter is down")
+
+    def shutdown(self):
+        pass
+
+
+def test_span_without_trace():
+    with span("quotes") as quotes_span:
+        set_attribute("candidates", 3)
+        add_credits(20)
+    assert quotes_span is None
+
+
+def test_tracer():
+    exporter = InMemorySpanExporter()
+    tracer = Tracer([FailingExporter(), exporter])
+
+    with tracer.start_trace("get_swap_in_path", amount=10**18) as root:
+        with span("quotes") as quotes_span:
+            with span("rpc", method="eth_call.getPair"):
+                add_credits(20)
+            with span("rpc", method="eth_call.getPool"):
+                add_credits(20)
+                set_attribute("block", 100)
+        with pytest.raises(ValueError):
+            with span("split"):
+                raise ValueError("no path")
+        assert exporter.spans == []  # exported once all spans are ended
+
+    assert [s.name for s in exporter.spans] == ["get_swap_in_path", "quotes", "rpc", "rpc", "split"]
+    assert len({s.trace_id for s in exporter.spans}) == 1
+    assert exporter.spans[1].parent_span_id == root.span_id
+    assert exporter.spans[2].parent is quotes_span
+    assert root.attributes == {"amount": 10**18, "credits": 40}
+    assert exporter.spans[3].attributes == {"method": "eth_call.getPool", "credits": 20, "block": 100}
+    assert exporter.spans[4].error == "ValueError('no path')"
+    assert root.error is None
+    assert all(s.end_time is not None and s.duration >= 0 for s in exporter.spans)
+
+
+async def test_tracer_span_outliving_root():
+    exporter = InMemorySpanExporter()
+    tracer = Tracer([exporter])
+    release = asyncio.Event()
+
+    async def quote():
+        with span("get_amount_out"):
+            await release.wait()
+
+    with tracer.start_trace("iter_swap_in_path"):
+        task = asyncio.ensure_future(quote())
+        await asyncio.sleep(0)
+    assert exporter.spans == []
+
+    release.set()
+    await task
+    assert [s.name for s in exporter.spans] == ["iter_swap_in_path", "get_amount_out"]
+
+
+def test_tracer_sampling():
+    exporter = InMemorySpanExporter()
+    with Tracer([exporter], sample_ratio=0.).start_trace("get_swap_in_path") as root:
+        with span("quotes") as quotes_span:
+            pass
+    assert root is None and quotes_span is None
+
+    with Tracer([exporter], min_duration=60.).start_trace("get_swap_in_path"):
+        pass
+    assert exporter.spans == []
+
+    with pytest.raises(ValueError):
+        _ = Tracer([exporter], sample_ratio=2.)
+
+
+def test_json_span_exporter(tmp_path):
+    file_path = tmp_path / "spans.jsonl"
+    exporter = JsonSpanExporter(str(file_path))
+    write = exporter._write
+    threads = set()
+
+    def recording_write(lines):
+        threads.add(threading.get_ident())
+        write(lines)
+
+    exporter._write = recording_write
+    tracer = Tracer([exporter])
+    for _ in range(2):
+        with tracer.start_trace("get_swap_in_path", amount=10**24):
+            with span("tokens"):
+                pass
+    tracer.shutdown()  # wait for the background writes
+
+    assert threads and threading.get_ident() not in threads  # not written by the request
+    lines = [json.loads(line) for line in file_path.read_text().splitlines()]
+    assert [line["name"] for line in lines] == ["get_swap_in_path", "tokens"] * 2
+    assert lines[1]["parent_span_id"] == lines[0]["span_id"]
+    assert lines[0]["trace_id"] != lines[2]["trace_id"]
+    assert lines[0]["attributes"] == {"amount": 10**24}
+    assert lines[0]["status"] == "OK"
+
+
+def test_open_telemetry_span_exporter():
+    sdk_trace = pytest.importorskip("opentelemetry.sdk.trace")
+    sdk_export = pytest.importorskip("opentelemetry.sdk.trace.export")
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter as OTelExporter
+
+    otel_exporter = OTelExporter()
+    provider = sdk_trace.TracerProvider()
+    provider.add_span_processor(sdk_export.SimpleSpanProcessor(otel_exporter))
+    tracer = Tracer([OpenTelemetrySpanExporter(provider.get_tracer(__name__))])
+
+    with tracer.start_trace("get_swap_in_path", amount=10**24):
+        with span("tokens"):
+            pass
+
+    otel_spans = {s.name: s for s in otel_exporter.get_finished_spans()}
+    assert otel_spans["tokens"].parent.span_id == otel_spans["get_swap_in_path"].context.span_id
+    assert otel_spans["get_swap_in_path"].attributes["amount"] == str(10**24)
@@ -0,0 +1,93 @@
+import pytest
+
+from uniswap_smart_path import (
+    _v2_math,
+    SmartPath,
+)
+from uniswap_smart_path._v2_math import (
+    approximate_amounts_out,
+    get_amount_out,
+    get_amounts_out,
+    get_best_amounts_out,
+)
+
+from .fake_rpc import create_fake_w3
+
+
+shallow_pair = (10**21, 2 * 10**12)  # 1000 WETH / 2M USDC
+deep_pair = (10**23, 2 * 10**14)  # 100k WETH / 200M USDC
+two_hop_path = ((10**24, 10**24), (10**23, 2 * 10**14))  # cheap first hop, then deep
+
+
+@pytest.mark.parametrize("amount_in", (0, 1, 10**15, 10**18, 10**21, 10**24))
+@pytest.mark.parametrize("reserves", (shallow_pair, deep_pair, (1, 1)))
+def test_get_amount_out(amount_in, reserves):
+    # UniswapV2Library.getAmountOut()
+    amount_in_with_fee = amount_in * 997
+    expected_amount_out = amount_in_with_fee * reserves[1] // (reserves[0] * 1000 + amount_in_with_fee)
+    assert get_amount_out(amount_in, reserves, 3000) == expected_amount_out
+
+
+def test_get_amounts_out():
+    amount_out = get_amount_out(get_amount_out(10**18, two_hop_path[0], 3000), two_hop_path[1], 3000)
+    assert get_amounts_out(10**18, two_hop_path, 3000) == amount_out
+    assert get_amounts_out(10**18, (), 3000) == 10**18
+    assert get_amounts_out(10**18, (shallow_pair, (0, 0)), 3000) == 0
+
+
+@pytest.fixture(params=(True, False), ids=("numpy", "python"))
+def with_numpy(request, monkeypatch):
+    if request.param:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(_v2_math, "np", None)
+
+
+def test_approximate_amounts_out(with_numpy):
+    amounts = [10**15, 10**18, 10**21]
+    paths = [(shallow_pair, ), (deep_pair, ), two_hop_path]
+    grid = approximate_amounts_out(amounts, paths, 3000)
+    for i, path_reserves in enumerate(paths):
+        for j, amount in enumerate(amounts):
+            exact_amount_out = get_amounts_out(amount, path_reserves, 3000)
+            assert grid[i][j] == pytest.approx(exact_amount_out, rel=1e-9, abs=len(path_reserves))  # floor rounding
+
+
+def test_get_best_amounts_out(with_numpy):
+    amounts = [10**15, 10**18, 10**21, 10**22]
+    paths = [(shallow_pair, ), (deep_pair, ), two_hop_path]
+    best_amounts_out = get_best_amounts_out(amounts, paths, 3000)
+    for amount, (index, amount_out) in zip(amounts, best_amounts_out):
+        exact_amounts_out = [get_amounts_out(amount, path_reserves, 3000) for path_reserves in paths]
+        assert amount_out == max(exact_amounts_out)
+        assert exact_amounts_out[index] == amount_out
+    assert best_amounts_out[-1][0] == 1  # the deep pool for large amounts
+
+    with pytest.raises(ValueError):
+        get_best_amounts_out(amounts, [], 3000)
+
+
+def test_get_best_amounts_out_with_path_costs(with_numpy):
+    amounts = [10**15, 10**22]
+    paths = [(shallow_pair, ), (deep_pair, )]
+    path_costs = [0., 10**9]  # 1000 USDC
+    best_amounts_out = get_best_amounts_out(amounts, paths, 3000, path_costs=path_costs)
+    assert best_amounts_out[0] == (0, get_amounts_out(10**15, paths[0], 3000))  # the cost exceeds the gain
+    assert best_amounts_out[1] == (1, get_amounts_out(10**22, paths[1], 3000))  # the gain exceeds the cost, gross
+
+
+@pytest.mark.universe(token_count=30)
+async def test_v2_split_evaluation(universe, pairs):
+    results = []
+    for kwargs in ({}, {"v2_pool_fee": 3000}):  # opt-in
+        w3, rpc = create_fake_w3(universe)  # a new RPC for each SmartPath, to count its requests
+        smart_path = await SmartPath.create(w3, **kwargs)
+        rpc.reset_counts()
+        paths = [await smart_path.get_swap_in_path(amount, token_in, token_out) for amount, token_in, token_out in pairs]  # noqa
+        results.append((paths, dict(rpc.counts)))
+
+    (quoted_paths, quoted_counts), (evaluated_paths, evaluated_counts) = results
+    assert [sum(p["estimate"] for p in path) for path in evaluated_paths] == [sum(p["estimate"] for p in path) for path in quoted_paths]  # noqa
+    assert "eth_call.getReserves" not in quoted_counts
+    assert evaluated_counts["eth_call.getReserves"] > 0
+    assert evaluated_counts["eth_call.getAmountsOut"] < quoted_counts["eth_call.getAmountsOut"]
@@ -1,5 +1,62 @@
+from uniswap_smart_path.block_tracker import BlockTracker
+from uniswap_smart_path.cassette import (
+    Cassette,
+    RecordingProvider,
+    ReplayProvider,
+)
+from uniswap_smart_path.concurrency_limiter import ConcurrencyLimiter
+from uniswap_smart_path.failure_cache import FailureCache
+from uniswap_smart_path.http_settings import HttpSettings
+from uniswap_smart_path.instrumentation import (
+    CallbackSink,
+    HistogramSink,
+    Instrumentation,
+    PrometheusSink,
+    RequestMetrics,
+)
+from uniswap_smart_path.pipeline import QuotePipeline
+from uniswap_smart_path.pivot_learner import PivotLearner
+from uniswap_smart_path.pool_index import PoolIndex
+from uniswap_smart_path.retry_policy import (
+    CircuitBreaker,
+    RetryPolicy,
+)
+from uniswap_smart_path.route_cache import RouteCache
+from uniswap_smart_path.route_warmer import RouteWarmer
 from uniswap_smart_path.smart_path import SmartPath
 from uniswap_smart_path.smart_rate_limiter import SmartRateLimiter
+from uniswap_smart_path.tracing import (
+    InMemorySpanExporter,
+    JsonSpanExporter,
+    OpenTelemetrySpanExporter,
+    Tracer,
+)
 
 
-__all__ = ["SmartPath", "SmartRateLimiter"]
+__all__ = [
+    "BlockTracker",
+    "CallbackSink",
+    "Cassette",
+    "CircuitBreaker",
+    "ConcurrencyLimiter",
+    "FailureCache",
+    "HistogramSink",
+    "HttpSettings",
+    "InMemorySpanExporter",
+    "Instrumentation",
+    "JsonSpanExporter",
+    "OpenTelemetrySpanExporter",
+    "PivotLearner",
+    "PoolIndex",
+    "PrometheusSink",
+    "QuotePipeline",
+    "RecordingProvider",
+    "ReplayProvider",
+    "RequestMetrics",
+    "RetryPolicy",
+    "RouteCache",
+    "RouteWarmer",
+    "SmartPath",
+    "SmartRateLimiter",
+    "Tracer",
+]
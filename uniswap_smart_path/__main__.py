@@ -0,0 +1,150 @@
+"""
+Command line of uniswap-smart-path.
+
+    python -m uniswap_smart_path serve --rpc-endpoint https://... --port 8080
+    python -m uniswap_smart_path serve --rpc-endpoint wss://... --max-count 10 --interval 1 --route-cache-size 1024
+
+    python -m uniswap_smart_path quote --rpc-endpoint https://... --input rows.jsonl --output quotes.jsonl
+
+serve: run a local quote server (see QuoteServer), so all the processes of an application share one SmartPath, with
+its caches and one rate-limited pool of RPC connections. The RPC endpoint defaults to the RPC_ENDPOINT environment
+variable.
+
+quote: quote a JSONL stream of requests, from a file or stdin (see QuotePipeline). An interrupted run is resumed after
+the last row of the output file.
+"""
+import argparse
+import asyncio
+import logging
+import os
+from typing import (
+    Any,
+    Dict,
+    Optional,
+    Sequence,
+)
+
+from .concurrency_limiter import ConcurrencyLimiter
+from .http_settings import HttpSettings
+from .pipeline import QuotePipeline
+from .retry_policy import RetryPolicy
+from .route_cache import RouteCache
+from .smart_path import SmartPath
+from .smart_rate_limiter import SmartRateLimiter
+
+
+logger = logging.getLogger(__name__)
+
+
+factories = ("create", "create_v2_only", "create_v3_only")
+
+
+def is_persistent_endpoint(rpc_endpoint: str) -> bool:
+    return rpc_endpoint.startswith(("ws://", "wss://")) or rpc_endpoint.endswith(".ipc")
+
+
+def get_smart_path_kwargs(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    :return: the SmartPath.create*() keyword arguments from the command line arguments
+    """
+    kwargs: Dict[str, Any] = {"rpc_endpoint": args.rpc_endpoint}
+    if args.max_count:
+        kwargs["smart_rate_limiter"] = SmartRateLimiter(interval=args.interval, max_count=args.max_count)
+    if args.max_in_flight:
+        kwargs["concurrency_limiter"] = ConcurrencyLimiter(args.max_in_flight)
+    if args.retries:
+        kwargs["retry_policy"] = RetryPolicy(max_attempts=args.retries + 1)
+    if args.route_cache_size:
+        kwargs["route_cache"] = RouteCache(max_size=args.route_cache_size)
+    if not is_persistent_endpoint(args.rpc_endpoint):
+        kwargs["http_settings"] = HttpSettings(pool_size=args.pool_size, timeout=args.timeout)
+    return kwargs
+
+
+async def create_smart_path(args: argparse.Namespace) -> SmartPath:
+    smart_path: SmartPath = await getattr(SmartPath, args.factory)(**get_smart_path_kwargs(args))
+    if is_persistent_endpoint(args.rpc_endpoint):
+        smart_path.start_block_tracker()
+    return smart_path
+
+
+async def serve(args: argparse.Namespace) -> None:
+    from .server import QuoteServer  # aiohttp.web is only needed by the server
+
+    smart_path = await create_smart_path(args)
+    server = QuoteServer(smart_path, args.batch_window, args.max_batch_size, args.max_batch_requests)
+    try:
+        await server.serve_forever(args.host, args.port)
+    finally:
+        if smart_path.block_tracker is not None:
+            await smart_path.block_tracker.stop()
+        await smart_path.close()
+
+
+async def quote(args: argparse.Namespace) -> None:
+    smart_path = await create_smart_path(args)
+    pipeline = QuotePipeline(smart_path, args.concurrency, args.block_number, args.progress_interval)
+    try:
+        await pipeline.run_file(args.input, args.output, not args.no_resume)
+    finally:
+        if smart_path.block_tracker is not None:
+            await smart_path.block_tracker.stop()
+        await smart_path.close()
+
+
+def create_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--rpc-endpoint", default=os.environ.get("RPC_ENDPOINT"),
+                        help="http(s)://, ws(s):// or IPC path (default: RPC_ENDPOINT environment variable)")
+    common.add_argument("--factory", choices=factories, default="create", help="SmartPath factory method")
+    common.add_argument("--max-count", type=int, default=0, help="maximum RPC per interval, 0 for no rate limit")
+    common.add_argument("--interval", type=float, default=1., help="rate limit interval in seconds")
+    common.add_argument("--max-in-flight", type=int, default=0, help="maximum RPC in flight, 0 for no limit")
+    common.add_argument("--retries", type=int, default=2, help="retries of the timed out RPC, 0 for none")
+    common.add_argument("--pool-size", type=int, default=100, help="HTTP connections, 0 for no limit")
+    common.add_argument("--timeout", type=float, default=5., help="HTTP request timeout in seconds")
+    common.add_argument("--route-cache-size", type=int, default=1024, help="routes cached per block, 0 for none")
+    common.add_argument("--log-level", default="INFO", choices=("DEBUG", "INFO", "WARNING", "ERROR"))
+
+    parser = argparse.ArgumentParser(
+        prog="python -m uniswap_smart_path",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", parents=[common], help="run a local quote server")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8080)
+    serve_parser.add_argument("--batch-window", type=float, default=0.005,
+                              help="time in seconds during which the requests are gathered into a batch")
+    serve_parser.add_argument("--max-batch-size", type=int, default=64, help="maximum requests in a batch")
+    serve_parser.add_argument("--max-batch-requests", type=int, default=256,
+                              help="maximum requests in a POST /quotes")
+    serve_parser.set_defaults(func=serve)
+
+    quote_parser = subparsers.add_parser("quote", parents=[common], help="quote a JSONL stream of requests")
+    quote_parser.add_argument("--input", default="-", help="JSONL requests (default: stdin)")
+    quote_parser.add_argument("--output", required=True, help="JSONL results, - for stdout")
+    quote_parser.add_argument("--concurrency", type=int, default=32, help="maximum rows quoted at the same time")
+    quote_parser.add_argument("--block-number", type=int, help="quote all the rows at this block (default: latest)")
+    quote_parser.add_argument("--no-resume", action="store_true", help="overwrite the output instead of resuming")
+    quote_parser.add_argument("--progress-interval", type=int, default=1000, help="log the progress every N rows")
+    quote_parser.set_defaults(func=quote)
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = create_parser()
+    args = parser.parse_args(argv)
+    if not args.rpc_endpoint:
+        parser.error("--rpc-endpoint, or the RPC_ENDPOINT environment variable, is required")
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    try:
+        asyncio.run(args.func(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Sequence,
+)
+
+from eth_abi import (
+    decode,
+    encode,
+)
+from eth_abi.exceptions import (
+    DecodingError,
+    EncodingError,
+)
+from eth_utils import (
+    function_signature_to_4byte_selector,
+    to_checksum_address,
+)
+from web3.exceptions import BadFunctionCallOutput
+from web3.types import ChecksumAddress
+
+
+def _to_list(value: Any) -> Any:
+    """
+    Convert the tuples decoded by eth_abi for arrays into lists, as web3 does.
+    """
+    return [_to_list(item) for item in value] if isinstance(value, tuple) else value
+
+
+class PrecompiledFunction:
+    def __init__(self, fn_name: str, input_types: Sequence[str], output_types: Sequence[str]) -> None:
+        """
+        A contract function encoded and decoded directly with eth_abi, without the web3 contract machinery:
+        no ABI lookup nor argument normalization for each call, the selector is computed once.
+        The decoded results are the same as with web3: a single value, or a list for several outputs,
+        with checksum addresses and lists for arrays.
+
+        :param fn_name: the function name, eg: getPair
+        :param input_types: the ABI types of the arguments, eg: ("address", "address")
+        :param output_types: the ABI types of the results, eg: ("address", )
+        """
+        self.fn_name = fn_name
+        self.input_types = tuple(input_types)
+        self.output_types = tuple(output_types)
+        self.selector = function_signature_to_4byte_selector(f"{fn_name}({','.join(self.input_types)})")
+        self._address_output_positions = tuple(i for i, t in enumerate(self.output_types) if t == "address")
+        self._array_output_positions = tuple(i for i, t in enumerate(self.output_types) if t.endswith("]"))
+
+    def encode(self, *args: Any) -> bytes:
+        if not self.input_types:
+            return self.selector
+        try:
+            return self.selector + encode(self.input_types, args)
+        except EncodingError as e:
+            raise ValueError(f"Could not encode the arguments of {self.fn_name}. Reason: {e}") from e
+
+    def decode(self, data: bytes) -> Any:
+        if not data:
+            raise BadFunctionCallOutput(
+                f"Could not decode the output of {self.fn_name}: empty data. Is the contract deployed on this chain?"
+            )
+        try:
+            values = list(decode(self.output_types, data))
+        except (DecodingError, OverflowError, UnicodeDecodeError) as e:
+            raise BadFunctionCallOutput(f"Could not decode the output of {self.fn_name}. Reason: {e}") from e
+        for position in self._address_output_positions:
+            values[position] = to_checksum_address(values[position])
+        for position in self._array_output_positions:
+            values[position] = _to_list(values[position])
+        return values[0] if len(values) == 1 else values
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}: {self.fn_name}({','.join(self.input_types)})"
+
+
+symbol = PrecompiledFunction("symbol", (), ("string", ))
+decimals = PrecompiledFunction("decimals", (), ("uint8", ))
+get_pair = PrecompiledFunction("getPair", ("address", "address"), ("address", ))
+get_pool = PrecompiledFunction("getPool", ("address", "address", "uint24"), ("address", ))
+get_reserves = PrecompiledFunction("getReserves", (), ("uint112", "uint112", "uint32"))
+get_amounts_out = PrecompiledFunction("getAmountsOut", ("uint256", "address[]"), ("uint256[]", ))
+quote_exact_input = PrecompiledFunction(
+    "quoteExactInput",
+    ("bytes", "uint256"),
+    ("uint256", "uint160[]", "uint32[]", "uint256"),
+)
+
+
+@dataclass(frozen=True)
+class EthCall:
+    """
+    An eth_call ready to be sent: the contract address, the precompiled function and the calldata.
+    """
+    __slots__ = ("to", "function", "data")
+    to: ChecksumAddress
+    function: PrecompiledFunction
+    data: bytes
+
+    @classmethod
+    def build(cls, to: ChecksumAddress, function: PrecompiledFunction, *args: Any) -> "EthCall":
+        return cls(to, function, function.encode(*args))
+
+
+class CallTemplate:
+    __slots__ = ("to", "function", "_head", "_tail")
+
+    def __init__(self, to: ChecksumAddress, function: PrecompiledFunction, amount_position: int, *args: Any) -> None:
+        """
+        Calldata encoded once, in which only an amount changes from one call to the other, eg getAmountsOut() for
+        a given path. The amount must be a static argument (eg uint256) so it has a fixed place in the calldata.
+
+        :param to: the contract address
+        :param function: the precompiled function
+        :param amount_position: the position of the amount in the arguments
+        :param args: the arguments, with any value for the amount
+        """
+        self.to = to
+        self.function = function
+        data = function.encode(*args)
+        start = 4 + 32 * amount_position
+        self._head = data[:start]
+        self._tail = data[start + 32:]
+
+    def build(self, amount: int) -> EthCall:
+        if not 0 <= amount < 2**256:
+            raise ValueError(f"Could not encode the arguments of {self.function.fn_name}: invalid amount {amount}")
+        return EthCall(self.to, self.function, self._head + amount.to_bytes(32, "big") + self._tail)
+
+
+def encode_v3_path(path: Sequence[Any]) -> bytes:
+    """
+    Encode a V3 path (token, fee, token, ...) as expected by the quoter: 20-byte addresses and 3-byte fees.
+    """
+    encoded = bytearray()
+    for i, item in enumerate(path):
+        if i % 2:
+            encoded += int(item).to_bytes(3, "big")
+        else:
+            encoded += bytes.fromhex(item[2:])
+    return bytes(encoded)
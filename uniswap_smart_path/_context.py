@@ -0,0 +1,57 @@
+from contextvars import ContextVar
+import itertools
+from typing import (
+    Optional,
+    TYPE_CHECKING,
+)
+
+from web3.types import BlockIdentifier
+
+
+if TYPE_CHECKING:
+    from .instrumentation import RequestMetrics  # pragma: no cover
+    from .tracing import Span  # pragma: no cover
+
+
+_request_ids = itertools.count(1)
+
+
+class Discovery:
+    """
+    Pool discovery of a get_swap_in_path() call: incomplete if the existence of a pool, or the quote of a path, is
+    still unknown, eg the endpoint did not answer, so the pool or the path was left out of the result.
+    """
+    __slots__ = ("complete", )
+
+    def __init__(self) -> None:
+        self.complete = True
+
+
+# Identify the get_swap_in_path() call an RPC belongs to. Tasks created by asyncio.gather() inherit it.
+current_request_id: ContextVar[int] = ContextVar("current_request_id", default=0)
+
+# Block at which the eth_call of the current get_swap_in_path() call are performed.
+current_block_identifier: ContextVar[BlockIdentifier] = ContextVar("current_block_identifier", default="latest")
+
+# Whether the RPC of the current call give way to the other ones in the rate and concurrency limiters, eg to warm the
+# routes in the background.
+current_low_priority: ContextVar[bool] = ContextVar("current_low_priority", default=False)
+
+# Metrics of the current get_swap_in_path() call, if the SmartPath is instrumented.
+current_metrics: "ContextVar[Optional[RequestMetrics]]" = ContextVar("current_metrics", default=None)
+
+# Pool discovery of the current get_swap_in_path() call, if its result is to be cached.
+current_discovery: ContextVar[Optional[Discovery]] = ContextVar("current_discovery", default=None)
+
+# Innermost span of the current get_swap_in_path() call, if it is traced.
+current_span: "ContextVar[Optional[Span]]" = ContextVar("current_span", default=None)
+
+
+def new_request_id() -> int:
+    return next(_request_ids)
+
+
+def mark_discovery_incomplete() -> None:
+    discovery = current_discovery.get()
+    if discovery is not None:
+        discovery.complete = False
@@ -1,5 +1,9 @@
 import asyncio
-from dataclasses import dataclass
+from collections import OrderedDict
+from dataclasses import (
+    dataclass,
+    fields,
+)
 from enum import Enum
 import logging
 from typing import (
@@ -12,13 +16,12 @@ from typing import (
     Protocol,
     Sequence,
     Tuple,
+    Type,
     TypedDict,
     TypeVar,
     Union,
 )
 
-from uniswap_universal_router_decoder import RouterCodec
-from web3 import AsyncWeb3
 from web3.contract import AsyncContract
 from web3.exceptions import Web3Exception
 from web3.types import (
@@ -26,19 +29,46 @@ from web3.types import (
     Wei,
 )
 
-from ._utilities import to_wei
-from .smart_rate_limiter import (
-    _rate_limit,
-    SmartRateLimiter,
+from ._calls import (
+    CallTemplate,
+    encode_v3_path,
+    get_amounts_out,
+    quote_exact_input,
 )
+from ._context import mark_discovery_incomplete
+from ._rpc import RpcDispatcher
+from ._utilities import to_wei
+from .retry_policy import TRANSIENT_ERRORS
+from .smart_rate_limiter import SmartRateLimiter
+from .tracing import span
 
 
 logger = logging.getLogger(__name__)
-codec = RouterCodec()
+
+
+# gas model of the V2 swaps, as the V2 router does not return an estimate like the V3 quoter does. Like the quoter
+# estimates, it does not include the transaction base cost, which is the same whatever the path.
+v2_swap_gas = 90_000
+v2_extra_hop_gas = 60_000
+
+
+class _FrozenSlots:
+    """
+    Pickle and copy support for the frozen dataclasses with __slots__, as dataclass(slots=True) does in Python 3.10+.
+    """
+    __slots__ = ()
+
+    def __getstate__(self) -> List[Any]:
+        return [getattr(self, f.name) for f in fields(self)]  # type: ignore[arg-type]
+
+    def __setstate__(self, state: List[Any]) -> None:
+        for f, value in zip(fields(self), state):  # type: ignore[arg-type]
+            object.__setattr__(self, f.name, value)
 
 
 @dataclass(frozen=True)
-class Token:
+class Token(_FrozenSlots):
+    __slots__ = ("address", "symbol", "decimals")
     address: ChecksumAddress
     symbol: str
     decimals: int
@@ -52,13 +82,15 @@ class RouterFunction(Enum):
 
 
 @dataclass(frozen=True)
-class V2OrderedPool:
+class V2OrderedPool(_FrozenSlots):
+    __slots__ = ("token_in", "token_out")
     token_in: Token
     token_out: Token
 
 
 @dataclass(frozen=True)
-class V3OrderedPool:
+class V3OrderedPool(_FrozenSlots):
+    __slots__ = ("token_in", "pool_fee", "token_out")
     token_in: Token
     pool_fee: int
     token_out: Token
@@ -71,20 +103,50 @@ PathList = TypeVar('PathList', V2PathList, V3PathList)
 
 
 class PoolPath(Protocol[OrderedPool, PathList]):
+    __slots__ = ()
     pools: Sequence[OrderedPool]
     def get_path(self) -> PathList: ...
     def to_dict(self) -> Dict[str, PathList]: ...
     async def get_amount_out(self, amount_in: Wei) -> Wei: ...
+    async def get_amount_out_and_gas(self, amount_in: Wei) -> Tuple[Wei, int]: ...
     def get_smart_rate_limiter(self) -> Optional[SmartRateLimiter]: ...
+    def get_weighted_path(self, weight: int) -> "WeightedPath": ...
 
 
-class V2PoolPath(PoolPath[V2OrderedPool, V2PathList]):
-    contract: AsyncContract = AsyncWeb3().eth.contract(AsyncWeb3.to_checksum_address("0" * 40))
+def get_contract(pool_path: Union["V2PoolPath", "V3PoolPath"]) -> AsyncContract:
+    """
+    :return: the router or quoter contract used to quote the pool path, set when a SmartPath is created
+    """
+    if pool_path.contract is None:
+        raise ValueError(f"No contract to quote {pool_path}: a SmartPath must be created first")
+    return pool_path.contract
 
-    def __init__(self, pools: Sequence[V2OrderedPool], smart_rate_limiter: Optional[SmartRateLimiter] = None) -> None:
+
+class V2PoolPath(PoolPath[V2OrderedPool, V2PathList]):
+    __slots__ = (
+        "pools",
+        "path",
+        "gas_estimate",
+        "smart_rate_limiter",
+        "rpc_dispatcher",
+        "_call_template",
+        "_weighted_paths",
+    )
+    contract: Optional[AsyncContract] = None  # set by SmartPath
+    router_function = RouterFunction.V2_SWAP_EXACT_IN
+
+    def __init__(
+            self,
+            pools: Sequence[V2OrderedPool],
+            smart_rate_limiter: Optional[SmartRateLimiter] = None,
+            rpc_dispatcher: Optional[RpcDispatcher] = None) -> None:
         self.pools = pools
         self.path = self._build_path()
+        self.gas_estimate = v2_swap_gas + v2_extra_hop_gas * (len(pools) - 1)
         self.smart_rate_limiter = smart_rate_limiter
+        self.rpc_dispatcher = rpc_dispatcher or RpcDispatcher(smart_rate_limiter)
+        self._call_template: Optional[CallTemplate] = None
+        self._weighted_paths: Dict[int, WeightedPath] = {}
 
     def get_smart_rate_limiter(self) -> Optional[SmartRateLimiter]:
         return self.smart_rate_limiter
@@ -101,22 +163,60 @@ class V2PoolPath(PoolPath[V2OrderedPool, V2PathList]):
     def to_dict(self) -> Dict[str, V2PathList]:
         return {"path": self.get_path()}
 
-    @_rate_limit("eth_call")
+    def get_weighted_path(self, weight: int) -> "WeightedPath":
+        return _get_weighted_path(self, weight)
+
+    def _get_call_template(self, contract: AsyncContract) -> CallTemplate:
+        if self._call_template is None or self._call_template.to != contract.address:
+            self._call_template = CallTemplate(contract.address, get_amounts_out, 0, 0, self.path)
+        return self._call_template
+
     async def get_amount_out(self, amount_in: Wei) -> Wei:
-        quote = await self.contract.functions.getAmountsOut(amount_in, self.get_path()).call()
-        return to_wei(quote[-1])
+        with span("get_amount_out") as quote_span:
+            if quote_span is not None:
+                quote_span.set_attributes(function="V2_SWAP_EXACT_IN", path=str(self.path), amount_in=amount_in)
+            contract = get_contract(self)
+            quote = await self.rpc_dispatcher.eth_call(
+                self._get_call_template(contract).build(amount_in),
+                w3=contract.w3,
+            )
+            amount_out = to_wei(quote[-1])
+            if quote_span is not None:
+                quote_span.set_attribute("amount_out", amount_out)
+            return amount_out
+
+    async def get_amount_out_and_gas(self, amount_in: Wei) -> Tuple[Wei, int]:
+        return await self.get_amount_out(amount_in), self.gas_estimate
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}: {self.path}"
 
 
 class V3PoolPath(PoolPath[V3OrderedPool, V3PathList]):
-    contract: AsyncContract = AsyncWeb3().eth.contract(AsyncWeb3.to_checksum_address("0" * 40))
-
-    def __init__(self, pools: Sequence[V3OrderedPool], smart_rate_limiter: Optional[SmartRateLimiter] = None) -> None:
+    __slots__ = (
+        "pools",
+        "path",
+        "encoded_path",
+        "smart_rate_limiter",
+        "rpc_dispatcher",
+        "_call_template",
+        "_weighted_paths",
+    )
+    contract: Optional[AsyncContract] = None  # set by SmartPath
+    router_function = RouterFunction.V3_SWAP_EXACT_IN
+
+    def __init__(
+            self,
+            pools: Sequence[V3OrderedPool],
+            smart_rate_limiter: Optional[SmartRateLimiter] = None,
+            rpc_dispatcher: Optional[RpcDispatcher] = None) -> None:
         self.pools = pools
         self.path = self._build_path()
+        self.encoded_path = encode_v3_path(self.path)
         self.smart_rate_limiter = smart_rate_limiter
+        self.rpc_dispatcher = rpc_dispatcher or RpcDispatcher(smart_rate_limiter)
+        self._call_template: Optional[CallTemplate] = None
+        self._weighted_paths: Dict[int, WeightedPath] = {}
 
     def get_smart_rate_limiter(self) -> Optional[SmartRateLimiter]:
         return self.smart_rate_limiter
@@ -134,18 +234,98 @@ class V3PoolPath(PoolPath[V3OrderedPool, V3PathList]):
     def to_dict(self) -> Dict[str, V3PathList]:
         return {"path": self.get_path()}
 
-    @_rate_limit("eth_call")
+    def get_weighted_path(self, weight: int) -> "WeightedPath":
+        return _get_weighted_path(self, weight)
+
+    def _get_call_template(self, contract: AsyncContract) -> CallTemplate:
+        if self._call_template is None or self._call_template.to != contract.address:
+            self._call_template = CallTemplate(contract.address, quote_exact_input, 1, self.encoded_path, 0)
+        return self._call_template
+
     async def get_amount_out(self, amount_in: Wei) -> Wei:
-        encoded_path = codec.encode.v3_path("V3_SWAP_EXACT_IN", self.get_path())
-        quote = await self.contract.functions.quoteExactInput(encoded_path, amount_in).call()
-        return to_wei(quote[0])
+        return (await self.get_amount_out_and_gas(amount_in))[0]
+
+    async def get_amount_out_and_gas(self, amount_in: Wei) -> Tuple[Wei, int]:
+        """
+        :return: the quoted amount out, and the gas estimate returned along by the quoter
+        """
+        with span("get_amount_out") as quote_span:
+            if quote_span is not None:
+                quote_span.set_attributes(function="V3_SWAP_EXACT_IN", path=str(self.path), amount_in=amount_in)
+            contract = get_contract(self)
+            quote = await self.rpc_dispatcher.eth_call(
+                self._get_call_template(contract).build(amount_in),
+                w3=contract.w3,
+            )
+            amount_out = to_wei(quote[0])
+            if quote_span is not None:
+                quote_span.set_attributes(amount_out=amount_out, gas_estimate=quote[3])
+            return amount_out, int(quote[3])
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}: {self.path}"
 
 
+def _get_weighted_path(pool_path: Union[V2PoolPath, V3PoolPath], weight: int) -> "WeightedPath":
+    """
+    :return: the weighted path of the pool path for the given weight, built once and reused across requests
+    """
+    weighted_path = pool_path._weighted_paths.get(weight)
+    if weighted_path is None:
+        weighted_path = WeightedPath(pool_path.router_function, pool_path, weight)
+        pool_path._weighted_paths[weight] = weighted_path
+    return weighted_path
+
+
+class PoolPathCache:
+    def __init__(
+            self,
+            smart_rate_limiter: Optional[SmartRateLimiter] = None,
+            rpc_dispatcher: Optional[RpcDispatcher] = None,
+            max_size: int = 4096) -> None:
+        """
+        Intern the pool paths per pool sequence, so they are built once and reused across requests, along with their
+        encoded path, calldata and weighted paths. The least recently used ones are evicted when the cache is full.
+
+        :param smart_rate_limiter: the rate limiter given to the pool paths
+        :param rpc_dispatcher: the dispatcher given to the pool paths
+        :param max_size: maximum number of pool paths kept
+        """
+        self.smart_rate_limiter = smart_rate_limiter
+        self.rpc_dispatcher = rpc_dispatcher
+        self.max_size = max_size
+        self._pool_paths: "OrderedDict[Tuple[Any, ...], Union[V2PoolPath, V3PoolPath]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._pool_paths)
+
+    def get_pool_paths(self) -> List[Union[V2PoolPath, V3PoolPath]]:
+        return list(self._pool_paths.values())
+
+    def get_v2_pool_path(self, pools: Tuple[V2OrderedPool, ...]) -> V2PoolPath:
+        return cast(V2PoolPath, self._get(V2PoolPath, pools))
+
+    def get_v3_pool_path(self, pools: Tuple[V3OrderedPool, ...]) -> V3PoolPath:
+        return cast(V3PoolPath, self._get(V3PoolPath, pools))
+
+    def _get(
+            self,
+            pool_path_class: Union[Type[V2PoolPath], Type[V3PoolPath]],
+            pools: Tuple[Any, ...]) -> Union[V2PoolPath, V3PoolPath]:
+        pool_path = self._pool_paths.get(pools)
+        if pool_path is None:
+            pool_path = pool_path_class(pools, self.smart_rate_limiter, self.rpc_dispatcher)
+            self._pool_paths[pools] = pool_path
+            if len(self._pool_paths) > self.max_size:
+                self._pool_paths.popitem(last=False)
+        else:
+            self._pool_paths.move_to_end(pools)
+        return pool_path
+
+
 @dataclass(frozen=True)
-class WeightedPath:
+class WeightedPath(_FrozenSlots):
+    __slots__ = ("router_function", "pool_path", "weight")
     router_function: RouterFunction
     pool_path: PoolPath  # type: ignore
     weight: int
@@ -157,35 +337,74 @@ class WeightedPath:
         return result
 
 
-class WeightedPathResult(TypedDict):
+class _WeightedPathResult(TypedDict):
     function: str
     path: PathList  # type: ignore
     weight: int
     estimate: Wei
 
 
+class WeightedPathResult(_WeightedPathResult, total=False):
+    gas_estimate: int  # only with gas estimates
+
+
 class MixedWeightedPath:
-    def __init__(self, weighted_paths: Sequence[WeightedPath]) -> None:
+    __slots__ = ("weighted_paths", "known_values", "values", "gas_estimates", "total_value", "gas_cost", "error")
+
+    def __init__(
+            self,
+            weighted_paths: Sequence[WeightedPath],
+            known_values: Optional[Dict[int, Tuple[Wei, int]]] = None) -> None:
         self.weighted_paths: Tuple[WeightedPath, ...] = tuple(weighted_paths)
+        # (value, gas) already computed without RPC, by weighted path position, eg V2 legs computed from the reserves
+        self.known_values: Dict[int, Tuple[Wei, int]] = known_values or {}
         self.values: Tuple[Wei, ...] = (Wei(0), Wei(0))
+        self.gas_estimates: Tuple[int, ...] = (0, 0)
         self.total_value: Wei = Wei(0)
-
-    async def compute_path_values(self, amount: Wei) -> None:
-        computing_coros: List[Coroutine[Any, Any, Wei]] = [
-            w_p.pool_path.get_amount_out(Wei(amount * w_p.weight // 100))
-            for w_p in self.weighted_paths
+        self.gas_cost: Wei = Wei(0)  # cost of the gas estimates, in token out
+        self.error: Optional[BaseException] = None  # why the values could not be computed, if so
+
+    @property
+    def net_value(self) -> Wei:
+        """
+        The total value minus the gas cost, used to rank the paths. Same as total_value without gas estimates.
+        """
+        return Wei(self.total_value - self.gas_cost)
+
+    async def _get_known_value(self, position: int) -> Tuple[Wei, int]:
+        return self.known_values[position]
+
+    async def compute_path_values(self, amount: Wei, gas_unit_cost: float = 0.) -> None:
+        """
+        :param amount: the amount of token in, split between the weighted paths
+        :param gas_unit_cost: the cost of a gas unit in token out, to compute the gas cost. 0 to ignore the gas.
+        """
+        computing_coros: List[Coroutine[Any, Any, Tuple[Wei, int]]] = [
+            self._get_known_value(i) if i in self.known_values
+            else w_p.pool_path.get_amount_out_and_gas(Wei(amount * w_p.weight // 100))
+            for i, w_p in enumerate(self.weighted_paths)
         ]
         try:
-            self.values = tuple(await asyncio.gather(*computing_coros))
+            results = await asyncio.gather(*computing_coros)
+            self.values = tuple(value for value, _ in results)
+            self.gas_estimates = tuple(gas for _, gas in results)
             self.total_value = Wei(sum(self.values))
-        except (asyncio.exceptions.TimeoutError, ValueError, Web3Exception) as e:
+            self.gas_cost = Wei(int(sum(self.gas_estimates) * gas_unit_cost))
+        except TRANSIENT_ERRORS as e:
+            logger.debug(f"Could not compute value for path(s): {self.weighted_paths}. Reason: {e!r}")
+            self.error = e
+            mark_discovery_incomplete()  # the value is unknown, not missing
+        except (ValueError, Web3Exception) as e:
             logger.debug(f"Could not compute value for path(s): {self.weighted_paths}. Reason: {e}")
+            self.error = e
 
-    def output(self) -> Tuple[WeightedPathResult, ...]:
+    def output(self, with_gas_estimate: bool = False) -> Tuple[WeightedPathResult, ...]:
         output = []
         for i, path in enumerate(self.weighted_paths):
             path_dict = path.to_dict()
             path_dict["estimate"] = self.values[i]
+            if with_gas_estimate:
+                path_dict["gas_estimate"] = self.gas_estimates[i]
             output.append(cast(WeightedPathResult, path_dict))
 
         return tuple(output)
@@ -194,5 +413,6 @@ class MixedWeightedPath:
         return (
             f"{self.__class__.__name__}: {self.weighted_paths}, "
             f"values: {self.values}, "
-            f"total_value: {self.total_value}"
+            f"total_value: {self.total_value}, "
+            f"gas_cost: {self.gas_cost}"
         )
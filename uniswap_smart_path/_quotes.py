@@ -0,0 +1,48 @@
+from typing import (
+    Any,
+    Dict,
+    Tuple,
+)
+
+from web3 import AsyncWeb3
+from web3.types import (
+    BlockNumber,
+    ChecksumAddress,
+    Wei,
+)
+
+from ._datastructures import WeightedPathResult
+
+
+QuoteKey = Tuple[Wei, ChecksumAddress, ChecksumAddress]  # same order as get_swap_in_path() parameters
+Quote = Tuple[Tuple[WeightedPathResult, ...], BlockNumber]
+
+
+def parse_quote_request(body: Any) -> QuoteKey:
+    """
+    :param body: the JSON request: {"amount": "1000000000000000000", "token_in": "0x...", "token_out": "0x..."}
+    :raise ValueError: if the request is invalid
+    :return: the get_swap_in_path() parameters
+    """
+    if not isinstance(body, dict):
+        raise ValueError("A JSON object is expected")
+    missing_fields = [field for field in ("amount", "token_in", "token_out") if field not in body]
+    if missing_fields:
+        raise ValueError(f"Missing field(s): {', '.join(missing_fields)}")
+    amount = body["amount"]
+    if isinstance(amount, bool) or not isinstance(amount, (int, str)):
+        raise ValueError(f"amount must be an integer, or a string of an integer. Got {amount!r}")
+    amount = int(amount)
+    if amount <= 0:
+        raise ValueError(f"amount must be greater than 0. Got {amount}")
+    addresses = []
+    for field in ("token_in", "token_out"):
+        if not isinstance(body[field], str) or not AsyncWeb3.is_address(body[field]):
+            raise ValueError(f"{field} must be an address. Got {body[field]!r}")
+        addresses.append(AsyncWeb3.to_checksum_address(body[field]))
+    return Wei(amount), addresses[0], addresses[1]
+
+
+def format_quote(quote: Quote) -> Dict[str, Any]:
+    paths, block_number = quote
+    return {"block_number": block_number, "paths": [dict(path) for path in paths]}
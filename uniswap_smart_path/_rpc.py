@@ -0,0 +1,188 @@
+import asyncio
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    cast,
+    Hashable,
+    Optional,
+)
+
+from hexbytes import HexBytes
+from web3 import AsyncWeb3
+from web3.types import (
+    BlockIdentifier,
+    BlockNumber,
+)
+
+from ._calls import EthCall
+from ._context import (
+    current_block_identifier,
+    current_metrics,
+)
+from ._single_flight import SingleFlight
+from .concurrency_limiter import ConcurrencyLimiter
+from .retry_policy import RetryPolicy
+from .smart_rate_limiter import (
+    _rate_limit,
+    RateLimitedMethod,
+    SmartRateLimiter,
+)
+from .tracing import (
+    add_credits,
+    set_attribute,
+    span,
+)
+
+
+# the functions called to quote the paths, the others are called to discover them
+QUOTE_FUNCTIONS = frozenset(("quoteExactInput", "getAmountsOut", "getReserves"))
+
+
+def _get_endpoint(w3: Optional[AsyncWeb3]) -> Hashable:
+    """
+    :return: identifies the endpoint of the w3 provider, for its circuit breaker
+    """
+    provider = getattr(w3, "provider", None)
+    return getattr(provider, "endpoint_uri", None) or id(provider)
+
+
+class RpcDispatcher:
+    """
+    Single entry point for the eth_call performed to compute the paths.
+    Concurrent identical calls, ie same contract, calldata and block, are coalesced into one request.
+    The remaining requests are retried on transient errors if a RetryPolicy is given, and each attempt waits for a
+    slot if a ConcurrencyLimiter is given, then is rate limited if a SmartRateLimiter is given.
+    Once sent, an attempt times out after the quote timeout for the quotes, or the discovery timeout for the others.
+    """
+    def __init__(
+            self,
+            smart_rate_limiter: Optional[SmartRateLimiter] = None,
+            concurrency_limiter: Optional[ConcurrencyLimiter] = None,
+            w3: Optional[AsyncWeb3] = None,
+            retry_policy: Optional[RetryPolicy] = None,
+            discovery_timeout: Optional[float] = None,
+            quote_timeout: Optional[float] = None) -> None:
+        self.smart_rate_limiter = smart_rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+        self.w3 = w3
+        self.retry_policy = retry_policy
+        self.discovery_timeout = discovery_timeout
+        self.quote_timeout = quote_timeout
+        self.single_flight = SingleFlight()
+
+    def get_smart_rate_limiter(self) -> Optional[SmartRateLimiter]:
+        return self.smart_rate_limiter
+
+    async def eth_call(
+            self,
+            call: EthCall,
+            block_identifier: Optional[BlockIdentifier] = None,
+            w3: Optional[AsyncWeb3] = None) -> Any:
+        """
+        Perform a precompiled eth_call: the calldata is already encoded and the result is decoded with eth_abi,
+        which is much cheaper in CPU than going through the web3 contract functions.
+
+        :param call: the precompiled call
+        :param block_identifier: the block, by default the block of the current get_swap_in_path() call
+        :param w3: the AsyncWeb3 instance to send the call with, by default the one of the dispatcher
+        """
+        if block_identifier is None:
+            block_identifier = current_block_identifier.get()
+        _w3 = w3 or self.w3
+        if _w3 is None:
+            raise ValueError("An AsyncWeb3 instance is needed to send an eth_call")
+        return await self._dispatch(
+            (call.to, call.data, block_identifier),
+            f"eth_call.{call.function.fn_name}",
+            lambda requested_at: self._eth_call(_w3, call, block_identifier, requested_at),
+            block_identifier,
+            _get_endpoint(_w3),
+        )
+
+    async def get_block_number(self) -> BlockNumber:
+        if self.w3 is None:
+            raise ValueError("An AsyncWeb3 instance is needed to get the block number")
+        return cast(
+            BlockNumber,
+            await self._dispatch(
+                ("eth_blockNumber", ),
+                "eth_blockNumber",
+                self._get_block_number,
+                endpoint=_get_endpoint(self.w3),
+            ),
+        )
+
+    async def _dispatch(
+            self,
+            key: Hashable,
+            method: str,
+            request: Callable[[float], Awaitable[Any]],
+            block_identifier: Optional[BlockIdentifier] = None,
+            endpoint: Hashable = None) -> Any:
+        with span("rpc", method=method) as rpc_span:
+            coalesced = key in self.single_flight
+            metrics = current_metrics.get()
+            if metrics is not None and coalesced:
+                metrics.coalesced_rpc_count += 1
+            if rpc_span is not None:
+                rpc_span.set_attribute("coalesced", coalesced)
+                if block_identifier is not None:
+                    rpc_span.set_attribute("block", block_identifier)
+            return await self.single_flight.do(key, lambda: self._retried(method, request, endpoint))
+
+    async def _retried(self, method: str, request: Callable[[float], Awaitable[Any]], endpoint: Hashable) -> Any:
+        if self.retry_policy is None:
+            return await self._limited(method, request)
+        return await self.retry_policy.run(endpoint, lambda: self._limited(method, request))
+
+    async def _limited(self, method: str, request: Callable[[float], Awaitable[Any]]) -> Any:
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.add_rpc(method)
+        if self.concurrency_limiter is None:
+            return await request(time.perf_counter())
+
+        wait_time = await self.concurrency_limiter.acquire()
+        try:
+            if metrics is not None:
+                metrics.concurrency_wait_time += wait_time
+            set_attribute("concurrency_wait_time", wait_time)
+            return await request(time.perf_counter())
+        finally:
+            self.concurrency_limiter.release()
+
+    def _on_request_sent(self, method_name: RateLimitedMethod, requested_at: float) -> None:
+        wait_time = time.perf_counter() - requested_at
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.rate_limiter_wait_time += wait_time
+        set_attribute("rate_limiter_wait_time", wait_time)
+        if self.smart_rate_limiter is not None:
+            add_credits(self.smart_rate_limiter.get_method_credits(method_name))
+
+    async def _timed(self, function_name: str, request: Awaitable[Any]) -> Any:
+        timeout = self.quote_timeout if function_name in QUOTE_FUNCTIONS else self.discovery_timeout
+        if timeout is None:
+            return await request
+        return await asyncio.wait_for(request, timeout)
+
+    @_rate_limit("eth_call")
+    async def _eth_call(
+            self,
+            w3: AsyncWeb3,
+            call: EthCall,
+            block_identifier: Optional[BlockIdentifier],
+            requested_at: float) -> Any:
+        self._on_request_sent("eth_call", requested_at)
+        data = await self._timed(
+            call.function.fn_name,
+            w3.eth.call({"to": call.to, "data": HexBytes(call.data)}, block_identifier),
+        )
+        return call.function.decode(data)
+
+    @_rate_limit("eth_blockNumber")
+    async def _get_block_number(self, requested_at: float) -> BlockNumber:
+        self._on_request_sent("eth_blockNumber", requested_at)
+        return cast(BlockNumber, await self._timed("eth_blockNumber", cast(AsyncWeb3, self.w3).eth.block_number))
@@ -0,0 +1,74 @@
+import asyncio
+from functools import partial
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    cast,
+    Dict,
+    Hashable,
+    TypeVar,
+)
+
+
+T = TypeVar("T")
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Future[Any]") -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls: while a call identified by a key is in flight, any other call with the same
+    key awaits the same result (or exception) instead of being performed once more.
+    Nothing is kept once the call is done, so results can never be stale.
+    """
+    def __init__(self) -> None:
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.call_count = 0
+        self.coalesced_count = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Await func() result, or the result of an identical call already in flight.
+
+        :param key: identifies identical calls
+        :param func: performs the call when none is in flight for the key
+        :return: the call result
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            self.call_count += 1
+            flight = _Flight(asyncio.ensure_future(func()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(partial(self._forget, key, flight))
+        else:
+            self.coalesced_count += 1
+
+        flight.waiters += 1
+        try:
+            return cast(T, await asyncio.shield(flight.task))
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # every caller gave up (cancellation, deadline, ...): no need to keep the call going
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    def _forget(self, key: Hashable, flight: _Flight, task: "asyncio.Future[Any]") -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not task.cancelled():
+            task.exception()  # mark it as retrieved, callers get it through shield()
@@ -0,0 +1,111 @@
+from typing import (
+    Any,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+
+try:
+    import numpy as np
+except ImportError:  # optional, only to speed up the approximate evaluation
+    np = None
+
+
+FEE_DENOMINATOR = 1_000_000  # same unit as the V3 pool fees: 3000 for 0.3%
+
+Reserves = Tuple[int, int]  # (reserve_in, reserve_out) of a V2 pair, in the swap direction
+
+
+def get_amount_out(amount_in: int, reserves: Reserves, fee: int) -> int:
+    """
+    Exact V2 output amount, computed as UniswapV2Library.getAmountOut() does.
+    The router reverts on an empty input or pair: 0 is returned instead.
+    """
+    reserve_in, reserve_out = reserves
+    if amount_in <= 0 or reserve_in <= 0 or reserve_out <= 0:
+        return 0
+    amount_in_with_fee = amount_in * (FEE_DENOMINATOR - fee)
+    return amount_in_with_fee * reserve_out // (reserve_in * FEE_DENOMINATOR + amount_in_with_fee)
+
+
+def get_amounts_out(amount_in: int, path_reserves: Sequence[Reserves], fee: int) -> int:
+    """
+    Exact output amount of a multi-hop V2 path, as UniswapV2Router.getAmountsOut()[-1].
+    """
+    amount = amount_in
+    for reserves in path_reserves:
+        amount = get_amount_out(amount, reserves, fee)
+    return amount
+
+
+def approximate_amounts_out(amounts: Sequence[int], paths_reserves: Sequence[Sequence[Reserves]], fee: int) -> Any:
+    """
+    Floating point output amounts of each path for each amount, in one pass over the whole grid.
+    Use NumPy if it is installed.
+
+    :return: grid[path_index][amount_index], as a NumPy array or a list of lists
+    """
+    fee_factor = (FEE_DENOMINATOR - fee) / FEE_DENOMINATOR
+    if np is None:
+        grid = []
+        for path_reserves in paths_reserves:
+            row = []
+            for amount in amounts:
+                value = float(amount)
+                for reserve_in, reserve_out in path_reserves:
+                    value_with_fee = value * fee_factor
+                    value = value_with_fee * reserve_out / (reserve_in + value_with_fee) if reserve_in > 0 else 0.
+                row.append(value)
+            grid.append(row)
+        return grid
+
+    hop_count = max((len(path_reserves) for path_reserves in paths_reserves), default=0)
+    values = np.tile(np.asarray(amounts, dtype=np.float64), (len(paths_reserves), 1))
+    for hop in range(hop_count):
+        has_hop = np.array([hop < len(path_reserves) for path_reserves in paths_reserves])[:, None]
+        reserves = np.array(
+            [path_reserves[hop] if hop < len(path_reserves) else (1, 1) for path_reserves in paths_reserves],
+            dtype=np.float64,
+        )
+        values_with_fee = values * fee_factor
+        reserve_in, reserve_out = reserves[:, 0:1], reserves[:, 1:2]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            hop_values = np.where(reserve_in > 0, values_with_fee * reserve_out / (reserve_in + values_with_fee), 0.)
+        values = np.where(has_hop, hop_values, values)
+    return values
+
+
+def get_best_amounts_out(
+        amounts: Sequence[int],
+        paths_reserves: Sequence[Sequence[Reserves]],
+        fee: int,
+        candidate_count: int = 2,
+        path_costs: Optional[Sequence[float]] = None) -> List[Tuple[int, int]]:
+    """
+    Find the best path for each amount: the paths are ranked on the approximate grid, then the best candidates
+    are verified with exact integer math, so the returned amounts are exactly the ones the router would quote.
+
+    :param amounts: the input amounts
+    :param paths_reserves: the reserves of each hop of each path
+    :param fee: the V2 pool fee, eg 3000 for 0.3%
+    :param candidate_count: number of best approximate paths verified for each amount
+    :param path_costs: cost of each path (eg its gas), in token out, deducted from its output to rank it
+    :return: (path_index, exact_amount_out) for each amount
+    """
+    if not paths_reserves:
+        raise ValueError("At least one path is needed")
+    grid = approximate_amounts_out(amounts, paths_reserves, fee)
+    costs = path_costs or [0.] * len(paths_reserves)
+    path_indexes = range(len(paths_reserves))
+    best_amounts_out = []
+    for amount_index, amount in enumerate(amounts):
+        candidates = sorted(
+            path_indexes,
+            key=lambda i: grid[i][amount_index] - costs[i],
+            reverse=True,
+        )[:candidate_count]
+        exact_amounts_out = [(i, get_amounts_out(amount, paths_reserves[i], fee)) for i in candidates]
+        best_amounts_out.append(max(exact_amounts_out, key=lambda item: item[1] - costs[item[0]]))
+    return best_amounts_out
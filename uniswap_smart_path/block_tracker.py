@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import time
+from typing import (
+    Any,
+    Callable,
+    List,
+    Optional,
+)
+
+from web3 import AsyncWeb3
+from web3.types import BlockNumber
+
+
+logger = logging.getLogger(__name__)
+
+
+class BlockTracker:
+    def __init__(self, w3: AsyncWeb3, max_age: float = 30., reconnect_delay: float = 1.) -> None:
+        """
+        Track the latest block with a newHeads subscription over a persistent provider (WebSocket or IPC), so
+        SmartPath knows the current block without polling eth_blockNumber, and its block-scoped caches, ie the
+        RouteCache, are invalidated as soon as a new block is pushed.
+
+        Once started, the tracker is given to SmartPath with the block_tracker keyword argument. While it has no
+        fresh head, eg before the first one or if the subscription is broken, SmartPath asks eth_blockNumber instead.
+
+        :param w3: an AsyncWeb3 instance with a connected persistent provider, eg WebSocketProvider or AsyncIPCProvider
+        :param max_age: time in seconds after which the last head is considered stale, eg the subscription silently
+        stopped, so the block number is asked to the node again
+        :param reconnect_delay: time in seconds before subscribing again after an error
+        """
+        if not getattr(w3.provider, "has_persistent_connection", False):
+            raise ValueError("BlockTracker needs a persistent provider, eg WebSocketProvider or AsyncIPCProvider")
+        if max_age <= 0:
+            raise ValueError(f"max_age must be greater than 0. Got {max_age}")
+        self.w3 = w3
+        self.max_age = max_age
+        self.reconnect_delay = reconnect_delay
+        self.block_number: Optional[BlockNumber] = None
+        self.received_at = 0.
+        self.head_count = 0
+        self._listeners: List[Callable[[BlockNumber], Any]] = []
+        self._waiters: List["asyncio.Future[BlockNumber]"] = []
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if not self.is_running:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def __aenter__(self) -> "BlockTracker":
+        self.start()
+        return self
+
+    async def __aexit__(self, exception_type: Any, exception_val: Any, exception_traceback: Any) -> None:
+        await self.stop()
+
+    def add_listener(self, listener: Callable[[BlockNumber], Any]) -> None:
+        """
+        :param listener: called with the number of each new block
+        """
+        self._listeners.append(listener)
+
+    def get_block_number(self) -> Optional[BlockNumber]:
+        """
+        :return: the latest block number, or None if no head was received within max_age seconds
+        """
+        if self.block_number is None or time.monotonic() - self.received_at >= self.max_age:
+            return None
+        return self.block_number
+
+    async def wait_for_block(self, timeout: Optional[float] = None) -> Optional[BlockNumber]:
+        """
+        Wait for the next new block.
+
+        :param timeout: maximum waiting time in seconds
+        :return: the new block number, or None after the timeout
+        """
+        waiter: "asyncio.Future[BlockNumber]" = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def on_head(self, block_number: BlockNumber) -> None:
+        """
+        Record a pushed head. Older or repeated numbers, eg after a reconnection, only refresh the head age.
+        """
+        self.received_at = time.monotonic()
+        if self.block_number is not None and block_number <= self.block_number:
+            return
+        self.block_number = block_number
+        self.head_count += 1
+        for listener in self._listeners:
+            listener(block_number)
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(block_number)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._subscribe()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"newHeads subscription failed, subscribing again. Reason: {e!r}")
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _subscribe(self) -> None:
+        # w3.socket with web3 v7, w3.ws with v6
+        socket = getattr(self.w3, "socket", None) or getattr(self.w3, "ws")
+        subscription_id = await self.w3.eth.subscribe("newHeads")
+        logger.debug(f"Subscribed to newHeads: {subscription_id}")
+        try:
+            self.on_head(await self.w3.eth.block_number)  # do not wait for the next block
+            async for message in socket.process_subscriptions():
+                if message.get("subscription") == subscription_id:
+                    number = message["result"]["number"]
+                    self.on_head(BlockNumber(int(number, 16) if isinstance(number, str) else int(number)))
+        finally:
+            try:
+                await self.w3.eth.unsubscribe(subscription_id)
+            except Exception as e:
+                logger.debug(f"Could not unsubscribe from newHeads. Reason: {e!r}")
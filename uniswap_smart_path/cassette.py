@@ -0,0 +1,221 @@
+import asyncio
+from dataclasses import (
+    dataclass,
+    field,
+)
+import gzip
+import json
+import logging
+import random
+import time
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from web3.providers.async_base import AsyncBaseProvider
+from web3.types import (
+    RPCEndpoint,
+    RPCResponse,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+CASSETTE_FORMAT_VERSION = 1
+
+# position of the block parameter for the methods reading the chain state
+_block_parameter_positions = {
+    "eth_call": 1,
+    "eth_getBalance": 1,
+    "eth_getCode": 1,
+    "eth_getStorageAt": 2,
+    "eth_getTransactionCount": 1,
+}
+_unpinned_block_tags = ("latest", "pending", "safe", "finalized")
+
+
+@dataclass
+class Interaction:
+    method: str
+    params: List[Any]
+    response: Dict[str, Any]  # the "result" or "error" member of the JSON-RPC response
+    duration: float  # response time in seconds when it was recorded
+
+
+@dataclass
+class Cassette:
+    """
+    JSON-RPC requests and responses, all at the same block, as well as the path requests (workload) that made them.
+    """
+    block_number: int
+    interactions: Dict[str, Interaction] = field(default_factory=dict)
+    workload: List[Tuple[int, str, str]] = field(default_factory=list)  # (amount, token_in, token_out)
+    metadata: Dict[str, Any] = field(default_factory=dict)  # eg how the SmartPath was created
+
+    @staticmethod
+    def get_key(method: str, params: Any) -> str:
+        return json.dumps([method, params], sort_keys=True, separators=(",", ":"))
+
+    def pin_params(self, method: str, params: Any) -> Any:
+        """
+        :return: the params, with the block parameter set to the cassette block if it was a tag like "latest"
+        """
+        position = _block_parameter_positions.get(method)
+        if position is None:
+            return params
+        params = list(params)
+        if len(params) <= position:
+            params.extend([None] * (position + 1 - len(params)))
+        if params[position] is None or params[position] in _unpinned_block_tags:
+            params[position] = hex(self.block_number)
+        return params
+
+    def add_request(self, amount: int, token_in_address: str, token_out_address: str) -> None:
+        """
+        Add a path request to the workload, to be able to replay it.
+        """
+        self.workload.append((amount, token_in_address, token_out_address))
+
+    def save(self, file_path: str) -> None:
+        """
+        Save the cassette as gzip compressed JSON.
+        """
+        data = {
+            "version": CASSETTE_FORMAT_VERSION,
+            "block_number": self.block_number,
+            "interactions": [
+                [interaction.method, interaction.params, interaction.response, round(interaction.duration, 6)]
+                for interaction in self.interactions.values()
+            ],
+            "workload": [[str(amount), token_in, token_out] for amount, token_in, token_out in self.workload],
+            "metadata": self.metadata,
+        }
+        with gzip.open(file_path, "wt") as f:
+            json.dump(data, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, file_path: str) -> "Cassette":
+        with gzip.open(file_path, "rt") as f:
+            data = json.load(f)
+        if data.get("version") != CASSETTE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported cassette format version: {data.get('version')}")
+        cassette = cls(data["block_number"], metadata=data.get("metadata", {}))
+        for method, params, response, duration in data["interactions"]:
+            cassette.interactions[cls.get_key(method, params)] = Interaction(method, params, response, duration)
+        cassette.workload = [(int(amount), token_in, token_out) for amount, token_in, token_out in data["workload"]]
+        return cassette
+
+
+class RecordingProvider(AsyncBaseProvider):
+    def __init__(self, provider: AsyncBaseProvider, block_number: Optional[int] = None) -> None:
+        """
+        Forward the JSON-RPC requests to the given provider, and record them along with their responses.
+        All the requests are pinned to the same block, so they can be replayed deterministically:
+        "latest" is replaced by the block number, and eth_blockNumber always returns it.
+
+        :param provider: the provider to record, eg: an AsyncHTTPProvider
+        :param block_number: the pinned block. By default, the latest block when the first request is made.
+        """
+        super().__init__()
+        self.provider = provider
+        self.cassette: Optional[Cassette] = Cassette(block_number) if block_number is not None else None
+        self._pinning_lock: Optional[asyncio.Lock] = None
+
+    async def _get_cassette(self) -> Cassette:
+        if self._pinning_lock is None:
+            self._pinning_lock = asyncio.Lock()  # created in the running event loop
+        async with self._pinning_lock:
+            if self.cassette is None:
+                response = await self.provider.make_request(RPCEndpoint("eth_blockNumber"), [])
+                self.cassette = Cassette(int(response["result"], 16))
+                logger.debug(f"Recording pinned to block {self.cassette.block_number}")
+        return self.cassette
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        cassette = self.cassette or await self._get_cassette()
+        if method == "eth_blockNumber":
+            return {"jsonrpc": "2.0", "id": 0, "result": hex(cassette.block_number)}
+
+        params = cassette.pin_params(method, params)
+        start = time.perf_counter()
+        response = await self.provider.make_request(method, params)
+        duration = time.perf_counter() - start
+
+        recorded: Dict[str, Any] = {key: response[key] for key in ("result", "error") if key in response}
+        key = cassette.get_key(method, params)
+        if key not in cassette.interactions:
+            cassette.interactions[key] = Interaction(method, params, recorded, duration)
+        return response
+
+    async def is_connected(self, show_traceback: bool = False) -> bool:
+        return await self.provider.is_connected(show_traceback)
+
+    def save(self, file_path: str) -> None:
+        if self.cassette is None:
+            raise ValueError("Nothing was recorded")
+        self.cassette.save(file_path)
+
+
+class ReplayProvider(AsyncBaseProvider):
+    def __init__(
+            self,
+            cassette: Cassette,
+            latency: float = 0.,
+            recorded_latency_ratio: float = 0.,
+            jitter: float = 0.,
+            seed: int = 0) -> None:
+        """
+        Serve the responses of a cassette, without any network access.
+        The requests missing from the cassette get a JSON-RPC error and are listed in the misses attribute.
+
+        :param cassette: the recorded requests and responses
+        :param latency: simulated response time in seconds
+        :param recorded_latency_ratio: ratio of the recorded response time added to the simulated response time,
+                                       eg 1 to replay the recorded timings
+        :param jitter: mean of an exponentially distributed extra response time in seconds
+        :param seed: seed of the jitter
+        """
+        super().__init__()
+        self.cassette = cassette
+        self.latency = latency
+        self.recorded_latency_ratio = recorded_latency_ratio
+        self.jitter = jitter
+        self.counts: Dict[str, int] = {}
+        self.misses: List[Tuple[str, Any]] = []
+        self._rng = random.Random(seed)
+        self._request_ids = 0
+
+    @property
+    def request_count(self) -> int:
+        return sum(self.counts.values())
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        self._request_ids += 1
+        self.counts[method] = self.counts.get(method, 0) + 1
+        response: Dict[str, Any] = {"jsonrpc": "2.0", "id": self._request_ids}
+        if method == "eth_blockNumber":
+            response["result"] = hex(self.cassette.block_number)
+            return response  # type: ignore
+
+        params = self.cassette.pin_params(method, params)
+        interaction = self.cassette.interactions.get(self.cassette.get_key(method, params))
+        if interaction is None:
+            self.misses.append((method, params))
+            response["error"] = {"code": -32000, "message": f"{method} request not found in the cassette"}
+            return response  # type: ignore
+
+        delay = self.latency + interaction.duration * self.recorded_latency_ratio
+        if self.jitter > 0:
+            delay += self._rng.expovariate(1 / self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        response.update(interaction.response)
+        return response  # type: ignore
+
+    async def is_connected(self, show_traceback: bool = False) -> bool:
+        return True
@@ -0,0 +1,161 @@
+import asyncio
+from collections import (
+    deque,
+    OrderedDict,
+)
+from dataclasses import dataclass
+import logging
+import time
+from typing import (
+    Any,
+    Deque,
+    Optional,
+)
+from uuid import uuid4
+
+from ._context import (
+    current_low_priority,
+    current_request_id,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ConcurrencyStats:
+    in_flight: int
+    queue_depth: int
+    max_queue_depth: int
+    acquired_count: int
+    waited_count: int
+    total_wait_time: float
+    max_wait_time: float
+
+    @property
+    def mean_wait_time(self) -> float:
+        return self.total_wait_time / self.acquired_count if self.acquired_count else 0.
+
+
+class ConcurrencyLimiter:
+    def __init__(self, max_in_flight: int, name: Optional[str] = None) -> None:
+        """
+        Cap the number of RPC requests in flight at the same time. Queued requests are served in a round-robin way
+        between get_swap_in_path() calls, so a call needing a lot of RPCs does not starve the other ones. The low
+        priority requests, eg of the RouteWarmer, are served only when no other request is queued.
+        This is independent of, and complementary to, the SmartRateLimiter which limits requests per time unit.
+
+        Use one instance per SmartPath to cap each of them, or share the same instance between all SmartPath using
+        the same rpc endpoint to cap the endpoint.
+
+        :param max_in_flight: maximum number of concurrent RPC requests
+        :param name: an optional name to easily identify the instance
+        """
+        if max_in_flight < 1:
+            raise ValueError(f"max_in_flight must be greater than 0. Got {max_in_flight}")
+        self.max_in_flight = max_in_flight
+        self.name = str(uuid4()) if name is None else name
+        self._in_flight = 0
+        self._queues: "OrderedDict[int, Deque[asyncio.Future[None]]]" = OrderedDict()
+        self._low_priority_queue: "Deque[asyncio.Future[None]]" = deque()
+        self._queue_depth = 0
+        self._max_queue_depth = 0
+        self._acquired_count = 0
+        self._waited_count = 0
+        self._total_wait_time = 0.
+        self._max_wait_time = 0.
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue_depth
+
+    def get_stats(self) -> ConcurrencyStats:
+        return ConcurrencyStats(
+            in_flight=self._in_flight,
+            queue_depth=self._queue_depth,
+            max_queue_depth=self._max_queue_depth,
+            acquired_count=self._acquired_count,
+            waited_count=self._waited_count,
+            total_wait_time=self._total_wait_time,
+            max_wait_time=self._max_wait_time,
+        )
+
+    async def acquire(self) -> float:
+        """
+        Wait for an RPC slot.
+
+        :return: the waiting time in seconds
+        """
+        self._acquired_count += 1
+        if self._in_flight < self.max_in_flight and self._queue_depth == 0:
+            self._in_flight += 1
+            return 0.
+
+        start = time.perf_counter()
+        request_id = current_request_id.get()
+        future: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        if current_low_priority.get():
+            self._low_priority_queue.append(future)
+        else:
+            self._queues.setdefault(request_id, deque()).append(future)
+        self._queue_depth += 1
+        self._max_queue_depth = max(self._max_queue_depth, self._queue_depth)
+        if self._queue_depth == 1:
+            logger.debug(f"Concurrency Limiter {self.name} has reached its limit of {self.max_in_flight} requests")
+        try:
+            await future  # the slot is handed over by release()
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # the slot was handed over just before the cancellation
+            else:
+                self._remove(request_id, future)
+            raise
+
+        wait_time = time.perf_counter() - start
+        self._waited_count += 1
+        self._total_wait_time += wait_time
+        self._max_wait_time = max(self._max_wait_time, wait_time)
+        return wait_time
+
+    def release(self) -> None:
+        while self._queues:
+            request_id, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            self._queue_depth -= 1
+            if queue:
+                self._queues.move_to_end(request_id)  # round-robin between requests
+            else:
+                del self._queues[request_id]
+            if not future.done():
+                future.set_result(None)
+                return
+        while self._low_priority_queue:
+            future = self._low_priority_queue.popleft()
+            self._queue_depth -= 1
+            if not future.done():
+                future.set_result(None)
+                return
+        self._in_flight -= 1
+
+    def _remove(self, request_id: int, future: "asyncio.Future[None]") -> None:
+        if future in self._low_priority_queue:
+            self._low_priority_queue.remove(future)
+            self._queue_depth -= 1
+            return
+        queue = self._queues.get(request_id)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            self._queue_depth -= 1
+            if not queue:
+                del self._queues[request_id]
+
+    async def __aenter__(self) -> "ConcurrencyLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exception_type: Any, exception_val: Any, exception_traceback: Any) -> None:
+        self.release()
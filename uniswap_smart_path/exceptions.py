@@ -1,4 +1,14 @@
+import asyncio
+
+
 class SmartPathException(Exception):
     """
     SmartPath root exception
     """
+
+
+class CircuitOpenError(SmartPathException, asyncio.exceptions.TimeoutError):
+    """
+    Raised without sending the request when the circuit breaker of the RPC endpoint is open.
+    Being a timeout, it is handled as an endpoint that did not answer in time.
+    """
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import logging
+import time
+from typing import (
+    Any,
+    List,
+    Sequence,
+    Tuple,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+PathKey = Tuple[Any, ...]  # the pool path: token addresses, with the pool fees for V3
+
+
+@dataclass(frozen=True)
+class PathFailure:
+    path: PathKey
+    reason: str
+    count: int  # consecutive failures
+    retry_in: float  # time in seconds before the path is quoted again, 0 if it can be
+
+
+class FailureCache:
+    def __init__(self, base_ttl: float = 60., max_ttl: float = 3600., max_size: int = 4096) -> None:
+        """
+        Remember the pool paths whose quote failed, eg reverted because of a fee-on-transfer token or a dust pool,
+        so the next requests do not pay to quote them again. A failing path is skipped for base_ttl seconds, and this
+        time doubles with each consecutive failure, up to max_ttl. A successful quote clears the path.
+
+        :param base_ttl: time in seconds a path is skipped after its first failure
+        :param max_ttl: maximum time in seconds a path is skipped
+        :param max_size: maximum number of failing paths kept, the least recently failed ones are forgotten
+        """
+        if base_ttl <= 0 or max_ttl < base_ttl:
+            raise ValueError(f"Invalid TTLs: 0 < base_ttl <= max_ttl is expected. Got {base_ttl} and {max_ttl}")
+        if max_size < 1:
+            raise ValueError(f"max_size must be greater than 0. Got {max_size}")
+        self.base_ttl = base_ttl
+        self.max_ttl = max_ttl
+        self.max_size = max_size
+        self._failures: "OrderedDict[PathKey, Tuple[str, int, float]]" = OrderedDict()  # reason, count, retry at
+        self.skipped = 0
+
+    def __len__(self) -> int:
+        return len(self._failures)
+
+    def is_failing(self, path: Sequence[Any]) -> bool:
+        """
+        :return: True if the path failed and must not be quoted again yet
+        """
+        failure = self._failures.get(tuple(path))
+        if failure is None or time.monotonic() >= failure[2]:
+            return False
+        self.skipped += 1
+        return True
+
+    def add_failure(self, path: Sequence[Any], reason: str) -> None:
+        key = tuple(path)
+        previous_failure = self._failures.pop(key, None)
+        count = previous_failure[1] + 1 if previous_failure else 1
+        ttl = min(self.base_ttl * 2 ** (count - 1), self.max_ttl)
+        self._failures[key] = (reason, count, time.monotonic() + ttl)
+        if len(self._failures) > self.max_size:
+            self._failures.popitem(last=False)
+        logger.debug(f"Path {key} failed {count} time(s), skipped for {ttl}s. Reason: {reason}")
+
+    def add_success(self, path: Sequence[Any]) -> None:
+        self._failures.pop(tuple(path), None)
+
+    def get_failures(self) -> List[PathFailure]:
+        """
+        :return: the failing paths, with the reason of their last failure, for diagnostics
+        """
+        now = time.monotonic()
+        return [
+            PathFailure(path, reason, count, max(0., retry_at - now))
+            for path, (reason, count, retry_at) in self._failures.items()
+        ]
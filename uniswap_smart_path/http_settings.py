@@ -0,0 +1,49 @@
+from dataclasses import dataclass
+import logging
+from typing import (
+    Any,
+    Dict,
+)
+
+from aiohttp import (
+    ClientSession,
+    ClientTimeout,
+    TCPConnector,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class HttpSettings:
+    """
+    Connection pool of the HTTP provider created by SmartPath.create*() from an rpc_endpoint.
+    The connections are kept alive and reused between the requests, instead of paying a TCP (and TLS) handshake for
+    each of them when a burst of requests exceeds the default pool.
+    """
+    pool_size: int = 100  # maximum number of simultaneous connections, 0 for no limit
+    pool_size_per_host: int = 0  # maximum number of simultaneous connections to the same endpoint, 0 for no limit
+    keepalive_timeout: float = 15.  # time in seconds an idle connection is kept open to be reused
+    timeout: float = 5.  # total timeout in seconds of a request
+
+    def __post_init__(self) -> None:
+        if self.pool_size < 0 or self.pool_size_per_host < 0:
+            raise ValueError(f"Pool sizes must be positive or 0. Got {self.pool_size} and {self.pool_size_per_host}")
+        if self.timeout <= 0:
+            raise ValueError(f"timeout must be greater than 0. Got {self.timeout}")
+
+    def get_request_kwargs(self) -> Dict[str, Any]:
+        return {"timeout": ClientTimeout(total=self.timeout)}
+
+    def create_session(self) -> ClientSession:
+        """
+        :return: a new session with this connection pool. Must be created, and closed, in a running event loop.
+        """
+        connector = TCPConnector(
+            limit=self.pool_size,
+            limit_per_host=self.pool_size_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        logger.debug(f"Creating an HTTP session with {self}")
+        return ClientSession(connector=connector, timeout=ClientTimeout(total=self.timeout))
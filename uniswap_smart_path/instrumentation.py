@@ -0,0 +1,307 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import (
+    dataclass,
+    field,
+)
+import logging
+import time
+from typing import (
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+)
+
+from ._context import current_metrics
+from .tracing import span
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10.)
+
+
+@dataclass
+class RequestMetrics:
+    """
+    Metrics of one get_swap_in_path() call (or iter_swap_in_path(), get_swap_in_path_with_block(), ...).
+    Stage names are: tokens, discovery, quotes and split, or tokens, direct, pivot and split when streaming.
+    RPC are counted per method, eg: eth_call.getPair, eth_call.quoteExactInput or eth_blockNumber.
+    """
+    request_id: int
+    amount: int
+    token_in: str
+    token_out: str
+    block_number: Optional[int] = None
+    total_time: float = 0.
+    stage_times: Dict[str, float] = field(default_factory=dict)
+    rpc_counts: Dict[str, int] = field(default_factory=dict)
+    coalesced_rpc_count: int = 0
+    retried_rpc_count: int = 0
+    rate_limiter_wait_time: float = 0.
+    concurrency_wait_time: float = 0.
+    candidate_count: int = 0
+    cache_hits: Dict[str, int] = field(default_factory=dict)
+    cache_misses: Dict[str, int] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def rpc_count(self) -> int:
+        return sum(self.rpc_counts.values())
+
+    def cache_hit_ratio(self, cache_name: str) -> float:
+        hits = self.cache_hits.get(cache_name, 0)
+        total = hits + self.cache_misses.get(cache_name, 0)
+        return hits / total if total else 0.
+
+    def add_stage_time(self, stage_name: str, duration: float) -> None:
+        self.stage_times[stage_name] = self.stage_times.get(stage_name, 0.) + duration
+
+    def add_rpc(self, method: str) -> None:
+        self.rpc_counts[method] = self.rpc_counts.get(method, 0) + 1
+
+    def add_cache_lookup(self, cache_name: str, hit: bool) -> None:
+        counts = self.cache_hits if hit else self.cache_misses
+        counts[cache_name] = counts.get(cache_name, 0) + 1
+
+
+class MetricsSink(Protocol):
+    def record(self, metrics: RequestMetrics) -> None: ...
+
+
+class CallbackSink:
+    def __init__(self, callback: Callable[[RequestMetrics], None]) -> None:
+        """
+        Call the given function with the metrics of each request.
+        """
+        self.callback = callback
+
+    def record(self, metrics: RequestMetrics) -> None:
+        self.callback(metrics)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_TIME_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def get_quantile(self, quantile: float) -> float:
+        """
+        :return: the upper bound of the bucket containing the quantile (+Inf for the last bucket)
+        """
+        rank = quantile * self.count
+        cumulative_count = 0
+        for i, bucket_count in enumerate(self.bucket_counts):
+            cumulative_count += bucket_count
+            if cumulative_count >= rank and cumulative_count > 0:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return 0.
+
+    def get_cumulative_counts(self) -> List[Tuple[float, int]]:
+        cumulative_counts = []
+        cumulative_count = 0
+        for upper_bound, bucket_count in zip(self.buckets + (float("inf"), ), self.bucket_counts):
+            cumulative_count += bucket_count
+            cumulative_counts.append((upper_bound, cumulative_count))
+        return cumulative_counts
+
+
+class HistogramSink:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_TIME_BUCKETS) -> None:
+        """
+        Aggregate the metrics of all requests in memory: time histograms (total and per stage) and counters.
+        """
+        self.buckets = tuple(buckets)
+        self.request_count = 0
+        self.error_count = 0
+        self.total_time = Histogram(self.buckets)
+        self.stage_times: Dict[str, Histogram] = {}
+        self.rate_limiter_wait_time = Histogram(self.buckets)
+        self.concurrency_wait_time = Histogram(self.buckets)
+        self.rpc_counts: Dict[str, int] = {}
+        self.coalesced_rpc_count = 0
+        self.retried_rpc_count = 0
+        self.candidate_count = 0
+        self.cache_hits: Dict[str, int] = {}
+        self.cache_misses: Dict[str, int] = {}
+
+    def record(self, metrics: RequestMetrics) -> None:
+        self.request_count += 1
+        if metrics.error is not None:
+            self.error_count += 1
+        self.total_time.observe(metrics.total_time)
+        for stage_name, duration in metrics.stage_times.items():
+            self.stage_times.setdefault(stage_name, Histogram(self.buckets)).observe(duration)
+        self.rate_limiter_wait_time.observe(metrics.rate_limiter_wait_time)
+        self.concurrency_wait_time.observe(metrics.concurrency_wait_time)
+        for method, count in metrics.rpc_counts.items():
+            self.rpc_counts[method] = self.rpc_counts.get(method, 0) + count
+        self.coalesced_rpc_count += metrics.coalesced_rpc_count
+        self.retried_rpc_count += metrics.retried_rpc_count
+        self.candidate_count += metrics.candidate_count
+        for cache_name, count in metrics.cache_hits.items():
+            self.cache_hits[cache_name] = self.cache_hits.get(cache_name, 0) + count
+        for cache_name, count in metrics.cache_misses.items():
+            self.cache_misses[cache_name] = self.cache_misses.get(cache_name, 0) + count
+
+    def cache_hit_ratio(self, cache_name: str) -> float:
+        hits = self.cache_hits.get(cache_name, 0)
+        total = hits + self.cache_misses.get(cache_name, 0)
+        return hits / total if total else 0.
+
+
+class PrometheusSink(HistogramSink):
+    """
+    HistogramSink that can render its metrics in the Prometheus text exposition format, eg to be served on /metrics
+    """
+    def __init__(self, buckets: Sequence[float] = DEFAULT_TIME_BUCKETS, prefix: str = "uniswap_smart_path") -> None:
+        super().__init__(buckets)
+        self.prefix = prefix
+
+    def exposition(self) -> str:
+        lines: List[str] = []
+        self._add_counter(lines, "requests_total", "Number of path requests", {(): self.request_count})
+        self._add_counter(lines, "request_errors_total", "Number of failed path requests", {(): self.error_count})
+        self._add_histogram(lines, "request_duration_seconds", "Path request duration", {(): self.total_time})
+        self._add_histogram(
+            lines,
+            "stage_duration_seconds",
+            "Path request duration per stage",
+            {(("stage", name), ): histogram for name, histogram in sorted(self.stage_times.items())},
+        )
+        self._add_histogram(
+            lines,
+            "rate_limiter_wait_seconds",
+            "Time waited for the rate limiter per request",
+            {(): self.rate_limiter_wait_time},
+        )
+        self._add_histogram(
+            lines,
+            "concurrency_wait_seconds",
+            "Time waited for the concurrency limiter per request",
+            {(): self.concurrency_wait_time},
+        )
+        self._add_counter(
+            lines,
+            "rpc_requests_total",
+            "Number of RPC requests per method",
+            {(("method", method), ): count for method, count in sorted(self.rpc_counts.items())},
+        )
+        self._add_counter(
+            lines,
+            "rpc_coalesced_total",
+            "Number of RPC requests saved by coalescing identical in-flight requests",
+            {(): self.coalesced_rpc_count},
+        )
+        self._add_counter(
+            lines,
+            "rpc_retries_total",
+            "Number of RPC requests retried after a transient error",
+            {(): self.retried_rpc_count},
+        )
+        self._add_counter(lines, "candidates_total", "Number of quoted candidate paths", {(): self.candidate_count})
+        self._add_counter(
+            lines,
+            "cache_hits_total",
+            "Number of cache hits per cache",
+            {(("cache", name), ): count for name, count in sorted(self.cache_hits.items())},
+        )
+        self._add_counter(
+            lines,
+            "cache_misses_total",
+            "Number of cache misses per cache",
+            {(("cache", name), ): count for name, count in sorted(self.cache_misses.items())},
+        )
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+    def _add_counter(
+            self,
+            lines: List[str],
+            name: str,
+            description: str,
+            values: Dict[Tuple[Tuple[str, str], ...], int]) -> None:
+        full_name = f"{self.prefix}_{name}"
+        lines.append(f"# HELP {full_name} {description}")
+        lines.append(f"# TYPE {full_name} counter")
+        for labels, value in values.items():
+            lines.append(f"{full_name}{self._format_labels(labels)} {value}")
+
+    def _add_histogram(
+            self,
+            lines: List[str],
+            name: str,
+            description: str,
+            histograms: Dict[Tuple[Tuple[str, str], ...], Histogram]) -> None:
+        full_name = f"{self.prefix}_{name}"
+        lines.append(f"# HELP {full_name} {description}")
+        lines.append(f"# TYPE {full_name} histogram")
+        for labels, histogram in histograms.items():
+            for upper_bound, cumulative_count in histogram.get_cumulative_counts():
+                le = "+Inf" if upper_bound == float("inf") else repr(upper_bound)
+                lines.append(f"{full_name}_bucket{self._format_labels(labels + (('le', le), ))} {cumulative_count}")
+            lines.append(f"{full_name}_sum{self._format_labels(labels)} {histogram.sum}")
+            lines.append(f"{full_name}_count{self._format_labels(labels)} {histogram.count}")
+
+
+class Instrumentation:
+    def __init__(self, sinks: Sequence[MetricsSink]) -> None:
+        """
+        Collect the metrics of each path request, and send them to the given sinks once the request is done.
+        When a SmartPath has no instrumentation, the hooks only cost a context variable lookup.
+
+        :param sinks: where to send the metrics, eg: CallbackSink, HistogramSink or PrometheusSink
+        """
+        self.sinks = tuple(sinks)
+
+    def record(self, metrics: RequestMetrics) -> None:
+        for sink in self.sinks:
+            try:
+                sink.record(metrics)
+            except Exception as e:
+                logger.warning(f"Metrics sink {sink} failed. Reason: {e!r}")
+
+
+@contextmanager
+def stage(stage_name: str) -> Iterator[None]:
+    """
+    Measure the duration of a stage of the current request, if it is instrumented, and record it as a span if the
+    request is traced.
+    """
+    with span(stage_name):
+        metrics = current_metrics.get()
+        if metrics is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            metrics.add_stage_time(stage_name, time.perf_counter() - start)
+
+
+def add_candidates(count: int) -> None:
+    """
+    Count quoted candidate paths for the current request, if it is instrumented.
+    """
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.candidate_count += count
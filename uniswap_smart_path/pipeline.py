@@ -0,0 +1,238 @@
+import asyncio
+from contextlib import nullcontext
+from dataclasses import dataclass
+import json
+import logging
+import os
+import sys
+import time
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    ContextManager,
+    Dict,
+    Iterable,
+    Optional,
+    TextIO,
+    Union,
+)
+
+from web3.types import BlockNumber
+
+from ._quotes import (
+    format_quote,
+    parse_quote_request,
+)
+from .smart_path import SmartPath
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PipelineStats:
+    rows: int = 0  # rows written during this run
+    errors: int = 0  # rows written with an error
+    skipped: int = 0  # rows already in the output of a previous run
+    duration: float = 0.
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.duration if self.duration else 0.
+
+
+def get_resume_row(output_path: str) -> int:
+    """
+    Find where an interrupted run stopped. The rows are written in the input order, so the run resumes just after the
+    last complete one. A partially written last line is truncated.
+
+    :param output_path: the JSONL output of the interrupted run
+    :return: the index of the first input row missing from the output, 0 if there is no output yet
+    """
+    if not os.path.exists(output_path):
+        return 0
+    next_row = 0
+    valid_size = 0
+    with open(output_path, "rb") as f:
+        for line in f:
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("Incomplete line")
+                next_row = int(json.loads(line)["row"]) + 1
+            except (ValueError, KeyError, TypeError):
+                break
+            valid_size += len(line)
+    if valid_size < os.path.getsize(output_path):
+        logger.warning(f"Truncating the incomplete last row of {output_path}")
+        os.truncate(output_path, valid_size)
+    return next_row
+
+
+async def read_lines(file: TextIO, size_hint: int = 2 ** 16) -> AsyncIterator[str]:
+    """
+    Read the lines of a file in a thread, so the rows already read keep being quoted while the next ones are read.
+
+    :param file: the open input file
+    :param size_hint: approximate number of characters read at a time. 1 to read the lines one by one, eg from a
+                      pipe, so each row is quoted as soon as it arrives.
+    :return: an async iterator of lines
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        lines = await loop.run_in_executor(None, file.readlines, size_hint)
+        if not lines:
+            return
+        for line in lines:
+            yield line
+
+
+def _write_line(output: TextIO, line: str) -> None:
+    output.write(line)
+    output.flush()
+
+
+async def _iterate(lines: Iterable[str]) -> AsyncIterator[str]:
+    for line in lines:
+        yield line
+
+
+class QuotePipeline:
+    def __init__(
+            self,
+            smart_path: SmartPath,
+            max_in_flight: int = 32,
+            block_number: Optional[BlockNumber] = None,
+            progress_interval: int = 1000) -> None:
+        """
+        Quote a stream of JSONL rows, eg a nightly valuation job, with one SmartPath and so with its caches shared
+        between all the rows.
+
+        Each input row is a quote request: {"amount": "1000000000000000000", "token_in": "0x...", "token_out": "0x..."}
+        and gives one output row: {"row": 0, "request": {...}, "block_number": 20000000, "paths": [...]}, or
+        {"row": 0, "request": {...}, "error": "..."}. Blank input lines are ignored, but still counted in the row index.
+
+        The output rows are written as soon as possible, in the input order. At most max_in_flight rows are quoted,
+        or waiting to be written, at the same time: the memory stays constant whatever the input size.
+
+        :param smart_path: the SmartPath computing the paths
+        :param max_in_flight: maximum number of rows quoted at the same time
+        :param block_number: compute all the paths at this block, eg for a consistent valuation, instead of the latest
+                             one. The node must still have its state, ie be an archive node for an old block.
+        :param progress_interval: log the progress every progress_interval rows, 0 to disable it
+        """
+        if max_in_flight < 1:
+            raise ValueError(f"max_in_flight must be greater than 0. Got {max_in_flight}")
+        self.smart_path = smart_path
+        self.max_in_flight = max_in_flight
+        self.block_number = block_number
+        self.progress_interval = progress_interval
+
+    async def run(
+            self,
+            lines: Union[Iterable[str], AsyncIterable[str]],
+            output: TextIO,
+            start_row: int = 0) -> PipelineStats:
+        """
+        :param lines: the input JSONL lines, eg read_lines() of an open file. A plain iterable is read on the event
+                      loop, so it must not block, eg a list.
+        :param output: where the output JSONL rows are written, and flushed, one by one in a thread
+        :param start_row: index of the first row to quote, the previous ones are skipped (see get_resume_row())
+        :return: the stats of the run
+        """
+        stats = PipelineStats()
+        started_at = time.monotonic()
+        slots = asyncio.Semaphore(self.max_in_flight)
+        pending: "asyncio.Queue[Optional[asyncio.Task[Dict[str, Any]]]]" = asyncio.Queue()
+        # the rows are read and quoted in the background, so the output is written while the next rows are awaited
+        reader = asyncio.ensure_future(self._read_rows(lines, start_row, slots, pending, stats))
+        try:
+            while True:
+                task = await pending.get()
+                if task is None:
+                    break
+                await self._write(await task, output, stats, started_at)
+                slots.release()
+            await reader  # raise the input error, if any
+        finally:
+            reader.cancel()
+            while not pending.empty():  # interrupted: the rows not written yet are quoted again on resume
+                task = pending.get_nowait()
+                if task is not None:
+                    task.cancel()
+            stats.duration = time.monotonic() - started_at
+        return stats
+
+    async def _read_rows(
+            self,
+            lines: Union[Iterable[str], AsyncIterable[str]],
+            start_row: int,
+            slots: asyncio.Semaphore,
+            pending: "asyncio.Queue[Optional[asyncio.Task[Dict[str, Any]]]]",
+            stats: PipelineStats) -> None:
+        """
+        Start quoting each row as soon as it is read, once there is a free slot, and queue it to be written.
+        The end of the input, or an input error, is queued as None.
+        """
+        row = -1
+        try:
+            async for line in lines if isinstance(lines, AsyncIterable) else _iterate(lines):
+                row += 1
+                if row < start_row:
+                    stats.skipped += 1
+                    continue
+                if not line.strip():
+                    continue
+                await slots.acquire()
+                pending.put_nowait(asyncio.ensure_future(self._quote_row(row, line)))
+        finally:
+            pending.put_nowait(None)
+
+    async def run_file(self, input_path: str, output_path: str, resume: bool = True) -> PipelineStats:
+        """
+        :param input_path: the input JSONL file, "-" for stdin
+        :param output_path: the output JSONL file, "-" for stdout
+        :param resume: continue after the last row of an existing output file, else overwrite it
+        :return: the stats of the run
+        """
+        start_row = 0
+        if resume and output_path != "-":
+            start_row = await asyncio.get_running_loop().run_in_executor(None, get_resume_row, output_path)
+        if start_row:
+            logger.info(f"Resuming {output_path} from row {start_row}")
+        input_file: ContextManager[TextIO] = nullcontext(sys.stdin) if input_path == "-" else open(input_path)
+        output_file: ContextManager[TextIO] = (
+            nullcontext(sys.stdout) if output_path == "-" else open(output_path, "a" if resume else "w")
+        )
+        with input_file as lines, output_file as output:
+            stats = await self.run(read_lines(lines, 1 if input_path == "-" else 2 ** 16), output, start_row)
+        logger.info(
+            f"Quoted {stats.rows} rows ({stats.errors} errors, {stats.skipped} skipped) in {stats.duration:.1f} s"
+        )
+        return stats
+
+    async def _quote_row(self, row: int, line: str) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"row": row, "request": line.rstrip("\n")}
+        try:
+            result["request"] = json.loads(line)
+            key = parse_quote_request(result["request"])
+        except ValueError as e:
+            result["error"] = str(e)
+            return result
+        try:
+            quote = await self.smart_path.get_swap_in_path_with_block(*key, block_number=self.block_number)
+            result.update(format_quote(quote))
+        except Exception as e:
+            logger.warning(f"Could not quote row {row}. Reason: {e!r}")
+            result["error"] = repr(e)
+        return result
+
+    async def _write(self, result: Dict[str, Any], output: TextIO, stats: PipelineStats, started_at: float) -> None:
+        # written in a thread, like the input is read, so the rows in flight keep being quoted meanwhile
+        await asyncio.get_running_loop().run_in_executor(None, _write_line, output, json.dumps(result) + "\n")
+        stats.rows += 1
+        if "error" in result:
+            stats.errors += 1
+        if self.progress_interval and stats.rows % self.progress_interval == 0:
+            rate = stats.rows / (time.monotonic() - started_at)
+            logger.info(f"{stats.rows} rows quoted ({stats.errors} errors), {rate:.1f} rows/s")
@@ -0,0 +1,147 @@
+from collections import OrderedDict
+import logging
+import time
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from web3.types import ChecksumAddress
+
+
+logger = logging.getLogger(__name__)
+
+
+Link = Tuple[ChecksumAddress, int]  # pivot address, pool fee (0 for the V2 pairs)
+_Key = Tuple[ChecksumAddress, bool]  # token address, is V2
+
+
+class _LearnedLinks:
+    __slots__ = ("pools", "quoted", "competitive", "probed_at")
+
+    def __init__(self) -> None:
+        self.pools: Set[Link] = set()  # the links with a pool
+        self.quoted: Set[Link] = set()  # the links quoted since the last probe ...
+        self.competitive: Set[Link] = set()  # ... and the ones among them that have produced a competitive quote
+        self.probed_at = time.monotonic()
+
+    def is_selected(self, link: Link) -> bool:
+        return link in self.pools and (link in self.competitive or link not in self.quoted)
+
+
+class PivotLearner:
+    def __init__(self, probe_interval: float = 3600., max_tokens: int = 4096) -> None:
+        """
+        Learn, for each token, the pivots and fee tiers (the links) through which it has a pool, and among them the
+        ones that have produced a competitive quote, so the discovery and the quotes of the next requests are
+        restricted to them, instead of all the pivot x fee tier combinations.
+
+        A token is probed with all the combinations the first time it is seen, then again every probe_interval
+        seconds, or when no path is found with the learned links. A link that has a pool is dropped only once it has
+        been quoted and outperformed by another fee tier to the same pivot, and the V2 and V3 links are learned
+        separately, as the best V2 and V3 paths are split between them.
+
+        :param probe_interval: time in seconds after which all the combinations are probed again for a token
+        :param max_tokens: maximum number of learned tokens, the least recently used ones are forgotten
+        """
+        if probe_interval <= 0:
+            raise ValueError(f"probe_interval must be greater than 0. Got {probe_interval}")
+        if max_tokens < 1:
+            raise ValueError(f"max_tokens must be greater than 0. Got {max_tokens}")
+        self.probe_interval = probe_interval
+        self.max_tokens = max_tokens
+        self._entries: "OrderedDict[_Key, _LearnedLinks]" = OrderedDict()
+        self.probes = 0
+        self.pruned = 0
+
+    def __len__(self) -> int:
+        return len({token for token, _ in self._entries})
+
+    @staticmethod
+    def _group(token: ChecksumAddress, links: Iterable[Link]) -> Dict[_Key, List[Link]]:
+        groups: Dict[_Key, List[Link]] = {}
+        for link in links:
+            groups.setdefault((token, link[1] == 0), []).append(link)
+        return groups
+
+    def _get_entry(self, key: _Key) -> Optional[_LearnedLinks]:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry.probed_at >= self.probe_interval:
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def select(self, token: ChecksumAddress, links: Sequence[Link]) -> List[Link]:
+        """
+        :return: the links to look up for the token: the learned ones, or all of them if the token must be probed
+        """
+        selected_links = []
+        for key, group in self._group(token, links).items():
+            entry = self._get_entry(key)
+            if entry is None:
+                self.probes += 1
+                selected_links.extend(group)
+            else:
+                selected_links.extend(link for link in group if entry.is_selected(link))
+        self.pruned += len(links) - len(selected_links)
+        return selected_links
+
+    def learn_pools(self, token: ChecksumAddress, links: Sequence[Link], pool_links: Iterable[Link]) -> None:
+        """
+        Record the result of a discovery: the links that were looked up for the token, and the ones with a pool.
+        """
+        pool_link_set = set(pool_links)
+        for key, group in self._group(token, links).items():
+            entry = self._get_entry(key)
+            if entry is None:  # probed: the discovery covered all the links
+                entry = self._entries[key] = _LearnedLinks()
+                if len(self._entries) > 2 * self.max_tokens:
+                    self._entries.popitem(last=False)
+            entry.pools.update(link for link in group if link in pool_link_set)
+
+    def learn_quotes(
+            self,
+            token: ChecksumAddress,
+            quoted_links: Iterable[Link],
+            competitive_links: Iterable[Link]) -> None:
+        """
+        Record the links of the token that were quoted, and the ones among them that produced a competitive quote.
+        """
+        for key, group in self._group(token, quoted_links).items():
+            entry = self._get_entry(key)
+            if entry is not None:
+                entry.quoted.update(group)
+        for key, group in self._group(token, competitive_links).items():
+            entry = self._get_entry(key)
+            if entry is not None:
+                entry.competitive.update(group)
+
+    def forget(self, *tokens: ChecksumAddress) -> bool:
+        """
+        Forget the tokens, so they are probed at their next request, eg when no path was found with their learned
+        links.
+
+        :return: True if one of them was learned, ie its links may have been pruned
+        """
+        was_learned = False
+        for token in tokens:
+            for key in ((token, True), (token, False)):
+                was_learned |= self._get_entry(key) is not None
+                self._entries.pop(key, None)
+        return was_learned
+
+    def get_links(self, token: ChecksumAddress) -> Set[Link]:
+        """
+        :return: the learned links of the token, that are selected for its next requests
+        """
+        links: Set[Link] = set()
+        for key in ((token, True), (token, False)):
+            entry = self._entries.get(key)
+            if entry is not None:
+                links.update(link for link in entry.pools if entry.is_selected(link))
+        return links
@@ -0,0 +1,229 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import sqlite3
+import time
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+PoolKey = Tuple[int, str, str, str, int]  # chain id, factory, token0, token1, fee (0 for V2 pairs)
+PoolEntry = Tuple[str, float]  # pool address or null address, time at which it was checked
+PoolRow = Tuple[int, str, str, str, int, str, float]  # PoolKey + PoolEntry
+
+_schema = """
+CREATE TABLE IF NOT EXISTS pools (
+    chain_id INTEGER NOT NULL,
+    factory TEXT NOT NULL,
+    token0 TEXT NOT NULL,
+    token1 TEXT NOT NULL,
+    fee INTEGER NOT NULL,
+    address TEXT NOT NULL,
+    checked_at REAL NOT NULL,
+    PRIMARY KEY (chain_id, factory, token0, token1, fee)
+)
+"""
+
+
+class PoolIndex:
+    def __init__(
+            self,
+            file_path: str,
+            read_only: bool = False,
+            negative_ttl: Optional[float] = 3600.,
+            flush_size: int = 64,
+            flush_interval: float = 1.) -> None:
+        """
+        Persistent index of the pools found by the discovery (the results of the factories getPair() and getPool()),
+        in an SQLite file, so they survive restarts and are shared by all the worker processes.
+        The whole index is loaded in memory when opened, and the pools are only looked up in memory.
+
+        The file is never accessed from the event loop, where a busy file could freeze all the in-flight requests:
+        the new entries are written by batches, and the entries added by the other workers are read, by sync(), in
+        a dedicated thread. A sync is started in the background on a miss or an addition, at most every
+        flush_interval seconds. Without a running event loop, eg in a script, the sync is performed inline.
+
+        The file is in WAL mode: any number of processes can read it while one of them writes. Workers can open it
+        read only, and leave the writes to a single process.
+
+        A pool never disappears, but it can be created: the absence of a pool is kept only negative_ttl seconds.
+
+        :param file_path: the SQLite file, created if needed (unless read only), or ":memory:" for a private index
+        :param read_only: True to never write to the file
+        :param negative_ttl: how long in seconds the absence of a pool is kept. None to keep only existing pools.
+        :param flush_size: number of new entries after which they are written to the file
+        :param flush_interval: minimum time in seconds between two syncs with the file, unless flush_size new entries
+        are waiting to be written
+        """
+        if flush_size < 1:
+            raise ValueError(f"flush_size must be greater than 0. Got {flush_size}")
+        self.file_path = file_path
+        self.read_only = read_only
+        self.negative_ttl = negative_ttl
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        # the connection is only used by one thread at a time: at creation and closing, else by the executor
+        if read_only:
+            self._connection = sqlite3.connect(f"file:{file_path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self._connection = sqlite3.connect(file_path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(_schema)
+            self._connection.commit()
+        self._connection.execute("PRAGMA busy_timeout=5000")
+        self._entries: Dict[PoolKey, PoolEntry] = {}
+        self._pending: List[Tuple[PoolKey, PoolEntry]] = []
+        self._last_sync = time.monotonic()
+        self._last_rowid = 0  # rows are only inserted or replaced, and so get a greater rowid
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="pool_index")
+        self._sync_task: Optional["asyncio.Future[None]"] = None
+        self.hits = 0
+        self.misses = 0
+        self._merge(self._write_and_read([]))
+        logger.debug(f"{len(self._entries)} pools loaded from {self.file_path}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def get_key(chain_id: int, factory: str, token_a: str, token_b: str, fee: int = 0) -> PoolKey:
+        token0, token1 = sorted((token_a.lower(), token_b.lower()))
+        return chain_id, factory.lower(), token0, token1, fee
+
+    def _is_valid(self, entry: PoolEntry) -> bool:
+        address, checked_at = entry
+        if int(address, 16):
+            return True
+        return self.negative_ttl is not None and time.time() - checked_at < self.negative_ttl
+
+    def get(self, chain_id: int, factory: str, token_a: str, token_b: str, fee: int = 0) -> Optional[str]:
+        """
+        :return: the pool address, the null address if the pool is known not to exist, or None if unknown
+        """
+        key = self.get_key(chain_id, factory, token_a, token_b, fee)
+        entry = self._entries.get(key)
+        if entry is None or not self._is_valid(entry):
+            self._sync_soon()  # maybe added by another worker
+            entry = self._entries.get(key)  # synced inline without event loop
+            if entry is None or not self._is_valid(entry):
+                self.misses += 1
+                return None
+        self.hits += 1
+        return entry[0]
+
+    def add(self, chain_id: int, factory: str, token_a: str, token_b: str, fee: int, address: str) -> None:
+        """
+        Add the result of a getPair() (fee=0) or getPool() call.
+        """
+        key = self.get_key(chain_id, factory, token_a, token_b, fee)
+        if not int(address, 16) and self.negative_ttl is None:
+            return
+        entry = (address, time.time())
+        self._entries[key] = entry
+        if self.read_only:
+            return
+        self._pending.append((key, entry))
+        self._sync_soon()
+
+    def get_entries(self) -> List[Tuple[PoolKey, PoolEntry]]:
+        """
+        :return: the entries in memory: the ones loaded from the file, looked up or added since
+        """
+        return list(self._entries.items())
+
+    def add_entries(self, entries: Sequence[Tuple[PoolKey, PoolEntry]]) -> None:
+        """
+        Add entries, eg from another index, unless more recent ones are already known.
+        """
+        for key, entry in entries:
+            known_entry = self._entries.get(key)
+            if known_entry is not None and known_entry[1] >= entry[1]:
+                continue
+            self._entries[key] = entry
+            if not self.read_only:
+                self._pending.append((key, entry))
+        self._sync_soon()
+
+    async def sync(self) -> None:
+        """
+        Write the new entries to the file, and read the ones added by the other workers, in the index thread.
+        """
+        self._last_sync = time.monotonic()
+        pending, self._pending = self._pending, []
+        rows = await asyncio.get_running_loop().run_in_executor(self._executor, self._write_and_read, pending)
+        self._merge(rows)
+
+    def flush(self) -> None:
+        """
+        Same as sync(), but blocking: not to be called from the event loop.
+        """
+        self._last_sync = time.monotonic()
+        pending, self._pending = self._pending, []
+        self._merge(self._executor.submit(self._write_and_read, pending).result())
+
+    def close(self) -> None:
+        if not self.read_only:
+            self.flush()
+        self._executor.shutdown()
+        self._connection.close()
+
+    def _sync_soon(self) -> None:
+        if self._sync_task is not None and not self._sync_task.done():
+            return
+        if len(self._pending) < self.flush_size and time.monotonic() - self._last_sync < self.flush_interval:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._sync_task = asyncio.ensure_future(self.sync())
+        self._sync_task.add_done_callback(self._on_synced)
+
+    def _on_synced(self, task: "asyncio.Future[Any]") -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Could not sync the pools with {self.file_path}. Reason: {task.exception()!r}")
+
+    def _write_and_read(self, pending: List[Tuple[PoolKey, PoolEntry]]) -> List[PoolRow]:
+        """
+        Run in the index thread.
+
+        :return: the rows added since the last read
+        """
+        if pending:
+            try:
+                with self._connection:
+                    self._connection.executemany(
+                        "INSERT OR REPLACE INTO pools VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [key + entry for key, entry in pending],
+                    )
+            except sqlite3.Error as e:
+                logger.warning(f"Could not write {len(pending)} pools to {self.file_path}. Reason: {e}")
+        try:
+            rows = self._connection.execute(
+                "SELECT rowid, chain_id, factory, token0, token1, fee, address, checked_at FROM pools WHERE rowid > ?",
+                (self._last_rowid, ),
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read the pools from {self.file_path}. Reason: {e}")
+            return []
+        if rows:
+            self._last_rowid = max(row[0] for row in rows)
+        return [row[1:] for row in rows]
+
+    def _merge(self, rows: List[PoolRow]) -> None:
+        for row in rows:
+            key, entry = row[:5], row[5:]
+            known_entry = self._entries.get(key)
+            if known_entry is None or known_entry[1] <= entry[1]:
+                self._entries[key] = entry
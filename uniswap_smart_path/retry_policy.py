@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import random
+import time
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+from aiohttp import ClientError
+
+from ._context import current_metrics
+from .exceptions import CircuitOpenError
+from .tracing import set_attribute
+
+
+logger = logging.getLogger(__name__)
+
+
+T = TypeVar("T")
+
+# errors telling nothing about the request itself: the endpoint did not answer, or not in time
+TRANSIENT_ERRORS: Tuple[Type[BaseException], ...] = (asyncio.exceptions.TimeoutError, ClientError, ConnectionError)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.) -> None:
+        """
+        Stop sending requests to an endpoint after failure_threshold consecutive transient failures: the requests
+        then fail fast with a CircuitOpenError for reset_timeout seconds. After that, a single trial request is let
+        through: the circuit is closed again if it succeeds, else it stays open for another reset_timeout.
+
+        :param failure_threshold: number of consecutive failures opening the circuit
+        :param reset_timeout: time in seconds the circuit stays open before a trial request
+        """
+        if failure_threshold < 1:
+            raise ValueError(f"failure_threshold must be greater than 0. Got {failure_threshold}")
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_count = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        """
+        :return: "closed", "open" or "half_open" (a trial request can be sent, or is in flight)
+        """
+        if self.opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self.opened_at < self.reset_timeout else "half_open"
+
+    def check(self) -> None:
+        """
+        :raise CircuitOpenError: if no request must be sent
+        """
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial_in_flight):
+            raise CircuitOpenError(f"Circuit open since {self.failure_count} consecutive failures")
+        if state == "half_open":
+            self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        self.failure_count = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_cancellation(self) -> None:
+        """
+        The request was cancelled, eg all its callers gave up: neither a success nor a failure, but a trial request
+        may be sent again.
+        """
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failure_count += 1
+        if self._trial_in_flight or self.failure_count >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Circuit opened after {self.failure_count} consecutive failures")
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+
+class RetryPolicy:
+    def __init__(
+            self,
+            max_attempts: int = 3,
+            base_delay: float = 0.05,
+            max_delay: float = 1.,
+            timeout: Optional[float] = None,
+            failure_threshold: int = 5,
+            reset_timeout: float = 10.,
+            retry_on: Tuple[Type[BaseException], ...] = TRANSIENT_ERRORS) -> None:
+        """
+        Retry the RPC requests failing with a transient error (a timeout, a connection error, ...), after a jittered
+        exponential backoff, with a circuit breaker per endpoint so a failing endpoint is not hammered with retries.
+        Other errors, like a reverted call, are definitive answers: they are neither retried nor counted as failures.
+
+        :param max_attempts: maximum number of attempts per request, the first one included
+        :param base_delay: backoff delay in seconds before the first retry, doubled for each next one. The actual
+        delay is random between 0 and this value (full jitter), so the retries are spread.
+        :param max_delay: maximum backoff delay in seconds
+        :param timeout: timeout in seconds of each attempt. None to rely on the provider timeout.
+        :param failure_threshold: number of consecutive failures opening the circuit of an endpoint
+        :param reset_timeout: time in seconds the circuit of an endpoint stays open before a trial request
+        :param retry_on: the transient exception types
+        """
+        if max_attempts < 1:
+            raise ValueError(f"max_attempts must be greater than 0. Got {max_attempts}")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.retry_on = retry_on
+        self.breakers: Dict[Hashable, CircuitBreaker] = {}
+        self.retry_count = 0
+        self.rejected_count = 0
+
+    def get_breaker(self, endpoint: Hashable) -> CircuitBreaker:
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            breaker = self.breakers[endpoint] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return breaker
+
+    def get_delay(self, retry: int) -> float:
+        """
+        :param retry: the retry number, starting at 0
+        :return: the backoff delay before this retry
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+    async def run(self, endpoint: Hashable, request: Callable[[], Awaitable[T]]) -> T:
+        """
+        Perform the request, retried on transient errors.
+
+        :param endpoint: identifies the endpoint, for its circuit breaker
+        :param request: performs one attempt
+        :raise CircuitOpenError: if the circuit of the endpoint is open
+        :return: the request result, or the error of the last attempt is raised
+        """
+        breaker = self.get_breaker(endpoint)
+        attempt = 0
+        while True:
+            try:
+                breaker.check()
+            except CircuitOpenError:
+                self.rejected_count += 1
+                raise
+            try:
+                if self.timeout is None:
+                    result = await request()
+                else:
+                    result = await asyncio.wait_for(request(), self.timeout)
+            except self.retry_on as e:
+                breaker.record_failure()
+                attempt += 1
+                if attempt >= self.max_attempts:
+                    raise
+                logger.debug(f"Attempt {attempt} failed, retrying. Reason: {e!r}")
+                self.retry_count += 1
+                metrics = current_metrics.get()
+                if metrics is not None:
+                    metrics.retried_rpc_count += 1
+                set_attribute("retries", attempt)
+                await asyncio.sleep(self.get_delay(attempt - 1))
+            except Exception:
+                breaker.record_success()  # the endpoint answered, eg the call reverted
+                raise
+            except BaseException:
+                breaker.record_cancellation()
+                raise
+            else:
+                breaker.record_success()
+                return result
@@ -0,0 +1,172 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import partial
+import logging
+from typing import (
+    Awaitable,
+    Callable,
+    cast,
+    Optional,
+    Tuple,
+)
+
+from web3.types import (
+    BlockNumber,
+    ChecksumAddress,
+    Wei,
+)
+
+from ._context import (
+    current_discovery,
+    current_metrics,
+    Discovery,
+)
+from ._datastructures import WeightedPathResult
+from ._single_flight import SingleFlight
+from .tracing import set_attribute
+
+
+logger = logging.getLogger(__name__)
+
+
+RouteKey = Tuple[str, str, int, Optional[int], Optional[float]]
+Route = Tuple[WeightedPathResult, ...]
+
+
+def copy_route(route: Route) -> Route:
+    """
+    :return: a copy of the route, so the cached one cannot be modified by the callers (its paths are tuples)
+    """
+    return tuple(cast(WeightedPathResult, dict(result)) for result in route)
+
+
+@dataclass(frozen=True)
+class RouteCacheStats:
+    size: int
+    block_number: Optional[BlockNumber]
+    hits: int
+    misses: int
+
+    @property
+    def hit_ratio(self) -> float:
+        return self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.
+
+
+class RouteCache:
+    def __init__(self, max_size: int = 1024, significant_digits: Optional[int] = None) -> None:
+        """
+        Cache the results of get_swap_in_path() for the current block. All entries are invalidated as soon as a new
+        block number is seen, and the least recently used entries are evicted when the cache is full.
+
+        Amounts can be bucketed by keeping only their first significant digits: a request for an amount in the same
+        bucket as a cached one gets the cached result, ie the estimates computed for the cached amount.
+
+        The cached routes are copied in and out, so they cannot be modified by the callers.
+
+        :param max_size: maximum number of cached routes
+        :param significant_digits: number of significant digits kept to bucket the amounts. None for exact amounts.
+        """
+        if max_size < 1:
+            raise ValueError(f"max_size must be greater than 0. Got {max_size}")
+        if significant_digits is not None and significant_digits < 1:
+            raise ValueError(f"significant_digits must be greater than 0. Got {significant_digits}")
+        self.max_size = max_size
+        self.significant_digits = significant_digits
+        self.block_number: Optional[BlockNumber] = None
+        self._routes: "OrderedDict[RouteKey, Route]" = OrderedDict()
+        self._single_flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def get_stats(self) -> RouteCacheStats:
+        return RouteCacheStats(len(self._routes), self.block_number, self.hits, self.misses)
+
+    def bucket(self, amount: Wei) -> int:
+        if self.significant_digits is None:
+            return int(amount)
+        scale: int = 10 ** max(0, len(str(abs(amount))) - self.significant_digits)
+        return int(amount) // scale * scale
+
+    def get_key(
+            self,
+            amount: Wei,
+            token_in_address: ChecksumAddress,
+            token_out_address: ChecksumAddress,
+            gas_price: Optional[int] = None,
+            token_out_price: Optional[float] = None) -> RouteKey:
+        """
+        :param gas_price: with gas estimates only, the gas price the paths are ranked with
+        :param token_out_price: with gas estimates only, the price of token_out the paths are ranked with
+        """
+        return token_in_address.lower(), token_out_address.lower(), self.bucket(amount), gas_price, token_out_price
+
+    def set_block_number(self, block_number: BlockNumber) -> None:
+        """
+        Invalidate all the entries if block_number is newer than the cached one.
+        """
+        if self.block_number is None or block_number > self.block_number:
+            if self._routes:
+                logger.debug(f"New block {block_number}: invalidating {len(self._routes)} cached route(s)")
+            self._routes.clear()
+            self.block_number = block_number
+
+    def get(self, key: RouteKey, block_number: BlockNumber) -> Optional[Route]:
+        self.set_block_number(block_number)
+        route = self._routes.get(key) if block_number == self.block_number else None
+        if route is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._routes.move_to_end(key)
+            route = copy_route(route)
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.add_cache_lookup("route", route is not None)
+        set_attribute("route_cache_hit", route is not None)
+        return route
+
+    def put(self, key: RouteKey, block_number: BlockNumber, route: Route) -> None:
+        self.set_block_number(block_number)
+        if block_number != self.block_number:
+            return  # computed at an outdated block
+        self._routes[key] = copy_route(route)
+        self._routes.move_to_end(key)
+        while len(self._routes) > self.max_size:
+            self._routes.popitem(last=False)
+
+    async def get_or_compute(
+            self,
+            key: RouteKey,
+            block_number: BlockNumber,
+            compute: Callable[[], Awaitable[Route]]) -> Route:
+        """
+        Return a copy of the cached route, or compute and cache it. Concurrent identical misses are computed only once,
+        and each of them gets its own copy.
+        A route computed while the existence of a pool, or the quote of a path, was unknown is not cached: it may be
+        missing this pool or this path.
+        """
+        route = self.get(key, block_number)
+        if route is None:
+            route = await self._single_flight.do(
+                (key, block_number),
+                partial(self._compute, key, block_number, compute),
+            )
+            route = copy_route(route)
+        return route
+
+    async def _compute(
+            self,
+            key: RouteKey,
+            block_number: BlockNumber,
+            compute: Callable[[], Awaitable[Route]]) -> Route:
+        discovery = Discovery()
+        current_discovery.set(discovery)  # run in its own task, so its own context
+        route = await compute()
+        if discovery.complete:
+            self.put(key, block_number, route)
+        else:
+            logger.debug(f"Incomplete pool discovery at block {block_number}: the route {key} is not cached")
+        return route
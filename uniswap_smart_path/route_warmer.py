@@ -0,0 +1,180 @@
+import asyncio
+from dataclasses import dataclass
+import logging
+import time
+from typing import (
+    Any,
+    Dict,
+    Optional,
+    Sequence,
+    Tuple,
+    TYPE_CHECKING,
+)
+
+from web3.types import (
+    BlockNumber,
+    ChecksumAddress,
+    Wei,
+)
+
+from ._context import current_low_priority
+
+
+if TYPE_CHECKING:
+    from .smart_path import SmartPath  # pragma: no cover
+
+
+logger = logging.getLogger(__name__)
+
+
+HotPair = Tuple[Wei, ChecksumAddress, ChecksumAddress]  # same order as get_swap_in_path() parameters
+
+
+@dataclass(frozen=True)
+class Staleness:
+    block_number: BlockNumber  # block at which the route was computed
+    blocks_behind: int  # number of blocks seen since then
+    age: float  # seconds since the route was computed
+
+
+class RouteWarmer:
+    def __init__(
+            self,
+            smart_path: "SmartPath",
+            hot_pairs: Sequence[HotPair],
+            interval: Optional[float] = None,
+            poll_interval: float = 1.,
+            min_available_ratio: float = 0.5,
+            max_slowdown: int = 8) -> None:
+        """
+        Background task recomputing the routes of the hot pairs, so get_swap_in_path() finds them in the RouteCache
+        of the SmartPath instead of computing them.
+
+        The warmer has a low priority: its RPC requests give way to the other ones in the SmartRateLimiter and the
+        ConcurrencyLimiter, if any. Before each computation, it also waits for the SmartRateLimiter to have at least
+        min_available_ratio of its budget available. It slows down its refresh rate, up to max_slowdown times, while
+        the budget is low, and speeds it up again when the budget is back.
+
+        :param smart_path: a SmartPath instance with a RouteCache
+        :param hot_pairs: (amount, token_in_address, token_out_address) to keep warm
+        :param interval: refresh period in seconds. None to refresh at every new block.
+        :param poll_interval: period in seconds at which the block number is polled
+        :param min_available_ratio: ratio of the rate limiter budget that must be available to compute a route
+        :param max_slowdown: maximum factor by which the refresh rate is decreased when the budget is low
+        """
+        if smart_path.route_cache is None:
+            raise ValueError("RouteWarmer needs a SmartPath with a RouteCache")
+        self.smart_path = smart_path
+        self.hot_pairs = tuple(hot_pairs)
+        self.interval = interval
+        self.poll_interval = poll_interval
+        self.min_available_ratio = min_available_ratio
+        self.max_slowdown = max_slowdown
+        self.slowdown = 1
+        self.latest_block_number: Optional[BlockNumber] = None
+        self._refreshed: Dict[HotPair, Tuple[BlockNumber, float]] = {}
+        self._last_refresh_block_number: Optional[BlockNumber] = None
+        self._last_refresh_time = 0.
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if not self.is_running:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def __aenter__(self) -> "RouteWarmer":
+        self.start()
+        return self
+
+    async def __aexit__(self, exception_type: Any, exception_val: Any, exception_traceback: Any) -> None:
+        await self.stop()
+
+    def get_staleness(
+            self,
+            amount: Wei,
+            token_in_address: ChecksumAddress,
+            token_out_address: ChecksumAddress) -> Optional[Staleness]:
+        """
+        :return: how old the warmed route of the given hot pair is, or None if it has not been computed yet
+        """
+        refreshed = self._refreshed.get((amount, token_in_address, token_out_address))
+        if refreshed is None:
+            return None
+        block_number, refresh_time = refreshed
+        latest_block_number = self.latest_block_number or block_number
+        return Staleness(block_number, latest_block_number - block_number, time.monotonic() - refresh_time)
+
+    def _is_refresh_due(self, block_number: BlockNumber) -> bool:
+        if self._last_refresh_block_number is None:
+            return True
+        if self.interval is None:
+            return block_number > self._last_refresh_block_number
+        return time.monotonic() - self._last_refresh_time >= self.interval * self.slowdown
+
+    def _available_ratio(self) -> float:
+        smart_rate_limiter = self.smart_path.get_smart_rate_limiter()
+        return smart_rate_limiter.get_available_ratio() if smart_rate_limiter else 1.
+
+    async def _wait_for_budget(self) -> None:
+        while self._available_ratio() < self.min_available_ratio:
+            await asyncio.sleep(self.poll_interval / 10)
+
+    def _adapt_slowdown(self) -> None:
+        if self._available_ratio() < self.min_available_ratio:
+            self.slowdown = min(self.max_slowdown, self.slowdown * 2)
+        elif self.slowdown > 1:
+            self.slowdown //= 2
+
+    async def refresh(self, block_number: Optional[BlockNumber] = None) -> None:
+        """
+        Compute the routes of all the hot pairs once, at the same block.
+
+        :param block_number: the block to compute the routes at, by default the latest one
+        """
+        self._last_refresh_time = time.monotonic()
+        priority_token = current_low_priority.set(True)
+        try:
+            if block_number is None:
+                block_number = await self.smart_path.get_block_number()
+            for hot_pair in self.hot_pairs:
+                await self._wait_for_budget()
+                try:
+                    await self.smart_path.get_swap_in_path_with_block(*hot_pair, block_number=block_number)
+                except Exception as e:
+                    logger.warning(f"Could not warm route for {hot_pair}. Reason: {e!r}")
+                    continue
+                self._refreshed[hot_pair] = (block_number, time.monotonic())
+                self._last_refresh_block_number = block_number
+        finally:
+            current_low_priority.reset(priority_token)
+        if self.latest_block_number is None or block_number > self.latest_block_number:
+            self.latest_block_number = block_number
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                block_number = await self.smart_path.get_block_number()
+            except Exception as e:
+                logger.warning(f"Could not get the block number. Reason: {e!r}")
+            else:
+                self.latest_block_number = block_number
+                self._adapt_slowdown()
+                if self._is_refresh_due(block_number):
+                    await self.refresh(block_number)
+            block_tracker = self.smart_path.block_tracker
+            if block_tracker is not None and block_tracker.is_running:
+                await block_tracker.wait_for_block(self.poll_interval * self.slowdown)  # woken up by a new block
+            else:
+                await asyncio.sleep(self.poll_interval * self.slowdown)
@@ -0,0 +1,215 @@
+import asyncio
+from dataclasses import asdict
+import logging
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from aiohttp import web
+from web3.types import (
+    ChecksumAddress,
+    Wei,
+)
+
+from ._quotes import (
+    format_quote,
+    parse_quote_request,
+    Quote,
+    QuoteKey,
+)
+from ._single_flight import SingleFlight
+from .smart_path import SmartPath
+
+
+logger = logging.getLogger(__name__)
+
+
+class QuoteServer:
+    def __init__(
+            self,
+            smart_path: SmartPath,
+            batch_window: float = 0.005,
+            max_batch_size: int = 64,
+            max_batch_requests: int = 256) -> None:
+        """
+        Serve the paths of a SmartPath over HTTP and JSON, so many application processes share one warm routing
+        engine, with its caches and its rate-limited RPC connections, instead of each paying for the discovery.
+
+        * POST /quote: {"amount": "1000000000000000000", "token_in": "0x...", "token_out": "0x..."}
+          returns {"block_number": 20000000, "paths": [...]}, the paths being the get_swap_in_path() result
+        * POST /quotes: {"requests": [<quote request>, ...]} returns {"results": [<quote or {"error": ...}>, ...]}
+        * GET /health and GET /stats
+
+        Concurrent identical requests are computed once. The different requests received within batch_window are
+        computed together at the same block: their identical discovery and quote eth_call are coalesced, and a single
+        eth_blockNumber is sent for the whole batch.
+
+        :param smart_path: the SmartPath computing the paths
+        :param batch_window: time in seconds during which the requests are gathered into a batch
+        :param max_batch_size: maximum number of requests in a batch, a full batch is computed without waiting
+        :param max_batch_requests: maximum number of requests in a POST /quotes
+        """
+        if batch_window < 0:
+            raise ValueError(f"batch_window must be positive or 0. Got {batch_window}")
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be greater than 0. Got {max_batch_size}")
+        self.smart_path = smart_path
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.max_batch_requests = max_batch_requests
+        self.request_count = 0
+        self.batch_count = 0
+        self._single_flight = SingleFlight()
+        self._pending: List[Tuple[QuoteKey, "asyncio.Future[Quote]"]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._batch_tasks: Set["asyncio.Task[None]"] = set()
+        self._runner: Optional[web.AppRunner] = None
+
+    async def quote(self, amount: Wei, token_in_address: ChecksumAddress, token_out_address: ChecksumAddress) -> Quote:
+        """
+        :return: the paths, and the block at which they were computed, as get_swap_in_path_with_block()
+        """
+        self.request_count += 1
+        key = (amount, token_in_address, token_out_address)
+        return await self._single_flight.do(key, lambda: self._enqueue(key))
+
+    def _enqueue(self, key: QuoteKey) -> "asyncio.Future[Quote]":
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[Quote]" = loop.create_future()
+        self._pending.append((key, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        return future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._compute_batch(batch))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+
+    async def _compute_batch(self, batch: List[Tuple[QuoteKey, "asyncio.Future[Quote]"]]) -> None:
+        batch = [(key, future) for key, future in batch if not future.done()]  # not cancelled by all its callers
+        if not batch:
+            return
+        self.batch_count += 1
+        try:
+            block_number = await self.smart_path.get_block_number()
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        logger.debug(f"Computing a batch of {len(batch)} request(s) at block {block_number}")
+        results = await asyncio.gather(
+            *[self.smart_path.get_swap_in_path_with_block(*key, block_number=block_number) for key, _ in batch],
+            return_exceptions=True,
+        )
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _quote_one(self, body: Any) -> Tuple[int, Dict[str, Any]]:
+        """
+        :return: the HTTP status and the JSON response of a quote request
+        """
+        try:
+            key = parse_quote_request(body)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        try:
+            return 200, format_quote(await self.quote(*key))
+        except Exception:
+            # the details are logged, but not sent to the client
+            logger.exception(f"Could not compute the paths for {key}")
+            return 500, {"error": "Could not compute the paths"}
+
+    async def _handle_quote(self, request: web.Request) -> web.Response:
+        try:
+            body = await request.json()
+        except ValueError as e:
+            return web.json_response({"error": f"Invalid JSON: {e}"}, status=400)
+        status, response = await self._quote_one(body)
+        return web.json_response(response, status=status)
+
+    async def _handle_quotes(self, request: web.Request) -> web.Response:
+        try:
+            body = await request.json()
+        except ValueError as e:
+            return web.json_response({"error": f"Invalid JSON: {e}"}, status=400)
+        requests = body.get("requests") if isinstance(body, dict) else None
+        if not isinstance(requests, list):
+            return web.json_response({"error": "A JSON object with a 'requests' list is expected"}, status=400)
+        if len(requests) > self.max_batch_requests:
+            return web.json_response(
+                {"error": f"Too many requests: {len(requests)}. Maximum is {self.max_batch_requests}"},
+                status=400,
+            )
+        results = await asyncio.gather(*[self._quote_one(quote_request) for quote_request in requests])
+        return web.json_response({"results": [response for _, response in results]})
+
+    async def _handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "chain_id": self.smart_path.chain_id})
+
+    async def _handle_stats(self, request: web.Request) -> web.Response:
+        stats: Dict[str, Any] = {
+            "requests": self.request_count,
+            "coalesced": self._single_flight.coalesced_count,
+            "batches": self.batch_count,
+        }
+        if self.smart_path.route_cache is not None:
+            stats["route_cache"] = asdict(self.smart_path.route_cache.get_stats())
+        return web.json_response(stats)
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/quote", self._handle_quote)
+        app.router.add_post("/quotes", self._handle_quotes)
+        app.router.add_get("/health", self._handle_health)
+        app.router.add_get("/stats", self._handle_stats)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080) -> str:
+        """
+        Start serving in the background.
+
+        :param host: the interface to listen on
+        :param port: the port to listen on, 0 for any free port
+        :return: the url of the server
+        """
+        if self._runner is not None:
+            raise RuntimeError("The server is already started")
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        addresses = self._runner.addresses  # (host, port, ...) of the listening sockets
+        actual_port = addresses[0][1] if addresses else port
+        url = f"http://{host}:{actual_port}"
+        logger.info(f"Serving the paths on {url}")
+        return url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def serve_forever(self, host: str = "127.0.0.1", port: int = 8080) -> None:
+        await self.start(host, port)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
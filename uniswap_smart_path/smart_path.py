@@ -1,33 +1,57 @@
 import asyncio
+from collections import OrderedDict
+from contextlib import (
+    contextmanager,
+    nullcontext,
+)
 import itertools
+import json
 import logging
+import time
 from typing import (
     Any,
-    Awaitable,
+    AsyncIterator,
     cast,
+    Dict,
+    Iterator,
     List,
     Optional,
     Sequence,
     Tuple,
+    Union,
 )
+import zlib
 
+from aiohttp import ClientSession
 from web3 import (
     AsyncHTTPProvider,
     AsyncWeb3,
 )
-from web3.contract import AsyncContract
-from web3.contract.async_contract import AsyncContractFunctions
-from web3.exceptions import BadFunctionCallOutput
+from web3.exceptions import (
+    BadFunctionCallOutput,
+    Web3Exception,
+)
 from web3.middleware import validation
 from web3.types import (
+    BlockNumber,
     ChecksumAddress,
     RPCEndpoint,
     Wei,
 )
 
+from ._calls import (
+    decimals,
+    EthCall,
+    get_pair,
+    get_pool,
+    get_reserves,
+    PrecompiledFunction,
+    symbol,
+)
 from ._constants import (
     erc20_abi,
     irrelevant_value_filter_multiplier,
+    max_cached_tokens,
     pivot_tokens,
     uniswapv2_abi,
     uniswapv2_address,
@@ -40,22 +64,59 @@ from ._constants import (
     v3_pool_fees,
     weight_combinations,
 )
+from ._context import (
+    current_block_identifier,
+    current_metrics,
+    current_request_id,
+    mark_discovery_incomplete,
+    new_request_id,
+)
 from ._datastructures import (
     MixedWeightedPath,
-    RouterFunction,
+    PoolPathCache,
     Token,
     V2OrderedPool,
     V2PoolPath,
     V3OrderedPool,
     V3PoolPath,
-    WeightedPath,
     WeightedPathResult,
 )
+from ._rpc import RpcDispatcher
 from ._utilities import is_null_address
+from ._v2_math import (
+    get_best_amounts_out,
+    Reserves,
+)
+from .block_tracker import BlockTracker
+from .concurrency_limiter import ConcurrencyLimiter
 from .exceptions import SmartPathException
-from .smart_rate_limiter import (
-    _rate_limit,
-    SmartRateLimiter,
+from .failure_cache import FailureCache
+from .http_settings import HttpSettings
+from .instrumentation import (
+    add_candidates,
+    Instrumentation,
+    RequestMetrics,
+    stage,
+)
+from .pivot_learner import (
+    Link,
+    PivotLearner,
+)
+from .pool_index import PoolIndex
+from .retry_policy import (
+    RetryPolicy,
+    TRANSIENT_ERRORS,
+)
+from .route_cache import RouteCache
+from .route_warmer import (
+    HotPair,
+    RouteWarmer,
+)
+from .smart_rate_limiter import SmartRateLimiter
+from .tracing import (
+    set_attribute,
+    span,
+    Tracer,
 )
 
 
@@ -64,6 +125,10 @@ logger = logging.getLogger(__name__)
 
 NO_VALIDATION_METHODS = [RPCEndpoint("eth_call")]  # to avoid unnecessary eth_chainId requests
 
+SNAPSHOT_FORMAT_VERSION = 1
+
+_LegKey = Tuple[ChecksumAddress, Link, Optional[int]]  # token, pivot link, fee of the other leg (None if direct)
+
 
 class SmartPath:
     def __init__(
@@ -75,9 +140,55 @@ class SmartPath:
             with_v3: bool = True,
             smart_rate_limiter: Optional[SmartRateLimiter] = None,
             **kwargs: Any) -> None:
-        if with_gas_estimate:
-            raise NotImplementedError("Gas is not yet estimated")
+        """
+        Prefer the factory methods create(), create_v2_only(), create_v3_only() and create_custom().
+
+        Besides the customization keyword arguments described in create_custom(), the following optional keyword
+        arguments are accepted, by the constructor and all factory methods:
+
+        * concurrency_limiter: ConcurrencyLimiter - cap the number of RPC requests in flight at the same time
+        * route_cache: RouteCache - cache the paths computed for the current block, and with with_gas_estimate for
+          the current gas_price and output token price
+        * instrumentation: Instrumentation - collect metrics for each path request
+        * tracer: Tracer - record a span tree for each path request
+        * v2_pool_fee: int - fee of the V2 pools, in the same unit as v3_pool_fees (3000 for the 0.3% of Uniswap V2),
+          to compute the V2 side of the V2/V3 splits from the pool reserves, instead of quoting each split with the
+          router. It costs a getReserves call per V2 pool, but fewer router quotes.
+        * pool_index: PoolIndex - persistent index of the discovered pools, shared with the other worker processes
+        * pivot_learner: PivotLearner - restrict the pivot discovery of each token to the pivots and fee tiers
+          through which it has produced a competitive quote
+        * failure_cache: FailureCache - skip the pool paths whose quote recently failed, eg reverted
+        * retry_policy: RetryPolicy - retry the RPC requests failing with a transient error, eg a timeout, with a
+          circuit breaker per endpoint. A pool whose existence, or a path whose quote, is still unknown is left out of
+          the request, but is not recorded as missing by the pool index, the pivot learner or the failure cache, and
+          the resulting paths are not cached by the route cache.
+        * discovery_timeout: float - timeout in seconds of each discovery request (token info, pool lookup, block
+          number), once it is sent, ie not counting the rate and concurrency limiters
+        * quote_timeout: float - timeout in seconds of each quote request (V3 quoter, V2 router and reserves)
+        * http_settings: HttpSettings - connection pool of the HTTP provider, factory methods with an rpc_endpoint only.
+          The session created with these settings is closed by close().
+        * block_tracker: BlockTracker - learn the current block from a newHeads subscription instead of polling
+          eth_blockNumber, and invalidate the RouteCache as soon as a new block is pushed (see start_block_tracker())
+        * http_session: aiohttp.ClientSession - session of the HTTP provider, factory methods with an rpc_endpoint
+          only. It can be shared between SmartPath instances, so they reuse the same connections. It is owned by the
+          caller, who closes it.
+        * gas_price: int - with_gas_estimate only: the gas price in wei, that can be updated with the gas_price
+          attribute
+        * token_prices: Mapping[str, float] - with_gas_estimate only: the price of the output tokens in native token
+          (eg ETH), by token address, that can be updated with the token_prices attribute. eg: {usdc_address: 0.0004}
+
+        With with_gas_estimate, the paths are ranked by their output minus the cost of their gas in output token,
+        computed from the gas_price and the output token price, and each path of the result has a "gas_estimate".
+        The V3 gas estimates are the ones returned by the quoter along with the quotes, and the V2 ones come from a
+        per-hop model, so no extra RPC is needed. If the price of the output token is unknown, the gas is ignored.
+        """
         self.w3 = w3
+        self.with_gas_estimate = with_gas_estimate
+        self.gas_price: int = kwargs.get("gas_price", 0)
+        token_prices = kwargs.get("token_prices") or {}
+        self.token_prices: Dict[ChecksumAddress, float] = {
+            AsyncWeb3.to_checksum_address(address): price for address, price in token_prices.items()
+        }
         for method in NO_VALIDATION_METHODS:
             if method in validation.METHODS_TO_VALIDATE:
                 logger.debug(f"Removing {method} from web3.middleware.validation.METHODS_TO_VALIDATE")
@@ -88,6 +199,9 @@ class SmartPath:
 
         self.pivots = kwargs.get("pivot_tokens") or pivot_tokens[self.chain_id]
 
+        self.v2_pool_fee: Optional[int] = kwargs.get("v2_pool_fee")
+        # the V2 pairs found during discovery, to read their reserves (pair addresses never change)
+        self.v2_pair_addresses: Dict[Tuple[ChecksumAddress, ChecksumAddress], ChecksumAddress] = {}
         if self.with_v2:
             v2_router = w3.to_checksum_address(kwargs.get("v2_router") or uniswapv2_address)
             self.uniswapv2 = self.w3.eth.contract(v2_router, abi=uniswapv2_abi)
@@ -108,30 +222,129 @@ class SmartPath:
             self.factoryv3 = self.w3.eth.contract(v3_factory, abi=uniswapv3_factory_abi)
 
         self.smart_rate_limiter = smart_rate_limiter
+        self.concurrency_limiter: Optional[ConcurrencyLimiter] = kwargs.get("concurrency_limiter")
+        self.retry_policy: Optional[RetryPolicy] = kwargs.get("retry_policy")
+        self.rpc_dispatcher = RpcDispatcher(
+            self.smart_rate_limiter,
+            self.concurrency_limiter,
+            self.w3,
+            self.retry_policy,
+            kwargs.get("discovery_timeout"),
+            kwargs.get("quote_timeout"),
+        )
+        self.pool_path_cache = PoolPathCache(self.smart_rate_limiter, self.rpc_dispatcher)
+        self.route_cache: Optional[RouteCache] = kwargs.get("route_cache")
+        self.route_warmer: Optional[RouteWarmer] = None
+        self.block_tracker: Optional[BlockTracker] = None
+        if kwargs.get("block_tracker") is not None:
+            self.set_block_tracker(kwargs["block_tracker"])
+        self.instrumentation: Optional[Instrumentation] = kwargs.get("instrumentation")
+        self.tracer: Optional[Tracer] = kwargs.get("tracer")
+        self.pool_index: Optional[PoolIndex] = kwargs.get("pool_index")
+        self.pivot_learner: Optional[PivotLearner] = kwargs.get("pivot_learner")
+        self.failure_cache: Optional[FailureCache] = kwargs.get("failure_cache")
+        # set by the factory methods when they create the provider, so its connections are closed by close()
+        self._owns_provider = False
+        # token metadata never changes: the least recently used tokens are evicted when the cache is full
+        self.tokens: "OrderedDict[ChecksumAddress, Token]" = OrderedDict(
+            (pivot.address, pivot) for pivot in self.pivots
+        )
 
     def get_smart_rate_limiter(self) -> Optional[SmartRateLimiter]:
         return self.smart_rate_limiter
 
+    def set_block_tracker(self, block_tracker: BlockTracker) -> None:
+        """
+        Learn the current block from the block tracker instead of eth_blockNumber, and invalidate the RouteCache, if
+        any, as soon as a new block is pushed.
+        """
+        if self.block_tracker is not None:
+            raise SmartPathException("A block tracker is already attached to this SmartPath")
+        self.block_tracker = block_tracker
+        if self.route_cache is not None:
+            block_tracker.add_listener(self.route_cache.set_block_number)
+
+    def start_block_tracker(self, **kwargs: Any) -> BlockTracker:
+        """
+        Start tracking the new blocks with a newHeads subscription (see BlockTracker). The SmartPath must use a
+        persistent provider, eg created with a ws:// or wss:// rpc_endpoint, or an IPC path.
+
+        :param kwargs: BlockTracker optional parameters
+        :return: the started BlockTracker, also available as the block_tracker attribute
+        """
+        block_tracker = BlockTracker(self.w3, **kwargs)
+        self.set_block_tracker(block_tracker)
+        block_tracker.start()
+        return block_tracker
+
+    async def get_block_number(self) -> BlockNumber:
+        """
+        :return: the latest block number, pushed to the block tracker if any, else from eth_blockNumber
+        """
+        if self.block_tracker is not None:
+            block_number = self.block_tracker.get_block_number()
+            if block_number is not None:
+                return block_number
+        return await self.rpc_dispatcher.get_block_number()
+
+    def start_route_warmer(self, hot_pairs: Sequence[HotPair], **kwargs: Any) -> RouteWarmer:
+        """
+        Start a background task keeping the routes of the hot pairs warm in the RouteCache (see RouteWarmer).
+
+        :param hot_pairs: (amount, token_in_address, token_out_address) to keep warm
+        :param kwargs: RouteWarmer optional parameters
+        :return: the started RouteWarmer, also available as the route_warmer attribute
+        """
+        if self.route_warmer is not None:
+            raise SmartPathException("A route warmer is already attached to this SmartPath")
+        self.route_warmer = RouteWarmer(self, hot_pairs, **kwargs)
+        self.route_warmer.start()
+        return self.route_warmer
+
+    async def close(self) -> None:
+        """
+        Close the connections of the provider created by the factory method from an rpc_endpoint, ie its HTTP session
+        or its WebSocket / IPC connection. A w3 instance or an http_session given to the factory method is owned by
+        the caller, who closes it.
+        """
+        if not self._owns_provider:
+            return
+        disconnect = getattr(self.w3.provider, "disconnect", None)  # web3 v7
+        if disconnect is not None:
+            logger.debug("Closing the connections of the provider")
+            await disconnect()
+        self._owns_provider = False
+
+    async def __aenter__(self) -> "SmartPath":
+        return self
+
+    async def __aexit__(self, exception_type: Any, exception_val: Any, exception_traceback: Any) -> None:
+        await self.close()
+
     @classmethod
     async def create(
             cls,
             w3: Optional[AsyncWeb3] = None,
             rpc_endpoint: Optional[str] = None,
             with_gas_estimate: bool = False,
-            smart_rate_limiter: Optional[SmartRateLimiter] = None) -> "SmartPath":
+            smart_rate_limiter: Optional[SmartRateLimiter] = None,
+            **kwargs: Any) -> "SmartPath":
         """
         Create a SmartPath instance which will search for the best path from v2 and v3 pools.
 
         :param w3: a valid AsyncWeb3 instance (if no rpc endpoint is given)
         :param rpc_endpoint: an rpc endpoint address (if no w3 instance is given)
-        :param with_gas_estimate: Not supported at the moment.
+        :param with_gas_estimate: rank the paths by their output net of the gas cost (see SmartPath.__init__())
         :param smart_rate_limiter: an instance of SmartRateLimiter to manage rate limits
+        :param kwargs: optional keyword arguments to enable extra features (see SmartPath.__init__())
         :return: a SmartPath instance using v2 and v3 pools
         """
-        _w3 = await cls._get_w3(rpc_endpoint, w3)
+        _w3 = await cls._get_w3(rpc_endpoint, w3, kwargs.get("http_settings"), kwargs.get("http_session"))
         chain_id = await _w3.eth.chain_id
         logger.debug(f"Creating SmartPath for V2 and V3 pools on chain id: {chain_id}")
-        return cls(_w3, with_gas_estimate, chain_id, True, True, smart_rate_limiter)
+        smart_path = cls(_w3, with_gas_estimate, chain_id, True, True, smart_rate_limiter, **kwargs)
+        smart_path._owns_provider = w3 is None and kwargs.get("http_session") is None
+        return smart_path
 
     @classmethod
     async def create_v2_only(
@@ -139,20 +352,24 @@ class SmartPath:
             w3: Optional[AsyncWeb3] = None,
             rpc_endpoint: Optional[str] = None,
             with_gas_estimate: bool = False,
-            smart_rate_limiter: Optional[SmartRateLimiter] = None) -> "SmartPath":
+            smart_rate_limiter: Optional[SmartRateLimiter] = None,
+            **kwargs: Any) -> "SmartPath":
         """
         Create a SmartPath instance which will search for the best path from v2 pools only.
 
         :param w3: a valid AsyncWeb3 instance (if no rpc endpoint is given)
         :param rpc_endpoint: an rpc endpoint address (if no w3 instance is given)
-        :param with_gas_estimate: Not supported at the moment.
+        :param with_gas_estimate: rank the paths by their output net of the gas cost (see SmartPath.__init__())
         :param smart_rate_limiter: an instance of SmartRateLimiter to manage rate limits
+        :param kwargs: optional keyword arguments to enable extra features (see SmartPath.__init__())
         :return: a SmartPath instance using only v2 pools
         """
-        _w3 = await cls._get_w3(rpc_endpoint, w3)
+        _w3 = await cls._get_w3(rpc_endpoint, w3, kwargs.get("http_settings"), kwargs.get("http_session"))
         chain_id = await _w3.eth.chain_id
         logger.debug(f"Creating SmartPath for V2 only pool son chain id: {chain_id}")
-        return cls(_w3, with_gas_estimate, chain_id, True, False, smart_rate_limiter)
+        smart_path = cls(_w3, with_gas_estimate, chain_id, True, False, smart_rate_limiter, **kwargs)
+        smart_path._owns_provider = w3 is None and kwargs.get("http_session") is None
+        return smart_path
 
     @classmethod
     async def create_v3_only(
@@ -160,20 +377,24 @@ class SmartPath:
             w3: Optional[AsyncWeb3] = None,
             rpc_endpoint: Optional[str] = None,
             with_gas_estimate: bool = False,
-            smart_rate_limiter: Optional[SmartRateLimiter] = None) -> "SmartPath":
+            smart_rate_limiter: Optional[SmartRateLimiter] = None,
+            **kwargs: Any) -> "SmartPath":
         """
         Create a SmartPath instance which will search for the best path from v3 pools only.
 
         :param w3: a valid AsyncWeb3 instance (if no rpc endpoint is given)
         :param rpc_endpoint: an rpc endpoint address (if no w3 instance is given)
-        :param with_gas_estimate: Not supported at the moment.
+        :param with_gas_estimate: rank the paths by their output net of the gas cost (see SmartPath.__init__())
         :param smart_rate_limiter: an instance of SmartRateLimiter to manage rate limits
+        :param kwargs: optional keyword arguments to enable extra features (see SmartPath.__init__())
         :return: a SmartPath instance using only v3 pools
         """
-        _w3 = await cls._get_w3(rpc_endpoint, w3)
+        _w3 = await cls._get_w3(rpc_endpoint, w3, kwargs.get("http_settings"), kwargs.get("http_session"))
         chain_id = await _w3.eth.chain_id
         logger.debug(f"Creating SmartPath for V3 only pools on chain id: {chain_id}")
-        return cls(_w3, with_gas_estimate, chain_id, False, True, smart_rate_limiter)
+        smart_path = cls(_w3, with_gas_estimate, chain_id, False, True, smart_rate_limiter, **kwargs)
+        smart_path._owns_provider = w3 is None and kwargs.get("http_session") is None
+        return smart_path
 
     @classmethod
     async def create_custom(
@@ -193,15 +414,17 @@ class SmartPath:
         * v2_factory: str - v2 factory address
         * v3_quoter: str - v3 quoter address
         * v3_factory: str - v3 factory address
+        * v2_pool_fee: int - v2 pool fee, in the same unit as v3_pool_fees. eg: 2500 (see SmartPath.__init__())
 
         :param w3: a valid AsyncWeb3 instance (if no rpc endpoint is given)
         :param rpc_endpoint: an rpc endpoint address (if no w3 instance is given)
-        :param with_gas_estimate: Not supported at the moment.
+        :param with_gas_estimate: rank the paths by their output net of the gas cost (see SmartPath.__init__())
         :param smart_rate_limiter: an instance of SmartRateLimiter to manage rate limits
-        :param kwargs: keyword args to customize V2 and/or V3 pools (see above)
+        :param kwargs: keyword args to customize V2 and/or V3 pools (see above), or to enable extra features (see
+                       SmartPath.__init__())
         :return: a custom SmartPath instance
         """
-        _w3 = await cls._get_w3(rpc_endpoint, w3)
+        _w3 = await cls._get_w3(rpc_endpoint, w3, kwargs.get("http_settings"), kwargs.get("http_session"))
         _chain_id = await _w3.eth.chain_id
         logger.debug(f"Creating custom SmartPath on chain id: {_chain_id}")
 
@@ -216,20 +439,17 @@ class SmartPath:
         if not with_v2 and not with_v3:
             raise SmartPathException("Must provide v2 and/or v3 addresses")
 
-        return cls(
+        smart_path = cls(
             _w3,
             with_gas_estimate,
             _chain_id,
             with_v2=bool(with_v2),
             with_v3=bool(with_v3),
             smart_rate_limiter=smart_rate_limiter,
-            pivot_tokens=_pivots,
-            v3_pool_fees=kwargs.get("v3_pool_fees"),
-            v2_router=kwargs.get("v2_router"),
-            v2_factory=kwargs.get("v2_factory"),
-            v3_quoter=kwargs.get("v3_quoter"),
-            v3_factory=kwargs.get("v3_factory"),
+            **dict(kwargs, pivot_tokens=_pivots),
         )
+        smart_path._owns_provider = w3 is None and kwargs.get("http_session") is None
+        return smart_path
 
     @staticmethod
     async def _get_pivot_tokens(pivots: Sequence[str], w3: AsyncWeb3) -> Tuple[Token, ...]:
@@ -237,32 +457,161 @@ class SmartPath:
         return tuple(await asyncio.gather(*pivot_coros))
 
     @staticmethod
-    async def _get_w3(rpc_endpoint: Optional[str], w3: Optional[AsyncWeb3]) -> AsyncWeb3:
+    async def _get_w3(
+            rpc_endpoint: Optional[str],
+            w3: Optional[AsyncWeb3],
+            http_settings: Optional[HttpSettings] = None,
+            http_session: Optional[ClientSession] = None) -> AsyncWeb3:
         if w3:
             _w3 = w3
         elif rpc_endpoint:
-            _w3 = AsyncWeb3(AsyncHTTPProvider(rpc_endpoint, {"timeout": 5}))
+            if rpc_endpoint.startswith(("ws://", "wss://")) or rpc_endpoint.endswith(".ipc"):
+                return await SmartPath._get_persistent_w3(rpc_endpoint)
+            if http_settings is None and http_session is None:
+                return AsyncWeb3(AsyncHTTPProvider(rpc_endpoint, {"timeout": 5}))
+            http_settings = http_settings or HttpSettings()
+            provider = AsyncHTTPProvider(rpc_endpoint, http_settings.get_request_kwargs())
+            await provider.cache_async_session(http_session or http_settings.create_session())
+            _w3 = AsyncWeb3(provider)
         else:
             raise ValueError("Invalid parameters. Must provide either an AsyncWeb3 instance or an rpc address")
         return _w3
 
-    async def _get_symbol(self, contract: AsyncContract) -> str:
+    @staticmethod
+    async def _get_persistent_w3(rpc_endpoint: str) -> AsyncWeb3:
+        """
+        :return: a connected AsyncWeb3 instance, with a WebSocket provider for a ws:// or wss:// endpoint, else IPC
+        """
         try:
-            return str(await self._contract_function_call(contract.functions.symbol()))
+            from web3 import (
+                AsyncIPCProvider,
+                WebSocketProvider,
+            )
+        except ImportError:  # web3 v6
+            raise SmartPathException("WebSocket and IPC endpoints need web3 v7, else provide a connected AsyncWeb3")
+        if rpc_endpoint.startswith(("ws://", "wss://")):
+            return cast(AsyncWeb3, await AsyncWeb3(WebSocketProvider(rpc_endpoint)))
+        return cast(AsyncWeb3, await AsyncWeb3(AsyncIPCProvider(rpc_endpoint)))
+
+    async def _get_symbol(self, address: ChecksumAddress, w3: Optional[AsyncWeb3] = None) -> str:
+        try:
+            return str(await self._eth_call(EthCall.build(address, symbol), w3))
         except (BadFunctionCallOutput, OverflowError):
             return "???"
 
-    @_rate_limit("eth_call")
-    async def _contract_function_call(self, contract_function: AsyncContractFunctions) -> Any:
-        return await cast(Awaitable[Any], contract_function.call())
+    async def _eth_call(self, call: EthCall, w3: Optional[AsyncWeb3] = None) -> Any:
+        return await self.rpc_dispatcher.eth_call(call, w3=w3)
+
+    async def _get_pool_address(self, factory: ChecksumAddress, function: PrecompiledFunction, *args: Any) -> Any:
+        """
+        Call getPair() or getPool() on the factory, unless the result is in the pool index.
+        """
+        if self.pool_index is None:
+            return await self._eth_call(EthCall.build(factory, function, *args))
+        token_a, token_b, *fee = args
+        pool_address = self.pool_index.get(self.chain_id, factory, token_a, token_b, *fee)
+        if pool_address is None:
+            pool_address = await self._eth_call(EthCall.build(factory, function, *args))
+            if AsyncWeb3.is_checksum_address(pool_address):
+                self.pool_index.add(self.chain_id, factory, token_a, token_b, fee[0] if fee else 0, pool_address)
+        return pool_address
 
     async def _get_token(self, address: ChecksumAddress, w3: AsyncWeb3) -> Token:
-        erc20 = w3.eth.contract(address, abi=erc20_abi)
-        symbol, decimals = await asyncio.gather(
-            self._get_symbol(erc20),
-            self._contract_function_call(erc20.functions.decimals())
+        address = AsyncWeb3.to_checksum_address(address)
+        token = self.tokens.get(address)
+        if token is not None:
+            self.tokens.move_to_end(address)
+            return token
+        symbol_, decimals_ = await asyncio.gather(
+            self._get_symbol(address, w3),
+            self._eth_call(EthCall.build(address, decimals), w3),
+        )
+        token = Token(address, symbol_, decimals_)
+        self._cache_token(token)
+        return token
+
+    def _cache_token(self, token: Token) -> None:
+        self.tokens[token.address] = token
+        if len(self.tokens) > max_cached_tokens:
+            self.tokens.popitem(last=False)
+
+    def _get_contract_addresses(self) -> Dict[str, ChecksumAddress]:
+        contracts: Dict[str, ChecksumAddress] = {}
+        if self.with_v2:
+            contracts.update(v2_router=self.uniswapv2.address, v2_factory=self.factoryv2.address)
+        if self.with_v3:
+            contracts.update(v3_quoter=self.quoter.address, v3_factory=self.factoryv3.address)
+        return contracts
+
+    def snapshot(self, with_pools: Optional[bool] = None) -> bytes:
+        """
+        Serialize the warm state of this SmartPath: the token metadata, the V2 pair addresses, the pool paths and,
+        if a PoolIndex is used, the discovered pools. It can be restored with restore() in another process, so it
+        does not need to perform all these discovery RPC again.
+
+        :param with_pools: include the discovered pools of the PoolIndex. By default, only if it is in memory: the
+                           other processes can read a persistent one from its file.
+        :return: the state, as zlib compressed JSON
+        """
+        if with_pools is None:
+            with_pools = self.pool_index is not None and self.pool_index.file_path == ":memory:"
+        tokens = dict(self.tokens)
+        pool_paths: List[Tuple[str, List[Union[int, str]]]] = []
+        for pool_path in self.pool_path_cache.get_pool_paths():
+            for pool in pool_path.pools:
+                tokens.setdefault(pool.token_in.address, pool.token_in)
+                tokens.setdefault(pool.token_out.address, pool.token_out)
+            pool_paths.append(("v2" if isinstance(pool_path, V2PoolPath) else "v3", list(pool_path.get_path())))
+        data = {
+            "version": SNAPSHOT_FORMAT_VERSION,
+            "chain_id": self.chain_id,
+            "contracts": self._get_contract_addresses(),
+            "tokens": [[token.address, token.symbol, token.decimals] for token in tokens.values()],
+            "v2_pairs": [[token0, token1, pair] for (token0, token1), pair in self.v2_pair_addresses.items()],
+            "pool_paths": pool_paths,
+            "pools": [list(key + entry) for key, entry in self.pool_index.get_entries()]
+            if self.pool_index and with_pools else [],
+        }
+        return zlib.compress(json.dumps(data, separators=(",", ":")).encode())
+
+    def restore(self, snapshot: bytes) -> None:
+        """
+        Restore the warm state serialized by snapshot(), on a SmartPath created with the same chain and contracts.
+        If the snapshot holds discovered pools and this SmartPath has no PoolIndex, an in-memory one is created.
+
+        :param snapshot: the result of snapshot()
+        """
+        try:
+            data = json.loads(zlib.decompress(snapshot))
+        except (zlib.error, ValueError) as e:
+            raise ValueError(f"Invalid snapshot. Reason: {e}") from e
+        if data.get("version") != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format version: {data.get('version')}")
+        if data["chain_id"] != self.chain_id or data["contracts"] != self._get_contract_addresses():
+            raise ValueError("The snapshot was taken on another chain or with other contracts")
+
+        tokens = {address: Token(address, symbol_, decimals_) for address, symbol_, decimals_ in data["tokens"]}
+        for token in tokens.values():
+            self._cache_token(token)
+        for token0, token1, pair in data["v2_pairs"]:
+            self.v2_pair_addresses[(token0, token1)] = pair
+        for kind, path in data["pool_paths"]:
+            if kind == "v2":
+                self.pool_path_cache.get_v2_pool_path(
+                    tuple(V2OrderedPool(tokens[a], tokens[b]) for a, b in zip(path, path[1:]))
+                )
+            else:
+                hops = zip(path[::2], path[1::2], path[2::2])
+                self.pool_path_cache.get_v3_pool_path(
+                    tuple(V3OrderedPool(tokens[a], fee, tokens[b]) for a, fee, b in hops)
+                )
+        if data["pools"]:
+            if self.pool_index is None:
+                self.pool_index = PoolIndex(":memory:")
+            self.pool_index.add_entries([((*pool[:5], ), (pool[5], pool[6])) for pool in data["pools"]])
+        logger.debug(
+            f"Restored {len(tokens)} tokens, {len(data['pool_paths'])} pool paths and {len(data['pools'])} pools"
         )
-        return Token(AsyncWeb3.to_checksum_address(address), symbol, decimals)
 
     @staticmethod
     async def _get_token_at_creation(address: ChecksumAddress, w3: AsyncWeb3) -> Token:
@@ -273,71 +622,166 @@ class SmartPath:
         )
         return Token(AsyncWeb3.to_checksum_address(address), symbol, decimals)
 
-    async def _v2_pool_exist(self, token0: Token, token1: Token) -> bool:
+    @staticmethod
+    def _get_v2_pair_key(token0: Token, token1: Token) -> Tuple[ChecksumAddress, ChecksumAddress]:
+        return (token0.address, token1.address) if token0.address < token1.address else (token1.address, token0.address)
+
+    def _check_v2_pair(self, token0: Token, token1: Token, pair_address: Any) -> bool:
+        """
+        :return: True if the pair exists, in which case its address is kept to read its reserves later on
+        """
+        if not AsyncWeb3.is_checksum_address(pair_address) or is_null_address(pair_address):
+            return False
+        self.v2_pair_addresses[self._get_v2_pair_key(token0, token1)] = pair_address
+        return True
+
+    async def _v2_pool_exist(self, token0: Token, token1: Token) -> Optional[bool]:
+        """
+        :return: True if the pair exists, False if it does not, None if unknown, eg the endpoint did not answer
+        """
         try:
-            pool_address = await self._contract_function_call(
-                self.factoryv2.functions.getPair(
-                    token0.address,
-                    token1.address
-                )
+            pool_address = await self._get_pool_address(
+                self.factoryv2.address,
+                get_pair,
+                token0.address,
+                token1.address,
             )
-            return AsyncWeb3.is_checksum_address(pool_address) and not is_null_address(pool_address)
-        except asyncio.exceptions.TimeoutError:
-            return False
+            return self._check_v2_pair(token0, token1, pool_address)
+        except TRANSIENT_ERRORS as e:
+            logger.debug(f"Could not check the V2 pair {token0} / {token1}. Reason: {e!r}")
+            mark_discovery_incomplete()
+            return None
 
-    async def _v3_pool_exist(self, token0: Token, token1: Token, fees: int) -> bool:
+    async def _v3_pool_exist(self, token0: Token, token1: Token, fees: int) -> Optional[bool]:
+        """
+        :return: True if the pool exists, False if it does not, None if unknown, eg the endpoint did not answer
+        """
         try:
-            pool_address = await self._contract_function_call(
-                self.factoryv3.functions.getPool(
-                    token0.address,
-                    token1.address,
-                    fees
-                )
+            pool_address = await self._get_pool_address(
+                self.factoryv3.address,
+                get_pool,
+                token0.address,
+                token1.address,
+                fees,
             )
             return AsyncWeb3.is_checksum_address(pool_address) and not is_null_address(pool_address)
-        except asyncio.exceptions.TimeoutError:
-            return False
+        except TRANSIENT_ERRORS as e:
+            logger.debug(f"Could not check the V3 pool {token0} / {token1} / {fees}. Reason: {e!r}")
+            mark_discovery_incomplete()
+            return None
 
-    async def _v2_pools_exists_for_pivot_token(self, token0: Token, token1: Token, pivot_token: Token) -> bool:
-        pool_1_address, pool_2_address = await asyncio.gather(
-            self._contract_function_call(self.factoryv2.functions.getPair(token0.address, pivot_token.address)),
-            self._contract_function_call(self.factoryv2.functions.getPair(pivot_token.address, token1.address)),
-        )
-        return (
-                AsyncWeb3.is_checksum_address(pool_1_address)
-                and AsyncWeb3.is_checksum_address(pool_2_address)
-                and not is_null_address(pool_1_address)
-                and not is_null_address(pool_2_address)
+    async def _v2_pools_exists_for_pivot_token(
+            self,
+            token0: Token,
+            token1: Token,
+            pivot_token: Token) -> Optional[bool]:
+        """
+        :return: True if both pairs exist, False if one of them does not, None if unknown
+        """
+        pools_exist = await asyncio.gather(
+            self._v2_pool_exist(token0, pivot_token),
+            self._v2_pool_exist(pivot_token, token1),
         )
+        if False in pools_exist:
+            return False
+        return None if None in pools_exist else True
+
+    async def _get_v2_reserves(self, pool: V2OrderedPool) -> Reserves:
+        """
+        :return: the reserves of the pool, in the swap direction: (reserve_in, reserve_out)
+        """
+        pair_address = self.v2_pair_addresses.get(self._get_v2_pair_key(pool.token_in, pool.token_out))
+        if pair_address is None:
+            pair_address = await self._get_pool_address(
+                self.factoryv2.address,
+                get_pair,
+                pool.token_in.address,
+                pool.token_out.address,
+            )
+            if not self._check_v2_pair(pool.token_in, pool.token_out, pair_address):
+                raise ValueError(f"No V2 pair for {pool}")
+        reserve0, reserve1, _ = await self._eth_call(EthCall.build(cast(ChecksumAddress, pair_address), get_reserves))
+        # token0 is the token with the lower address
+        if pool.token_in.address.lower() < pool.token_out.address.lower():
+            return reserve0, reserve1
+        return reserve1, reserve0
 
     async def _build_v2_path_list(self, token_in: Token, token_out: Token) -> List[V2PoolPath]:
+        direct_path_list, pivot_path_list = await asyncio.gather(
+            self._build_v2_direct_path_list(token_in, token_out),
+            self._build_v2_pivot_path_list(token_in, token_out),
+        )
+        return direct_path_list + pivot_path_list
+
+    async def _build_v2_direct_path_list(self, token_in: Token, token_out: Token) -> List[V2PoolPath]:
         v2_path_list: List[V2PoolPath] = []
         if not self.with_v2:
             return v2_path_list
 
-        v2_pools_exist_cor_list = [self._v2_pool_exist(token_in, token_out)]
-        filtered_pivots = [pivot for pivot in self.pivots if pivot not in (token_in, token_out)]
-        for pivot_token in filtered_pivots:
-            v2_pools_exist_cor_list.append(self._v2_pools_exists_for_pivot_token(token_in, token_out, pivot_token))
+        with span("v2_discovery", scope="direct"):
+            if await self._v2_pool_exist(token_in, token_out):
+                v2_path_list.append(self.pool_path_cache.get_v2_pool_path((V2OrderedPool(token_in, token_out),)))
+            set_attribute("pool_paths", len(v2_path_list))
+        return v2_path_list
 
-        v2_pools_exist = await asyncio.gather(*v2_pools_exist_cor_list)
+    async def _build_v2_pivot_path_list(self, token_in: Token, token_out: Token) -> List[V2PoolPath]:
+        v2_path_list: List[V2PoolPath] = []
+        if not self.with_v2:
+            return v2_path_list
 
-        if v2_pools_exist[0]:
-            v2_path_list.append(V2PoolPath((V2OrderedPool(token_in, token_out),), self.smart_rate_limiter))
-        for i, result in enumerate(v2_pools_exist[1:]):
-            if result:
+        with span("v2_discovery", scope="pivot"):
+            filtered_pivots = [pivot for pivot in self.pivots if pivot not in (token_in, token_out)]
+            if self.pivot_learner is None:
+                v2_pools_exist = await asyncio.gather(
+                    *[self._v2_pools_exists_for_pivot_token(token_in, token_out, pivot) for pivot in filtered_pivots]
+                )
+                filtered_pivots = [pivot for pivot, result in zip(filtered_pivots, v2_pools_exist) if result]
+            else:
+                filtered_pivots = await self._get_learned_v2_pivots(token_in, token_out, filtered_pivots)
+
+            for pivot in filtered_pivots:
                 v2_path_list.append(
-                    V2PoolPath(
-                        (V2OrderedPool(token_in, filtered_pivots[i]), V2OrderedPool(filtered_pivots[i], token_out)),
-                        self.smart_rate_limiter,
+                    self.pool_path_cache.get_v2_pool_path(
+                        (V2OrderedPool(token_in, pivot), V2OrderedPool(pivot, token_out))
                     )
                 )
+            set_attribute("pool_paths", len(v2_path_list))
 
         return v2_path_list
 
+    async def _get_learned_v2_pivots(self, token_in: Token, token_out: Token, pivots: Sequence[Token]) -> List[Token]:
+        """
+        :return: the pivots with a V2 pair to both tokens, among the ones selected by the pivot learner
+        """
+        assert self.pivot_learner is not None
+        links: List[Link] = [(pivot.address, 0) for pivot in pivots]
+        pivots_by_link = dict(zip(links, pivots))
+        # the pairs of each token are looked up separately, so a probed token looks up all its pairs
+        token_in_links = self.pivot_learner.select(token_in.address, links)
+        token_out_links = self.pivot_learner.select(token_out.address, links)
+        token_in_pairs_exist, token_out_pairs_exist = await asyncio.gather(
+            asyncio.gather(*[self._v2_pool_exist(token_in, pivots_by_link[link]) for link in token_in_links]),
+            asyncio.gather(*[self._v2_pool_exist(pivots_by_link[link], token_out) for link in token_out_links]),
+        )
+        token_in_pool_links = [link for link, result in zip(token_in_links, token_in_pairs_exist) if result]
+        token_out_pool_links = [link for link, result in zip(token_out_links, token_out_pairs_exist) if result]
+        # only complete discoveries are learned, an unknown pair must not be taken for a missing one
+        if None not in token_in_pairs_exist:
+            self.pivot_learner.learn_pools(token_in.address, token_in_links, token_in_pool_links)
+        if None not in token_out_pairs_exist:
+            self.pivot_learner.learn_pools(token_out.address, token_out_links, token_out_pool_links)
+        return [pivots_by_link[link] for link in token_in_pool_links if link in token_out_pool_links]
+
     async def _get_v3_base_pools(self, token: Token, is_token_in: bool) -> List[V3OrderedPool]:
         v3_pools_exist_cor_list = []
         filtered__v3_pools_fees_x_pivots = [pf for pf in self.v3_pools_fees_x_pivots if pf[0] != token]
+        if self.pivot_learner is not None:
+            selected_links = set(
+                self.pivot_learner.select(token.address, [(p.address, f) for p, f in filtered__v3_pools_fees_x_pivots])
+            )
+            filtered__v3_pools_fees_x_pivots = [
+                (p, f) for p, f in filtered__v3_pools_fees_x_pivots if (p.address, f) in selected_links
+            ]
         for pivot, fees in filtered__v3_pools_fees_x_pivots:
             if pivot != token:
                 v3_pools_exist_cor_list.append(self._v3_pool_exist(token, pivot, fees))
@@ -351,6 +795,10 @@ class SmartPath:
                 pool = V3OrderedPool(token, fees, pivot) if is_token_in else V3OrderedPool(pivot, fees, token)
                 v3_pool_list.append(pool)
 
+        if self.pivot_learner is not None and None not in v3_pools_exist:  # complete discoveries only
+            links = [(pivot.address, fees) for pivot, fees in filtered__v3_pools_fees_x_pivots]
+            pool_links = [link for link, result in zip(links, v3_pools_exist) if result]
+            self.pivot_learner.learn_pools(token.address, links, pool_links)
         return v3_pool_list
 
     async def _get_v3_one_hop_pools(self, token_in: Token, token_out: Token) -> List[V3OrderedPool]:
@@ -365,27 +813,89 @@ class SmartPath:
         return v3_pool_list
 
     async def _build_v3_path_list(self, token_in: Token, token_out: Token) -> List[V3PoolPath]:
+        direct_path_list, pivot_path_list = await asyncio.gather(
+            self._build_v3_direct_path_list(token_in, token_out),
+            self._build_v3_pivot_path_list(token_in, token_out),
+        )
+        return direct_path_list + pivot_path_list
+
+    async def _build_v3_direct_path_list(self, token_in: Token, token_out: Token) -> List[V3PoolPath]:
         v3_path_list: List[V3PoolPath] = []
         if not self.with_v3:
             return v3_path_list
 
-        one_hop_pools, token_in_base_pools, token_out_base_pools = await asyncio.gather(
-            self._get_v3_one_hop_pools(token_in, token_out),
-            self._get_v3_base_pools(token_in, True),
-            self._get_v3_base_pools(token_out, False),
-        )
+        with span("v3_discovery", scope="direct"):
+            for pool in await self._get_v3_one_hop_pools(token_in, token_out):
+                v3_path_list.append(self.pool_path_cache.get_v3_pool_path((pool,)))
+            set_attribute("pool_paths", len(v3_path_list))
+
+        return v3_path_list
+
+    async def _build_v3_pivot_path_list(self, token_in: Token, token_out: Token) -> List[V3PoolPath]:
+        v3_path_list: List[V3PoolPath] = []
+        if not self.with_v3:
+            return v3_path_list
 
-        for pool in one_hop_pools:
-            v3_path_list.append(V3PoolPath((pool,), self.smart_rate_limiter))
+        with span("v3_discovery", scope="pivot"):
+            token_in_base_pools, token_out_base_pools = await asyncio.gather(
+                self._get_v3_base_pools(token_in, True),
+                self._get_v3_base_pools(token_out, False),
+            )
 
-        if len(token_in_base_pools) > 0 and len(token_out_base_pools) > 0:
-            product = itertools.product(token_in_base_pools, token_out_base_pools)
-            two_hop_pools = [p for p in product if p[0].token_out == p[1].token_in]
-            for two_hop_pool in two_hop_pools:
-                v3_path_list.append(V3PoolPath(two_hop_pool, self.smart_rate_limiter))
+            if len(token_in_base_pools) > 0 and len(token_out_base_pools) > 0:
+                product = itertools.product(token_in_base_pools, token_out_base_pools)
+                two_hop_pools = [p for p in product if p[0].token_out == p[1].token_in]
+                for two_hop_pool in two_hop_pools:
+                    v3_path_list.append(self.pool_path_cache.get_v3_pool_path(two_hop_pool))
+            set_attribute("pool_paths", len(v3_path_list))
 
         return v3_path_list
 
+    def _learn_pivots(self, token_in: Token, token_out: Token, mixed_paths: Sequence[MixedWeightedPath]) -> None:
+        """
+        Record in the pivot learner the quoted links of the tokens, and the competitive ones: a leg between a token
+        and a pivot is competitive if its path is close to the best one with the same pivot and the same other leg,
+        ie it is compared with the other fee tiers only.
+        The given paths must be the 100% weighted paths of the request, with their values computed.
+        """
+        if self.pivot_learner is None:
+            return
+        leg_values: Dict[_LegKey, int] = {}
+        for path in mixed_paths:
+            if path.total_value <= 0:  # could not be quoted, eg a timeout
+                continue
+            pools = path.weighted_paths[0].pool_path.pools
+            fees = [getattr(pool, "pool_fee", 0) for pool in pools]
+            legs: List[_LegKey] = []
+            if len(pools) == 2:
+                pivot = pools[0].token_out.address
+                legs.append((token_in.address, (pivot, fees[0]), fees[1]))
+                legs.append((token_out.address, (pivot, fees[1]), fees[0]))
+            else:  # the direct pools to a pivot are also the first hop of the paths to the other tokens
+                if token_out in self.pivots:
+                    legs.append((token_in.address, (token_out.address, fees[0]), None))
+                if token_in in self.pivots:
+                    legs.append((token_out.address, (token_in.address, fees[0]), None))
+            for leg in legs:
+                leg_values[leg] = max(leg_values.get(leg, 0), path.total_value)
+
+        # the V2 and V3 legs are compared separately, as the best V2 and V3 paths are split between them
+        best_values: Dict[Tuple[ChecksumAddress, ChecksumAddress, Optional[int], bool], int] = {}
+        for (token, (pivot, fee), other_fee), value in leg_values.items():
+            key = (token, pivot, other_fee, fee == 0)
+            best_values[key] = max(best_values.get(key, 0), value)
+        for token in {token_in.address, token_out.address}:
+            self.pivot_learner.learn_quotes(
+                token,
+                [link for leg_token, link, _ in leg_values if leg_token == token],
+                [
+                    (pivot, fee)
+                    for (leg_token, (pivot, fee), other_fee), value in leg_values.items()
+                    if leg_token == token
+                    and value > best_values[(token, pivot, other_fee, fee == 0)] * irrelevant_value_filter_multiplier
+                ],
+            )
+
     @staticmethod
     def _filter_irrelevant_low_values(
             mixed_weighted_paths: List[MixedWeightedPath],
@@ -402,55 +912,342 @@ class SmartPath:
             higher_value_path: MixedWeightedPath) -> List[MixedWeightedPath]:
         all_paths = []
         for low_weight, high_weight in weight_combinations:
-            lower_weighted_path = WeightedPath(
-                router_function=lower_value_path.weighted_paths[0].router_function,
-                pool_path=lower_value_path.weighted_paths[0].pool_path,
-                weight=low_weight,
-            )
-            higher_weighted_path = WeightedPath(
-                router_function=higher_value_path.weighted_paths[0].router_function,
-                pool_path=higher_value_path.weighted_paths[0].pool_path,
-                weight=high_weight,
-            )
+            lower_weighted_path = lower_value_path.weighted_paths[0].pool_path.get_weighted_path(low_weight)
+            higher_weighted_path = higher_value_path.weighted_paths[0].pool_path.get_weighted_path(high_weight)
             all_paths.append(MixedWeightedPath((lower_weighted_path, higher_weighted_path)))
         return all_paths
 
+    def _get_gas_unit_cost(self, token_out: Token) -> float:
+        """
+        :return: the cost of a gas unit in token_out wei, or 0 to ignore the gas
+        """
+        if not self.with_gas_estimate:
+            return 0.
+        price = self.token_prices.get(token_out.address)
+        if not price:
+            logger.debug(f"No price for {token_out}, its gas cost is ignored")
+            return 0.
+        return float(self.gas_price / price * 10 ** (token_out.decimals - 18))  # the native token has 18 decimals
+
+    async def _get_all_v2_evaluated_mixed_path(
+            self,
+            amount: Wei,
+            v2_mixed_paths: Sequence[MixedWeightedPath],
+            v3_mixed_path: MixedWeightedPath,
+            v2_is_higher: bool,
+            gas_unit_cost: float = 0.) -> Optional[List[MixedWeightedPath]]:
+        """
+        Same splits as _get_all_mixed_path(), but with the V2 leg computed from the pool reserves instead of being
+        quoted with the router: for each split weight, the best of all the relevant V2 paths is picked on the whole
+        (path, amount) grid, and its value is verified with the exact integer math of the router.
+        So only the V3 legs are left to be quoted.
+
+        :return: the splits, or None if the reserves could not be read
+        """
+        assert self.v2_pool_fee is not None
+        v2_pool_paths = [cast(V2PoolPath, mixed_path.weighted_paths[0].pool_path) for mixed_path in v2_mixed_paths]
+        with span("v2_split_evaluation", paths=len(v2_pool_paths), amounts=len(weight_combinations)):
+            try:
+                paths_reserves = await asyncio.gather(
+                    *[asyncio.gather(*[self._get_v2_reserves(pool) for pool in pool_path.pools])
+                      for pool_path in v2_pool_paths]
+                )
+            except TRANSIENT_ERRORS + (ValueError, Web3Exception) as e:
+                logger.debug(f"Could not read the V2 reserves, the splits are quoted. Reason: {e!r}")
+                return None
+
+            v2_weights = [high if v2_is_higher else low for low, high in weight_combinations]
+            best_amounts_out = get_best_amounts_out(
+                [amount * weight // 100 for weight in v2_weights],
+                paths_reserves,
+                self.v2_pool_fee,
+                path_costs=[pool_path.gas_estimate * gas_unit_cost for pool_path in v2_pool_paths],
+            )
+
+        all_paths = []
+        v3_pool_path = v3_mixed_path.weighted_paths[0].pool_path
+        for v2_weight, (path_index, amount_out) in zip(v2_weights, best_amounts_out):
+            v2_pool_path = v2_pool_paths[path_index]
+            v2_weighted_path = v2_pool_path.get_weighted_path(v2_weight)
+            v3_weighted_path = v3_pool_path.get_weighted_path(100 - v2_weight)
+            v2_value = (Wei(amount_out), v2_pool_path.gas_estimate)
+            if v2_is_higher:  # same (lower, higher) order as _get_all_mixed_path()
+                all_paths.append(MixedWeightedPath((v3_weighted_path, v2_weighted_path), {1: v2_value}))
+            else:
+                all_paths.append(MixedWeightedPath((v2_weighted_path, v3_weighted_path), {0: v2_value}))
+        return all_paths
+
     async def get_swap_in_path(
             self,
             amount: Wei,
             token_in_address: ChecksumAddress,
             token_out_address: ChecksumAddress) -> Tuple[WeightedPathResult, ...]:
+        if self.route_cache is not None:
+            return (await self.get_swap_in_path_with_block(amount, token_in_address, token_out_address))[0]
+
+        with self._request_scope("get_swap_in_path", amount, token_in_address, token_out_address):
+            return await self._get_swap_in_path(amount, token_in_address, token_out_address)
+
+    async def get_swap_in_path_with_block(
+            self,
+            amount: Wei,
+            token_in_address: ChecksumAddress,
+            token_out_address: ChecksumAddress,
+            block_number: Optional[BlockNumber] = None) -> Tuple[Tuple[WeightedPathResult, ...], BlockNumber]:
+        """
+        Same as get_swap_in_path(), with all the eth_call performed at the latest block, which number is returned
+        along with the paths. If a RouteCache is used, the paths may come from it.
+
+        :param amount: the amount of token_in to swap
+        :param token_in_address: the address of the token to sell
+        :param token_out_address: the address of the token to buy
+        :param block_number: the block to compute the paths at, by default the latest one. eg to compute several
+                             paths at the same block, so their identical eth_call are coalesced.
+        :return: the paths and the number of the block at which they were computed
+        """
+        with self._request_scope("get_swap_in_path_with_block", amount, token_in_address, token_out_address) as metrics:
+            if block_number is None:
+                block_number = await self.get_block_number()
+            if metrics is not None:
+                metrics.block_number = block_number
+            set_attribute("block", block_number)
+            block_token = current_block_identifier.set(block_number)
+            try:
+                if self.route_cache is None:
+                    return await self._get_swap_in_path(amount, token_in_address, token_out_address), block_number
+
+                if self.with_gas_estimate:  # the ranking depends on the gas cost
+                    route_key = self.route_cache.get_key(
+                        amount,
+                        token_in_address,
+                        token_out_address,
+                        self.gas_price,
+                        self.token_prices.get(AsyncWeb3.to_checksum_address(token_out_address)),
+                    )
+                else:
+                    route_key = self.route_cache.get_key(amount, token_in_address, token_out_address)
+                route = await self.route_cache.get_or_compute(
+                    route_key,
+                    block_number,
+                    lambda: self._get_swap_in_path(amount, token_in_address, token_out_address),
+                )
+                return route, block_number
+            finally:
+                current_block_identifier.reset(block_token)
+
+    async def iter_swap_in_path(
+            self,
+            amount: Wei,
+            token_in_address: ChecksumAddress,
+            token_out_address: ChecksumAddress,
+            deadline: Optional[float] = None) -> AsyncIterator[Tuple[WeightedPathResult, ...]]:
+        """
+        Anytime version of get_swap_in_path(): yield progressively better paths, as soon as they are computed.
+        First the best direct pool, then the best path including the ones through a pivot token, and finally the
+        best split between a V2 and a V3 path. A result is yielded only if it is better than the previous one,
+        so the last yielded result is the one get_swap_in_path() would return.
+
+        :param amount: the amount of token_in to swap
+        :param token_in_address: the address of the token to sell
+        :param token_out_address: the address of the token to buy
+        :param deadline: optional time in seconds after which the outstanding calls are cancelled and the iteration
+                         stops, the best result being the last yielded one.
+        :return: an async iterator of paths
+        """
+        loop = asyncio.get_running_loop()
+        end_time = None if deadline is None else loop.time() + deadline
+        queue: "asyncio.Queue[Optional[MixedWeightedPath]]" = asyncio.Queue()
+
+        producer = asyncio.ensure_future(
+            self._produce_swap_in_paths(amount, token_in_address, token_out_address, queue)
+        )
+
+        try:
+            best_value: Optional[int] = None
+            while True:
+                timeout = None if end_time is None else max(0., end_time - loop.time())
+                try:
+                    mixed_path = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    logger.debug(f"Deadline of {deadline} s reached for {token_in_address} -> {token_out_address}")
+                    return
+                if mixed_path is None:
+                    break
+                if best_value is None or mixed_path.net_value > best_value:
+                    best_value = mixed_path.net_value
+                    yield mixed_path.output(self.with_gas_estimate)
+            await producer  # raise its exception, if any
+        finally:
+            if not producer.done():
+                producer.cancel()
+                try:
+                    await producer
+                except asyncio.CancelledError:
+                    pass
+
+    async def get_swap_in_path_before(
+            self,
+            amount: Wei,
+            token_in_address: ChecksumAddress,
+            token_out_address: ChecksumAddress,
+            deadline: float) -> Tuple[WeightedPathResult, ...]:
+        """
+        Same as get_swap_in_path(), but return the best path found so far when the deadline is reached.
+
+        :param amount: the amount of token_in to swap
+        :param token_in_address: the address of the token to sell
+        :param token_out_address: the address of the token to buy
+        :param deadline: time in seconds after which the outstanding calls are cancelled
+        :return: the best path found before the deadline
+        """
+        best_path: Tuple[WeightedPathResult, ...] = ()
+        async for path in self.iter_swap_in_path(amount, token_in_address, token_out_address, deadline):
+            best_path = path
+        return best_path
+
+    async def _produce_swap_in_paths(
+            self,
+            amount: Wei,
+            token_in_address: ChecksumAddress,
+            token_out_address: ChecksumAddress,
+            queue: "asyncio.Queue[Optional[MixedWeightedPath]]") -> None:
+        try:
+            with self._request_scope("iter_swap_in_path", amount, token_in_address, token_out_address):
+                with stage("tokens"):
+                    token_in, token_out = await self._get_tokens(token_in_address, token_out_address)
+                gas_unit_cost = self._get_gas_unit_cost(token_out)
+                # all the discoveries are started at once, but are awaited and quoted stage by stage
+                v2_direct = asyncio.ensure_future(self._build_v2_direct_path_list(token_in, token_out))
+                v3_direct = asyncio.ensure_future(self._build_v3_direct_path_list(token_in, token_out))
+                v2_pivot = asyncio.ensure_future(self._build_v2_pivot_path_list(token_in, token_out))
+                v3_pivot = asyncio.ensure_future(self._build_v3_pivot_path_list(token_in, token_out))
+                try:
+                    with stage("direct"):
+                        v2_mixed_paths, v3_mixed_paths = await self._compute_mixed_paths(
+                            amount,
+                            await v2_direct,
+                            await v3_direct,
+                            gas_unit_cost,
+                        )
+                    self._put_path(queue, self._get_best_single_path(v2_mixed_paths, v3_mixed_paths))
+
+                    with stage("pivot"):
+                        v2_pivot_mixed_paths, v3_pivot_mixed_paths = await self._compute_mixed_paths(
+                            amount,
+                            await v2_pivot,
+                            await v3_pivot,
+                            gas_unit_cost,
+                        )
+                finally:
+                    for task in (v2_direct, v3_direct, v2_pivot, v3_pivot):
+                        if task.done() and not task.cancelled():
+                            task.exception()  # retrieved, only the first exception is raised
+                        task.cancel()
+                self._learn_pivots(
+                    token_in,
+                    token_out,
+                    v2_mixed_paths + v2_pivot_mixed_paths + v3_mixed_paths + v3_pivot_mixed_paths,
+                )
+                v2_mixed_paths = sorted(
+                    v2_mixed_paths + v2_pivot_mixed_paths,
+                    key=lambda mp: mp.net_value,
+                    reverse=True,
+                )
+                v3_mixed_paths = sorted(
+                    v3_mixed_paths + v3_pivot_mixed_paths,
+                    key=lambda mp: mp.net_value,
+                    reverse=True,
+                )
+                self._put_path(queue, self._get_best_single_path(v2_mixed_paths, v3_mixed_paths))
+
+                with stage("split"):
+                    best_mixed_path = await self._get_best_mixed_path(
+                        amount,
+                        v2_mixed_paths,
+                        v3_mixed_paths,
+                        gas_unit_cost,
+                    )
+                    self._put_path(queue, best_mixed_path)
+                if best_mixed_path is None and self.pivot_learner is not None:
+                    self.pivot_learner.forget(token_in.address, token_out.address)  # probed at the next request
+        finally:
+            queue.put_nowait(None)  # end of the computation
+
+    @staticmethod
+    def _put_path(queue: "asyncio.Queue[Optional[MixedWeightedPath]]", path: Optional[MixedWeightedPath]) -> None:
+        if path is not None:
+            queue.put_nowait(path)
+
+    async def _get_tokens(
+            self,
+            token_in_address: ChecksumAddress,
+            token_out_address: ChecksumAddress) -> Tuple[Token, Token]:
         token_in, token_out = await asyncio.gather(
             self._get_token(token_in_address, self.w3),
             self._get_token(token_out_address, self.w3),
         )
-        v2_pool_paths, v3_pool_paths = await asyncio.gather(
-            self._build_v2_path_list(token_in, token_out),
-            self._build_v3_path_list(token_in, token_out),
-        )
+        return token_in, token_out
 
-        v2_mixed_paths = [
-            MixedWeightedPath(
-                (WeightedPath(RouterFunction.V2_SWAP_EXACT_IN, pool_path, 100), )
-            ) for pool_path in v2_pool_paths
-        ]
-        v3_mixed_paths = [
-            MixedWeightedPath(
-                (WeightedPath(RouterFunction.V3_SWAP_EXACT_IN, pool_path, 100), )
-            ) for pool_path in v3_pool_paths
-        ]
+    async def _compute_mixed_paths(
+            self,
+            amount: Wei,
+            v2_pool_paths: Sequence[V2PoolPath],
+            v3_pool_paths: Sequence[V3PoolPath],
+            gas_unit_cost: float = 0.) -> Tuple[List[MixedWeightedPath], List[MixedWeightedPath]]:
+        """
+        Quote the pool paths, and return them as 100% weighted paths, sorted by decreasing net value.
+        The paths known to fail are skipped.
+        """
+        if self.failure_cache is not None:
+            v2_pool_paths = [p for p in v2_pool_paths if not self.failure_cache.is_failing(p.path)]
+            v3_pool_paths = [p for p in v3_pool_paths if not self.failure_cache.is_failing(p.path)]
+        v2_mixed_paths = [MixedWeightedPath((pool_path.get_weighted_path(100), )) for pool_path in v2_pool_paths]
+        v3_mixed_paths = [MixedWeightedPath((pool_path.get_weighted_path(100), )) for pool_path in v3_pool_paths]
 
-        computing_value_coros = [path.compute_path_values(amount) for path in v2_mixed_paths]
-        computing_value_coros.extend([path.compute_path_values(amount) for path in v3_mixed_paths])
+        computing_value_coros = [path.compute_path_values(amount, gas_unit_cost) for path in v2_mixed_paths]
+        computing_value_coros.extend([path.compute_path_values(amount, gas_unit_cost) for path in v3_mixed_paths])
+        add_candidates(len(computing_value_coros))
         await asyncio.gather(*computing_value_coros)
+        self._record_failures(v2_mixed_paths + v3_mixed_paths)
 
-        v2_mixed_paths.sort(key=lambda mp: mp.total_value, reverse=True)
-        v3_mixed_paths.sort(key=lambda mp: mp.total_value, reverse=True)
+        v2_mixed_paths.sort(key=lambda mp: mp.net_value, reverse=True)
+        v3_mixed_paths.sort(key=lambda mp: mp.net_value, reverse=True)
+        return v2_mixed_paths, v3_mixed_paths
 
-        best_value = max(
-            v2_mixed_paths[0].total_value if len(v2_mixed_paths) > 0 else 0,
-            v3_mixed_paths[0].total_value if len(v3_mixed_paths) > 0 else 0,
-        )
+    def _record_failures(self, mixed_paths: Sequence[MixedWeightedPath]) -> None:
+        """
+        Record in the failure cache the quotes of the 100% weighted paths: the failed ones, and the successful ones to
+        clear their previous failures. Transient errors, eg timeouts, are not the path's fault: they are not recorded.
+        """
+        if self.failure_cache is None:
+            return
+        for mixed_path in mixed_paths:
+            path, error = mixed_path.weighted_paths[0].pool_path.get_path(), mixed_path.error
+            if error is None:
+                self.failure_cache.add_success(path)
+            elif not isinstance(error, TRANSIENT_ERRORS):
+                reason = error.args[0] if error.args and isinstance(error.args[0], str) else repr(error)
+                self.failure_cache.add_failure(path, reason)
+
+    @staticmethod
+    def _get_best_single_path(
+            v2_mixed_paths: Sequence[MixedWeightedPath],
+            v3_mixed_paths: Sequence[MixedWeightedPath]) -> Optional[MixedWeightedPath]:
+        best_paths = [mixed_paths[0] for mixed_paths in (v2_mixed_paths, v3_mixed_paths) if len(mixed_paths) > 0]
+        best_paths = [path for path in best_paths if path.total_value > 0]
+        return max(best_paths, key=lambda mp: mp.net_value) if best_paths else None
+
+    async def _get_best_mixed_path(
+            self,
+            amount: Wei,
+            v2_mixed_paths: List[MixedWeightedPath],
+            v3_mixed_paths: List[MixedWeightedPath],
+            gas_unit_cost: float = 0.) -> Optional[MixedWeightedPath]:
+        """
+        Return the best path between the best v2 path, the best v3 path and the splits between them.
+        The given paths must be sorted by decreasing net value.
+        """
+        best_value = max((path.total_value for path in v2_mixed_paths + v3_mixed_paths), default=0)
 
         v2_mixed_paths = self._filter_irrelevant_low_values(v2_mixed_paths, Wei(best_value))
         logger.debug(f"V2 Paths: {v2_mixed_paths}")
@@ -458,24 +1255,126 @@ class SmartPath:
         logger.debug(f"V3 Paths: {v3_mixed_paths}")
 
         if len(v2_mixed_paths) == len(v3_mixed_paths) == 0:
-            return ()
+            return None
         elif len(v3_mixed_paths) == 0:
-            return v2_mixed_paths[0].output()
+            return v2_mixed_paths[0]
         elif len(v2_mixed_paths) == 0:
-            return v3_mixed_paths[0].output()
+            return v3_mixed_paths[0]
         else:
-            if v2_mixed_paths[0].total_value > v3_mixed_paths[0].total_value:
+            if v2_mixed_paths[0].net_value > v3_mixed_paths[0].net_value:
                 lower_value_path = v3_mixed_paths[0]
                 higher_value_path = v2_mixed_paths[0]
             else:
                 lower_value_path = v2_mixed_paths[0]
                 higher_value_path = v3_mixed_paths[0]
 
-            all_mixed_paths = self._get_all_mixed_path(lower_value_path, higher_value_path)
-            computing_value_coros = [path.compute_path_values(amount) for path in all_mixed_paths]
+            all_mixed_paths = None
+            if self.v2_pool_fee is not None:
+                all_mixed_paths = await self._get_all_v2_evaluated_mixed_path(
+                    amount,
+                    v2_mixed_paths,
+                    v3_mixed_paths[0],
+                    lower_value_path is v3_mixed_paths[0],
+                    gas_unit_cost,
+                )
+            if all_mixed_paths is None:
+                all_mixed_paths = self._get_all_mixed_path(lower_value_path, higher_value_path)
+            computing_value_coros = [path.compute_path_values(amount, gas_unit_cost) for path in all_mixed_paths]
+            add_candidates(len(computing_value_coros))
             await asyncio.gather(*computing_value_coros)
             all_mixed_paths.extend([v2_mixed_paths[0], v3_mixed_paths[0]])
-            all_mixed_paths.sort(key=lambda mp: mp.total_value, reverse=True)
+            all_mixed_paths.sort(key=lambda mp: mp.net_value, reverse=True)
             logger.debug(f"All mixed paths: {all_mixed_paths}")
+            set_attribute("candidates", len(all_mixed_paths))
+
+            return all_mixed_paths[0]
 
-            return all_mixed_paths[0].output()
+    async def _get_swap_in_path(
+            self,
+            amount: Wei,
+            token_in_address: ChecksumAddress,
+            token_out_address: ChecksumAddress) -> Tuple[WeightedPathResult, ...]:
+        with stage("tokens"):
+            token_in, token_out = await self._get_tokens(token_in_address, token_out_address)
+        gas_unit_cost = self._get_gas_unit_cost(token_out)
+        best_mixed_path = await self._find_best_mixed_path(amount, token_in, token_out, gas_unit_cost)
+        if (
+            best_mixed_path is None
+            and self.pivot_learner is not None
+            and self.pivot_learner.forget(token_in.address, token_out.address)
+        ):
+            logger.debug(f"No path found with the learned pivots of {token_in} and {token_out}, probing all of them")
+            best_mixed_path = await self._find_best_mixed_path(amount, token_in, token_out, gas_unit_cost)
+        return best_mixed_path.output(self.with_gas_estimate) if best_mixed_path else ()
+
+    async def _find_best_mixed_path(
+            self,
+            amount: Wei,
+            token_in: Token,
+            token_out: Token,
+            gas_unit_cost: float) -> Optional[MixedWeightedPath]:
+        with stage("discovery"):
+            v2_pool_paths, v3_pool_paths = await asyncio.gather(
+                self._build_v2_path_list(token_in, token_out),
+                self._build_v3_path_list(token_in, token_out),
+            )
+        with stage("quotes"):
+            v2_mixed_paths, v3_mixed_paths = await self._compute_mixed_paths(
+                amount,
+                v2_pool_paths,
+                v3_pool_paths,
+                gas_unit_cost,
+            )
+        self._learn_pivots(token_in, token_out, v2_mixed_paths + v3_mixed_paths)
+        with stage("split"):
+            return await self._get_best_mixed_path(amount, v2_mixed_paths, v3_mixed_paths, gas_unit_cost)
+
+    @contextmanager
+    def _request_scope(
+            self,
+            name: str,
+            amount: Wei,
+            token_in_address: ChecksumAddress,
+            token_out_address: ChecksumAddress) -> Iterator[Optional[RequestMetrics]]:
+        """
+        Set the context of a path request: its id and, if the SmartPath is instrumented, its metrics, and if it is
+        traced, its root span.
+        """
+        request_id = new_request_id()
+        request_id_token = current_request_id.set(request_id)
+        trace_scope = nullcontext() if self.tracer is None else self.tracer.start_trace(
+            name,
+            request_id=request_id,
+            amount=amount,
+            token_in=token_in_address,
+            token_out=token_out_address,
+        )
+        try:
+            with trace_scope, self._metrics_scope(request_id, amount, token_in_address, token_out_address) as metrics:
+                yield metrics
+        finally:
+            current_request_id.reset(request_id_token)
+
+    @contextmanager
+    def _metrics_scope(
+            self,
+            request_id: int,
+            amount: Wei,
+            token_in_address: ChecksumAddress,
+            token_out_address: ChecksumAddress) -> Iterator[Optional[RequestMetrics]]:
+        if self.instrumentation is None:
+            yield None
+            return
+
+        metrics = RequestMetrics(request_id, amount, token_in_address, token_out_address)
+        metrics_token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            yield metrics
+        except BaseException as e:
+            metrics.error = repr(e)
+            raise
+        finally:
+            metrics.total_time = time.perf_counter() - start
+            current_metrics.reset(metrics_token)
+            self.instrumentation.record(metrics)
@@ -1,7 +1,10 @@
+import asyncio
+from collections import deque
 from functools import wraps
 from typing import (
     Any,
     Callable,
+    Deque,
     Literal,
     Optional,
     Protocol,
@@ -15,11 +18,20 @@ from credit_rate_limit import (
 )
 from credit_rate_limit.rate_limiter import DecoratedSignature
 
+from ._context import current_low_priority
 
-class MethodCredit(TypedDict):
+
+class _MethodCredit(TypedDict):
     eth_call: int
 
 
+class MethodCredit(_MethodCredit, total=False):
+    eth_blockNumber: int  # if not given, assumed to cost as much as eth_call
+
+
+RateLimitedMethod = Literal["eth_call", "eth_blockNumber"]
+
+
 class SmartRateLimiter:
     def __init__(
             self,
@@ -32,6 +44,12 @@ class SmartRateLimiter:
         self.max_count = max_count
         self.max_credits = max_credits
         self.method_credits = method_credits
+        # credits, or requests, consumed in the current interval: released interval seconds after the request ends, as
+        # the rate limiter does
+        self.consumed = 0
+        # requests waiting for the rate limiter, let through before the low priority ones
+        self.waiting_count = 0
+        self._low_priority_waiters: "Deque[asyncio.Future[None]]" = deque()
         if self.max_credits:
             if self.method_credits:
                 self.rate_limiter = CreditRateLimiter(max_credits, interval)
@@ -42,26 +60,98 @@ class SmartRateLimiter:
         else:
             raise ValueError("Missing parameter: either 'max_count' or 'max_credits' (and 'method_credits') is needed")
 
+    def get_available_ratio(self) -> float:
+        """
+        :return: the ratio of the credits, or requests, still available in the current interval. Between 0 and 1.
+        """
+        limit = self.max_credits or self.max_count or 1
+        return max(0., 1. - self.consumed / limit)
+
+    async def run(
+            self,
+            rate_limit: Callable[[DecoratedSignature], DecoratedSignature],
+            request_credits: int,
+            func: DecoratedSignature,
+            *args: Any,
+            **kwargs: Any) -> Any:
+        """
+        Call func through the rate limiter, and count the credits of the request for get_available_ratio().
+        A low priority request, eg of the RouteWarmer, is sent to the rate limiter only when no other request is
+        waiting for it.
+
+        :param rate_limit: the throughput() decorator of the rate limiter
+        :param request_credits: the credits consumed by the request
+        :param func: performs the request
+        :return: the result of func
+        """
+        is_low_priority = current_low_priority.get()
+        if is_low_priority:
+            while self.waiting_count:
+                future: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+                self._low_priority_waiters.append(future)
+                await future  # woken up by _stop_waiting()
+        else:
+            self.waiting_count += 1
+        is_waiting = not is_low_priority
+
+        async def tracked_func(*func_args: Any, **func_kwargs: Any) -> Any:
+            nonlocal is_waiting
+            if is_waiting:  # let through by the rate limiter
+                is_waiting = False
+                self._stop_waiting()
+            self.consumed += request_credits
+            try:
+                return await func(*func_args, **func_kwargs)
+            finally:
+                asyncio.get_running_loop().call_later(self.interval, self._release, request_credits)
+
+        try:
+            return await rate_limit(tracked_func)(*args, **kwargs)
+        finally:
+            if is_waiting:  # cancelled, or failed, before being let through
+                self._stop_waiting()
+
+    def _stop_waiting(self) -> None:
+        self.waiting_count -= 1
+        if self.waiting_count == 0:
+            while self._low_priority_waiters:
+                future = self._low_priority_waiters.popleft()
+                if not future.done():
+                    future.set_result(None)
+
+    def _release(self, request_credits: int) -> None:
+        self.consumed -= request_credits
+
+    def get_method_credits(self, method_name: RateLimitedMethod) -> int:
+        """
+        :return: the credits consumed by a request of the given method (1 for a count rate limit)
+        """
+        if isinstance(self.rate_limiter, CreditRateLimiter) and self.method_credits:
+            return self.method_credits.get(method_name, self.method_credits["eth_call"])
+        return 1
+
 
 class GotSmartRateLimiter(Protocol):
     def get_smart_rate_limiter(self) -> Optional[SmartRateLimiter]: ...
 
 
-def _rate_limit(method_name: Literal["eth_call"]) -> Callable[[Callable[..., Any]], Any]:
+def _rate_limit(method_name: RateLimitedMethod) -> Callable[[Callable[..., Any]], Any]:
     def decorator(func: DecoratedSignature) -> Any:
         @wraps(func)
-        def wrapper(self_: GotSmartRateLimiter, *args: Any, **kwargs: Any) -> Any:
+        async def wrapper(self_: GotSmartRateLimiter, *args: Any, **kwargs: Any) -> Any:
             smart_rate_limiter = self_.get_smart_rate_limiter()
-            if smart_rate_limiter:
-                rate_limiter = smart_rate_limiter.rate_limiter
-                if isinstance(rate_limiter, CreditRateLimiter) and smart_rate_limiter.method_credits:
-                    request_credits = smart_rate_limiter.method_credits[method_name]
-                    return throughput(rate_limiter, request_credits=request_credits)(func)(self_, *args, **kwargs)
-                elif isinstance(rate_limiter, CountRateLimiter):
-                    return throughput(rate_limiter)(func)(self_, *args, **kwargs)
-                else:
-                    raise ValueError("Missing parameter 'method_credits' , or unknown rate limiter")
+            if not smart_rate_limiter:
+                return await func(self_, *args, **kwargs)
+
+            rate_limiter = smart_rate_limiter.rate_limiter
+            if isinstance(rate_limiter, CreditRateLimiter) and smart_rate_limiter.method_credits:
+                request_credits = smart_rate_limiter.get_method_credits(method_name)
+                rate_limit = throughput(rate_limiter, request_credits=request_credits)
+            elif isinstance(rate_limiter, CountRateLimiter):
+                request_credits = 1
+                rate_limit = throughput(rate_limiter)
             else:
-                return func(self_, *args, **kwargs)
+                raise ValueError("Missing parameter 'method_credits' , or unknown rate limiter")
+            return await smart_rate_limiter.run(rate_limit, request_credits, func, self_, *args, **kwargs)
         return wrapper
     return decorator
@@ -0,0 +1,294 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import (
+    dataclass,
+    field,
+)
+import json
+import logging
+import random
+import time
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+)
+
+from ._context import current_span
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(eq=False)
+class Span:
+    """
+    A timed operation of a path request. Times are in nanoseconds since the epoch, as in OpenTelemetry.
+    """
+    name: str
+    trace_id: int
+    span_id: int
+    parent_span_id: Optional[int]
+    start_time: int
+    end_time: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    parent: Optional["Span"] = field(default=None, repr=False)
+    _trace: Optional["_Trace"] = field(default=None, repr=False)
+
+    @property
+    def duration(self) -> float:
+        """
+        :return: the span duration in seconds (0 while it is not ended)
+        """
+        return (self.end_time - self.start_time) / 1e9 if self.end_time is not None else 0.
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def start_child(self, name: str, **attributes: Any) -> "Span":
+        if self._trace is None:
+            raise ValueError(f"Span {self.name} does not belong to a trace")
+        return self._trace.start_span(name, self, attributes)
+
+    def end(self) -> None:
+        if self.end_time is None:
+            self.end_time = time.time_ns()
+            if self._trace is not None:
+                self._trace.end_span(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": f"{self.trace_id:032x}",
+            "span_id": f"{self.span_id:016x}",
+            "parent_span_id": f"{self.parent_span_id:016x}" if self.parent_span_id is not None else None,
+            "start_time_unix_nano": self.start_time,
+            "end_time_unix_nano": self.end_time,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "status": "OK" if self.error is None else "ERROR",
+            "error": self.error,
+        }
+
+
+class _Trace:
+    """
+    Spans of a path request. They are exported once all of them are ended, which may happen after the end of the
+    root span when cancelled tasks are still unwinding.
+    """
+    def __init__(self, tracer: "Tracer") -> None:
+        self.tracer = tracer
+        self.trace_id = random.getrandbits(128)
+        self.spans: List[Span] = []  # in start order, so parents come before their children
+        self.open_count = 0
+        self.root: Optional[Span] = None
+
+    def start_span(self, name: str, parent: Optional[Span], attributes: Dict[str, Any]) -> Span:
+        span_ = Span(
+            name,
+            self.trace_id,
+            random.getrandbits(64),
+            parent.span_id if parent is not None else None,
+            time.time_ns(),
+            attributes=attributes,
+            parent=parent,
+            _trace=self,
+        )
+        if self.root is None:
+            self.root = span_
+        self.spans.append(span_)
+        self.open_count += 1
+        return span_
+
+    def end_span(self, span_: Span) -> None:
+        self.open_count -= 1
+        if self.open_count == 0 and self.root is not None:
+            if self.root.duration >= self.tracer.min_duration:
+                self.tracer.export(self.spans)
+
+
+class SpanExporter(Protocol):
+    """
+    Same interface as OpenTelemetry span exporters: export() is called with all the spans of a path request.
+    """
+    def export(self, spans: Sequence[Span]) -> None: ...
+    def shutdown(self) -> None: ...
+
+
+class InMemorySpanExporter:
+    def __init__(self) -> None:
+        """
+        Keep the exported spans in memory, eg for tests or to inspect the slowest requests.
+        """
+        self.spans: List[Span] = []
+
+    def export(self, spans: Sequence[Span]) -> None:
+        self.spans.extend(spans)
+
+    def shutdown(self) -> None:
+        self.spans.clear()
+
+
+class JsonSpanExporter:
+    def __init__(self, file_path: str) -> None:
+        """
+        Append the spans to a local file, one JSON object per line. The spans are written in a background thread, so
+        the path requests are not blocked by the file I/O. shutdown() waits for the spans still being written.
+
+        :param file_path: path of the file to append the spans to
+        """
+        self.file_path = file_path
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="json_span_exporter")
+
+    def export(self, spans: Sequence[Span]) -> None:
+        lines = "".join(json.dumps(span_.to_dict(), default=str) + "\n" for span_ in spans)
+        self._executor.submit(self._write, lines)
+
+    def _write(self, lines: str) -> None:
+        try:
+            with open(self.file_path, "a") as f:
+                f.write(lines)
+        except OSError as e:
+            logger.warning(f"Could not write the spans to {self.file_path}. Reason: {e!r}")
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+class OpenTelemetrySpanExporter:
+    def __init__(self, tracer: Any = None) -> None:
+        """
+        Replay the spans into OpenTelemetry, so they are exported with its SDK span processors and exporters.
+        Needs the opentelemetry-api package.
+
+        :param tracer: an OpenTelemetry tracer. By default, one from the global tracer provider.
+        """
+        try:
+            from opentelemetry import trace
+        except ImportError as e:
+            raise ImportError("OpenTelemetrySpanExporter needs opentelemetry-api: pip install opentelemetry-api") from e
+        self._trace = trace
+        self.tracer = tracer or trace.get_tracer(__name__)
+
+    @staticmethod
+    def _to_otel_value(value: Any) -> Any:
+        if isinstance(value, (bool, float, str)):
+            return value
+        if isinstance(value, int) and -2**63 <= value < 2**63:
+            return value
+        return str(value)  # eg amounts in wei do not fit in OpenTelemetry 64-bit integers
+
+    def export(self, spans: Sequence[Span]) -> None:
+        otel_spans: Dict[int, Any] = {}
+        for span_ in spans:
+            parent = otel_spans.get(span_.parent_span_id) if span_.parent_span_id is not None else None
+            otel_span = self.tracer.start_span(
+                span_.name,
+                context=self._trace.set_span_in_context(parent) if parent is not None else None,
+                attributes={key: self._to_otel_value(value) for key, value in span_.attributes.items()},
+                start_time=span_.start_time,
+            )
+            if span_.error is not None:
+                otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span_.error))
+            otel_spans[span_.span_id] = otel_span
+        for span_ in reversed(spans):
+            otel_spans[span_.span_id].end(end_time=span_.end_time)
+
+    def shutdown(self) -> None:
+        pass
+
+
+class Tracer:
+    def __init__(self, exporters: Sequence[SpanExporter], sample_ratio: float = 1., min_duration: float = 0.) -> None:
+        """
+        Record a span tree for each path request: the request itself, the token fetch, the V2 and V3 pool discovery,
+        each quote and RPC, and the split evaluation. The spans carry attributes such as the path, the amounts,
+        the block and the credits consumed.
+
+        :param exporters: where to send the spans of each request, eg: JsonSpanExporter or OpenTelemetrySpanExporter
+        :param sample_ratio: ratio of the requests to trace, between 0 and 1
+        :param min_duration: export only the requests lasting at least this number of seconds, eg to keep the tail
+        """
+        if not 0 <= sample_ratio <= 1:
+            raise ValueError(f"sample_ratio must be between 0 and 1, got {sample_ratio}")
+        self.exporters = tuple(exporters)
+        self.sample_ratio = sample_ratio
+        self.min_duration = min_duration
+
+    @contextmanager
+    def start_trace(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        """
+        Start the root span of a path request. Yield None if the request is not sampled.
+        """
+        if self.sample_ratio < 1 and random.random() >= self.sample_ratio:
+            yield None
+            return
+        root = _Trace(self).start_span(name, None, attributes)
+        token = current_span.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.error = repr(e)
+            raise
+        finally:
+            current_span.reset(token)
+            root.end()
+
+    def export(self, spans: Sequence[Span]) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.export(spans)
+            except Exception as e:
+                logger.warning(f"Span exporter {exporter} failed. Reason: {e!r}")
+
+    def shutdown(self) -> None:
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Record a child span of the current span, if the current request is traced. Yield None otherwise.
+    """
+    parent = current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.start_child(name, **attributes)
+    token = current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = repr(e)
+        raise
+    finally:
+        current_span.reset(token)
+        child.end()
+
+
+def set_attribute(key: str, value: Any) -> None:
+    """
+    Set an attribute on the current span, if the current request is traced.
+    """
+    current = current_span.get()
+    if current is not None:
+        current.set_attribute(key, value)
+
+
+def add_credits(credits: int) -> None:
+    """
+    Add the credits consumed by an RPC to the current span and all its ancestors.
+    """
+    current = current_span.get()
+    while current is not None:
+        current.attributes["credits"] = current.attributes.get("credits", 0) + credits
+        current = current.parent